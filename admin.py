@@ -1,13 +1,23 @@
+from datetime import date, timedelta
+from typing import List
+from urllib.parse import urlencode
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
-from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import Room, GalleryImage, Feedback, Booking, User, RoomImage
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.orm import Session, selectinload
+from database import SessionLocal, get_read_db
+from models import Room, GalleryImage, Feedback, Booking, User, RoomImage, DailyRoomStats
 from auth import get_current_user
+from availability import availability
+from booking_list import BOOKING_STATUSES, BookingFilters, fetch_booking_page
+from exports import BOOKING_COLUMNS, EXPORT_FORMATS, FEEDBACK_COLUMNS, booking_export_query, export_stream, feedback_export_query
+from occupancy import MAX_DAYS, build_occupancy
+from page_cache import page_cache
+from notifications import MESSAGE_LIMIT, enqueue_telegram, outbox_worker
+from reservations import BULK_MAX, CONFLICT, RESERVED, TAKEN, bulk_change_status, change_status
+import room_stats
+from templating import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 def get_db():
     db = SessionLocal()
@@ -17,16 +27,18 @@ def get_db():
         db.close()
 
 @router.get("/admin")
-def admin_panel(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    status = request.query_params.get("status")
-    if status == "all":
-        bookings = db.query(Booking).all()
-    else:
-        bookings = db.query(Booking).filter(Booking.status.in_(["pending", "confirmed"])).all()
-    rooms = db.query(Room).all()
+def admin_panel(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    if not current_user or not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    filters = BookingFilters.from_query(request.query_params)
+    page = fetch_booking_page(db, filters)
+    rooms = db.query(Room).options(selectinload(Room.images)).all()
     return templates.TemplateResponse("admin.html", {
         "request": request,
-        "bookings": bookings,
+        "bookings": page.bookings,
+        "page": page,
+        "filters": filters,
+        "statuses": BOOKING_STATUSES,
         "rooms": rooms
     })
 
@@ -51,6 +63,7 @@ async def add_room(request: Request, db: Session = Depends(get_db), current_user
     )
     db.add(room)
     db.commit()
+    page_cache.invalidate()
     return RedirectResponse(url="/admin", status_code=303)
 
 @router.post("/admin/rooms/delete/{room_id}")
@@ -60,14 +73,17 @@ async def delete_room(room_id: int, db: Session = Depends(get_db), current_user:
     room = db.query(Room).filter(Room.id == room_id).first()
     if room:
         db.delete(room)
+        # Пересборка сводки идёт только по существующим номерам
+        db.query(DailyRoomStats).filter(DailyRoomStats.room_id == room_id).delete(synchronize_session=False)
         db.commit()
+        page_cache.invalidate()
     return RedirectResponse(url="/admin", status_code=303)
 
 @router.get("/admin/rooms/edit/{room_id}")
-async def edit_room_form(room_id: int, request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def edit_room_form(room_id: int, request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     if not current_user or not getattr(current_user, "is_admin", False):
         raise HTTPException(status_code=403, detail="Not authorized")
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = db.query(Room).options(selectinload(Room.images)).filter(Room.id == room_id).first()
     if not room:
         return RedirectResponse("/admin", status_code=303)
     return templates.TemplateResponse("edit_room.html", {
@@ -92,6 +108,7 @@ async def edit_room(room_id: int, request: Request, db: Session = Depends(get_db
     room.amenities = form_data.get("amenities", room.amenities)
     room.is_available = form_data.get("is_available") == "on"
     db.commit()
+    page_cache.invalidate()
     return RedirectResponse(url="/admin", status_code=303)
 
 @router.post("/admin/gallery/add")
@@ -106,6 +123,7 @@ async def add_gallery_image(request: Request, db: Session = Depends(get_db), cur
     )
     db.add(image)
     db.commit()
+    page_cache.invalidate()
     return RedirectResponse(url="/admin", status_code=303)
 
 @router.post("/admin/gallery/delete/{img_id}")
@@ -116,6 +134,7 @@ async def delete_gallery_image(img_id: int, db: Session = Depends(get_db), curre
     if img:
         db.delete(img)
         db.commit()
+        page_cache.invalidate()
     return RedirectResponse(url="/admin", status_code=303)
 
 # Добавить фото
@@ -129,6 +148,7 @@ async def add_room_image(room_id: int, request: Request, db: Session = Depends(g
         img = RoomImage(url=url, room_id=room_id)
         db.add(img)
         db.commit()
+        page_cache.invalidate()
     return RedirectResponse(f"/admin/rooms/edit/{room_id}", status_code=303)
 
 # Удалить фото
@@ -140,18 +160,148 @@ async def delete_room_image(room_id: int, img_id: int, db: Session = Depends(get
     if img:
         db.delete(img)
         db.commit()
+        page_cache.invalidate()
     return RedirectResponse(f"/admin/rooms/edit/{room_id}", status_code=303)
 
 @router.post("/admin/bookings/status/{booking_id}")
 def change_booking_status(booking_id: int, status: str = Form(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if not current_user or not getattr(current_user, "is_admin", False):
         raise HTTPException(status_code=403, detail="Not authorized")
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
-    if booking:
-        booking.status = status
+    if status not in BOOKING_STATUSES:
+        return RedirectResponse("/admin?error=badinput", status_code=303)
+    outcome, booking = change_status(db, booking_id, status)
+    if outcome == TAKEN:
+        return RedirectResponse("/admin?error=taken", status_code=303)
+    if outcome == CONFLICT:
+        return RedirectResponse("/admin?error=conflict", status_code=303)
+    if outcome == RESERVED:
         db.commit()
+        availability.track(booking)
     return RedirectResponse("/admin", status_code=303)
 
+@router.post("/admin/bookings/bulk-status")
+def bulk_booking_status(booking_ids: List[int] = Form([]), status: str = Form(...), next: str = Form("/admin"),
+                        db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if not current_user or not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    # Возвращаемся на ту же страницу с фильтрами, но только внутри админки
+    if not next.startswith("/admin") or next.startswith("//"):
+        next = "/admin"
+    separator = "&" if "?" in next else "?"
+    if status not in BOOKING_STATUSES or not booking_ids or len(booking_ids) > BULK_MAX:
+        return RedirectResponse(f"{next}{separator}error=badinput", status_code=303)
+    result = bulk_change_status(db, booking_ids, status)
+    if result.conflict:
+        return RedirectResponse(f"{next}{separator}error=conflict", status_code=303)
+    if result.changed:
+        # Одно сообщение на всю пачку вместо уведомления на каждую бронь
+        for message in _bulk_messages(db, result.changed, status):
+            enqueue_telegram(db, message)
+    db.commit()
+    for change in result.changed:
+        availability.track(change)
+    if result.changed:
+        outbox_worker.notify()
+    summary = urlencode({"bulk": status, "changed": len(result.changed), "taken": len(result.taken),
+                         "invalid": len(result.invalid)})
+    return RedirectResponse(f"{next}{separator}{summary}", status_code=303)
+
+@router.get("/admin/calendar")
+def occupancy_calendar(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    if not current_user or not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    start, days = _calendar_window(request, default_days=31)
+    matrix = build_occupancy(db, start, days)
+    return templates.TemplateResponse("admin_calendar.html", {
+        "request": request,
+        "user": current_user,
+        "matrix": matrix,
+        "prev_start": start - timedelta(days=matrix.days),
+        "next_start": start + timedelta(days=matrix.days)
+    })
+
+@router.get("/admin/calendar.json")
+def occupancy_calendar_json(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    if not current_user or not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    start, days = _calendar_window(request, default_days=MAX_DAYS)
+    return build_occupancy(db, start, days).to_json()
+
+@router.get("/admin/stats")
+def room_stats_dashboard(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    if not current_user or not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    year = _stats_year(request)
+    return templates.TemplateResponse("admin_stats.html", {
+        "request": request,
+        "user": current_user,
+        "stats": room_stats.year_stats(db, year)
+    })
+
+@router.get("/admin/stats.json")
+def room_stats_json(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    if not current_user or not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return room_stats.year_stats(db, _stats_year(request)).to_json()
+
+@router.get("/admin/export/bookings.{fmt}")
+def export_bookings(fmt: str, request: Request, current_user: User = Depends(get_current_user)):
+    if not current_user or not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404)
+    # Те же фильтры, что у списка в админке, но без курсора и лимита страницы
+    filters = BookingFilters.from_query(request.query_params, default_status="all")
+    return _export_response("bookings", fmt, export_stream(fmt, BOOKING_COLUMNS, booking_export_query(filters), "Брони"))
+
+@router.get("/admin/export/feedback.{fmt}")
+def export_feedback(fmt: str, q: str = "", current_user: User = Depends(get_current_user)):
+    if not current_user or not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404)
+    return _export_response("feedback", fmt, export_stream(fmt, FEEDBACK_COLUMNS, feedback_export_query(q.strip()), "Отзывы"))
+
+def _export_response(name: str, fmt: str, body) -> StreamingResponse:
+    filename = f"{name}-{date.today().isoformat()}.{fmt}"
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[fmt], headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-store",
+    })
+
+def _bulk_messages(db: Session, changes, status: str) -> List[str]:
+    names = dict(db.query(Room.id, Room.name).filter(Room.id.in_({change.room_id for change in changes})).all())
+    header = f"<b>Массовая смена статуса: {status}</b> ({len(changes)})\n"
+    messages, lines = [], []
+    for change in changes:
+        line = (f"\n🆔 {change.id} · {names.get(change.room_id, change.room_id)} · "
+                f"{change.check_in} — {change.check_out} · {change.old_status} → {status}")
+        # Сообщение длиннее лимита Telegram режется, поэтому длинную пачку делим на несколько
+        if lines and len(header) + sum(map(len, lines)) + len(line) > MESSAGE_LIMIT:
+            messages.append(header + "".join(lines))
+            lines = []
+        lines.append(line)
+    messages.append(header + "".join(lines))
+    return messages
+
+def _stats_year(request: Request) -> int:
+    try:
+        year = int(request.query_params.get("year", ""))
+    except ValueError:
+        return date.today().year
+    return max(date.min.year, min(year, date.max.year - 1))
+
+def _calendar_window(request: Request, default_days: int):
+    try:
+        start = date.fromisoformat(request.query_params.get("start", ""))
+    except ValueError:
+        start = date.today()
+    try:
+        days = int(request.query_params.get("days", default_days))
+    except ValueError:
+        days = default_days
+    return start, max(1, min(days, MAX_DAYS))
+
 async def setup_admin(app):
     app.include_router(router, prefix="")
 
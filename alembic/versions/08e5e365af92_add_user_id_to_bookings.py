@@ -1,7 +1,7 @@
 """add user_id to bookings
 
 Revision ID: 08e5e365af92
-Revises: 
+Revises: 5b0d1c3e7a28
 Create Date: 2025-06-03 20:03:33.890050
 
 """
@@ -13,7 +13,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision: str = '08e5e365af92'
-down_revision: Union[str, None] = None
+down_revision: Union[str, None] = '5b0d1c3e7a28'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
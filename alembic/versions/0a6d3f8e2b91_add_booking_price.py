@@ -0,0 +1,31 @@
+"""add booking price
+
+Revision ID: 0a6d3f8e2b91
+Revises: f2c8d1a6b357
+Create Date: 2026-10-19 10:24:11.730492
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6d3f8e2b91'
+down_revision: Union[str, None] = 'f2c8d1a6b357'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('bookings', sa.Column('price', sa.Integer(), nullable=True))
+    # Цены прошлых броней не сохранились — берём текущие цены номеров, по ним же построена сводка
+    op.execute("UPDATE bookings SET price = (SELECT rooms.price FROM rooms WHERE rooms.id = bookings.room_id)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.drop_column('price')
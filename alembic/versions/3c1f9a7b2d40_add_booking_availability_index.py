@@ -0,0 +1,33 @@
+"""add booking availability index
+
+Revision ID: 3c1f9a7b2d40
+Revises: 08e5e365af92
+Create Date: 2026-10-18 10:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f9a7b2d40'
+down_revision: Union[str, None] = '08e5e365af92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_bookings_room_status_dates',
+        'bookings',
+        ['room_id', 'status', 'check_in', 'check_out'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_bookings_room_status_dates', table_name='bookings')
@@ -0,0 +1,98 @@
+"""initial schema
+
+Revision ID: 5b0d1c3e7a28
+Revises: 
+Create Date: 2026-10-18 18:12:40.331905
+
+Таблицы в том виде, в каком их раньше создавал Base.metadata.create_all при импорте
+main.py (до добавления bookings.user_id). Базам, уже созданным через create_all без
+таблицы alembic_version, вместо upgrade нужен `alembic stamp` на их фактическую ревизию.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0d1c3e7a28'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+    op.create_table(
+        'rooms',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.Column('image', sa.String(), nullable=True),
+        sa.Column('capacity', sa.Integer(), nullable=True),
+        sa.Column('amenities', sa.String(), nullable=True),
+        sa.Column('is_available', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_rooms_id', 'rooms', ['id'], unique=False)
+    op.create_table(
+        'gallery_images',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('caption', sa.String(), nullable=True),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_gallery_images_id', 'gallery_images', ['id'], unique=False)
+    op.create_table(
+        'feedback',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('fullname', sa.String(), nullable=False),
+        sa.Column('phone', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('message', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_feedback_id', 'feedback', ['id'], unique=False)
+    op.create_table(
+        'room_images',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('room_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_room_images_id', 'room_images', ['id'], unique=False)
+    op.create_table(
+        'bookings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('room_id', sa.Integer(), nullable=True),
+        sa.Column('fullname', sa.String(), nullable=False),
+        sa.Column('phone', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('check_in', sa.Date(), nullable=True),
+        sa.Column('check_out', sa.Date(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_bookings_id', 'bookings', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('bookings', 'room_images', 'feedback', 'gallery_images', 'rooms', 'users'):
+        op.drop_table(table)
@@ -0,0 +1,38 @@
+"""add admin booking list indexes
+
+Revision ID: a41d6e0c8f17
+Revises: 7e2b4c91d5a3
+Create Date: 2026-10-18 12:21:09.618042
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41d6e0c8f17'
+down_revision: Union[str, None] = '7e2b4c91d5a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_bookings_status_id', ['status', 'id']),
+    ('ix_bookings_status_check_in', ['status', 'check_in']),
+    ('ix_bookings_check_in', ['check_in']),
+    ('ix_bookings_fullname', ['fullname']),
+    ('ix_bookings_email', ['email']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in INDEXES:
+        op.create_index(name, 'bookings', columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='bookings')
@@ -0,0 +1,29 @@
+"""add room booking version
+
+Revision ID: c5e8a2f49b61
+Revises: a41d6e0c8f17
+Create Date: 2026-10-18 13:02:55.174620
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8a2f49b61'
+down_revision: Union[str, None] = 'a41d6e0c8f17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('rooms', sa.Column('booking_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('rooms') as batch_op:
+        batch_op.drop_column('booking_version')
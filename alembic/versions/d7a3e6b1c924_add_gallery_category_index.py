@@ -0,0 +1,28 @@
+"""add gallery category index
+
+Revision ID: d7a3e6b1c924
+Revises: c5e8a2f49b61
+Create Date: 2026-10-18 16:40:12.508316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3e6b1c924'
+down_revision: Union[str, None] = 'c5e8a2f49b61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_gallery_images_category_id', 'gallery_images', ['category', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_gallery_images_category_id', table_name='gallery_images')
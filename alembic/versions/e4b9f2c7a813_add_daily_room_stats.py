@@ -0,0 +1,53 @@
+"""add daily room stats
+
+Revision ID: e4b9f2c7a813
+Revises: d7a3e6b1c924
+Create Date: 2026-10-18 19:05:37.214890
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9f2c7a813'
+down_revision: Union[str, None] = 'd7a3e6b1c924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'daily_room_stats',
+        sa.Column('room_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('nights_sold', sa.Integer(), nullable=False),
+        sa.Column('nights_pending', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('room_id', 'day'),
+    )
+    op.create_index('ix_daily_room_stats_day', 'daily_room_stats', ['day'], unique=False)
+    # Заполняем по уже существующим броням, дальше сводку ведёт room_stats.apply
+    op.execute("""
+        INSERT INTO daily_room_stats (room_id, day, nights_sold, nights_pending, revenue)
+        WITH RECURSIVE nights(room_id, day, check_out, sold, pending, revenue) AS (
+            SELECT b.room_id, b.check_in, b.check_out,
+                   b.status IN ('confirmed', 'completed'), b.status = 'pending',
+                   CASE WHEN b.status IN ('confirmed', 'completed') THEN COALESCE(r.price, 0) ELSE 0 END
+            FROM bookings AS b JOIN rooms AS r ON r.id = b.room_id
+            WHERE b.status IN ('confirmed', 'completed', 'pending') AND b.check_in < b.check_out
+            UNION ALL
+            SELECT room_id, date(day, '+1 day'), check_out, sold, pending, revenue
+            FROM nights WHERE date(day, '+1 day') < check_out
+        )
+        SELECT room_id, day, SUM(sold), SUM(pending), SUM(revenue) FROM nights GROUP BY room_id, day
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_daily_room_stats_day', table_name='daily_room_stats')
+    op.drop_table('daily_room_stats')
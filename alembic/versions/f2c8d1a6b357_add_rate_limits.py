@@ -0,0 +1,37 @@
+"""add rate limits
+
+Revision ID: f2c8d1a6b357
+Revises: e4b9f2c7a813
+Create Date: 2026-10-18 21:12:48.506113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8d1a6b357'
+down_revision: Union[str, None] = 'e4b9f2c7a813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'rate_limits',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.Column('idle_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_rate_limits_idle_at', 'rate_limits', ['idle_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_rate_limits_idle_at', table_name='rate_limits')
+    op.drop_table('rate_limits')
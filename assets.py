@@ -0,0 +1,192 @@
+import contextlib
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаются только gzip-варианты
+    brotli = None
+
+STATIC_DIR = "static"
+# Собранные файлы с хэшем в имени; каталог в .gitignore, собирается при развёртывании: `python assets.py`
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = os.path.join(DIST_DIR, "manifest.json")
+STATIC_URL = "/static/"
+# Сборка при старте каждого воркера — только для разработки; без сборки ссылки ведут на исходные файлы
+ASSETS_BUILD_ON_STARTUP = os.getenv("ASSETS_BUILD_ON_STARTUP", "0") == "1"
+# Имя меняется вместе с содержимым, поэтому кэшировать можно «навсегда»
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".html")
+# Кодировка в Content-Encoding -> суффикс файла, в порядке предпочтения
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compress(data: bytes) -> Dict[str, bytes]:
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    # Сжатие, которое не выигрывает у исходника, не нужно
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def _write(path: str, data: bytes):
+    # Воркеры собирают одновременно: пишем во временный файл и атомарно подменяем
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def build(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> Dict[str, dict]:
+    """Копирует статику в dist под именами с хэшем содержимого, рядом кладёт .gz/.br и manifest.json."""
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir):
+            dirs[:] = [name for name in dirs if os.path.join(root, name) != dist_dir]
+        for filename in files:
+            source = os.path.join(root, filename)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as file:
+                data = file.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, extension = os.path.splitext(logical)
+            hashed = f"{stem}.{digest}{extension}"
+            target = os.path.join(dist_dir, hashed)
+            encodings = []
+            if not os.path.exists(target):
+                _write(target, data)
+            if extension in COMPRESSIBLE:
+                compressed = _compress(data)
+                for encoding, suffix in ENCODINGS:
+                    if encoding not in compressed:
+                        continue
+                    if not os.path.exists(target + suffix):
+                        _write(target + suffix, compressed[encoding])
+                    encodings.append(encoding)
+            manifest[logical] = {"path": hashed, "hash": digest, "encodings": encodings}
+
+    # Старые версии файлов больше ни на что не ссылаются
+    keep = {os.path.normpath(os.path.join(dist_dir, entry["path"])) for entry in manifest.values()}
+    for root, _, files in os.walk(dist_dir):
+        for filename in files:
+            # Временный файл пишет другой сборщик прямо сейчас
+            if filename.endswith(".tmp"):
+                continue
+            path = os.path.normpath(os.path.join(root, filename))
+            base = path[:-3] if path.endswith((".gz", ".br")) else path
+            if base not in keep and path != os.path.normpath(os.path.join(dist_dir, "manifest.json")):
+                # Соседний сборщик мог удалить его раньше нас
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+    _write(os.path.join(dist_dir, "manifest.json"), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    assets.load(manifest)
+    return manifest
+
+
+class Assets:
+    """Манифест собранной статики: логическое имя -> имя с хэшем и доступные сжатые варианты."""
+
+    def __init__(self):
+        self._manifest: Optional[Dict[str, dict]] = None
+        # dist-путь -> (хэш, кодировки) для обработчика статики
+        self._served: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def load(self, manifest: Optional[Dict[str, dict]] = None):
+        if manifest is None:
+            try:
+                with open(MANIFEST, encoding="utf-8") as file:
+                    manifest = json.load(file)
+            except (OSError, ValueError):
+                # Сборки нет: ссылки остаются на исходные файлы
+                manifest = {}
+        with self._lock:
+            self._manifest = manifest
+            self._served = {entry["path"]: (entry["hash"], tuple(entry["encodings"])) for entry in manifest.values()}
+
+    def _ensure_loaded(self):
+        if self._manifest is None:
+            self.load()
+
+    def url(self, path: str) -> str:
+        self._ensure_loaded()
+        entry = self._manifest.get(path.lstrip("/"))
+        if entry is None:
+            return STATIC_URL + path.lstrip("/")
+        return f"{STATIC_URL}dist/{entry['path']}"
+
+    def served(self, dist_path: str) -> Optional[tuple]:
+        self._ensure_loaded()
+        return self._served.get(dist_path)
+
+
+assets = Assets()
+
+
+def asset_url(path: str) -> str:
+    """Jinja-глобал: asset_url('css/styles.css') -> /static/dist/css/styles.<хэш>.css."""
+    return assets.url(path)
+
+
+def _accepted(accept_encoding: str) -> set:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles, который для собранных файлов отдаёт готовые .br/.gz и разрешает кэшировать навсегда.
+
+    ETag — хэш содержимого (плюс кодировка), так что If-None-Match работает и без чтения файла.
+    Прочие файлы отдаются как раньше.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        relative = os.path.relpath(full_path, os.path.realpath(DIST_DIR)).replace(os.sep, "/")
+        entry = None if relative.startswith("..") else assets.served(relative)
+        if entry is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        digest, encodings = entry
+        request_headers = Headers(scope=scope)
+        accepted = _accepted(request_headers.get("accept-encoding", ""))
+        headers = {"cache-control": IMMUTABLE, "vary": "Accept-Encoding"}
+        path, encoding = full_path, None
+        for name, suffix in ENCODINGS:
+            if name in encodings and name in accepted:
+                path, encoding = f"{full_path}{suffix}", name
+                headers["content-encoding"] = name
+                break
+        headers["etag"] = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        # stat сжатого варианта FileResponse сделает сам, в потоке
+        response = FileResponse(path, status_code=status_code, headers=headers, media_type=media_type,
+                                stat_result=stat_result if encoding is None else None)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    for logical, entry in sorted(build().items()):
+        print(f"{logical} -> dist/{entry['path']} {' '.join(entry['encodings'])}")
@@ -0,0 +1,149 @@
+import os
+import threading
+from bisect import bisect_left
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Booking
+
+# Статусы, которые занимают номер на даты брони. BOOKING_HOLD_PENDING=1 — заявка
+# держит даты до решения администратора, иначе занимает только подтверждённая бронь
+BOOKING_HOLD_PENDING = os.getenv("BOOKING_HOLD_PENDING", "0") == "1"
+BLOCKING_STATUSES = ("pending", "confirmed") if BOOKING_HOLD_PENDING else ("confirmed",)
+
+
+class RoomSchedule:
+    """Занятые интервалы одного номера.
+
+    Хранит исходные брони и их объединение в непересекающиеся отрезки,
+    отсортированные по дате заезда, — проверка свободы идёт бинарным поиском.
+    """
+
+    __slots__ = ("bookings", "spans")
+
+    def __init__(self):
+        self.bookings: Dict[int, Tuple[date, date]] = {}
+        self.spans: Tuple[List[date], List[date]] = ([], [])
+
+    def rebuild(self):
+        starts: List[date] = []
+        ends: List[date] = []
+        for start, end in sorted(self.bookings.values()):
+            # [a, b) и [b, c) можно склеить: пересечение с объединением
+            # всегда означает пересечение с одним из них
+            if ends and start <= ends[-1]:
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+        # Подменяем одним присваиванием, чтобы читатели не видели полусобранных списков
+        self.spans = (starts, ends)
+
+    def is_free(self, check_in: date, check_out: date) -> bool:
+        starts, ends = self.spans
+        # Последний занятый отрезок, начинающийся раньше даты выезда
+        i = bisect_left(starts, check_out) - 1
+        return i < 0 or ends[i] <= check_in
+
+
+class AvailabilityIndex:
+    """Индекс занятости номеров в памяти процесса.
+
+    Загружается из БД при первом обращении и дальше обновляется вызовами
+    track() после создания, подтверждения и отмены брони. track() видит только
+    изменения своего процесса: освободить даты могли соседний воркер или планировщик,
+    поэтому ответу «свободно» индекс верит сразу, а «занято» перепроверяет в БД.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms: Optional[Dict[int, RoomSchedule]] = None
+
+    def reset(self):
+        with self._lock:
+            self._rooms = None
+
+    def _schedules(self, db: Session, room_ids: Optional[List[int]] = None) -> Dict[int, RoomSchedule]:
+        rooms: Dict[int, RoomSchedule] = {}
+        query = (
+            select(Booking.id, Booking.room_id, Booking.check_in, Booking.check_out)
+            .where(Booking.status.in_(BLOCKING_STATUSES))
+        )
+        if room_ids is not None:
+            query = query.where(Booking.room_id.in_(room_ids))
+        for booking_id, room_id, check_in, check_out in db.execute(query):
+            if check_in is None or check_out is None:
+                continue
+            rooms.setdefault(room_id, RoomSchedule()).bookings[booking_id] = (check_in, check_out)
+        for schedule in rooms.values():
+            schedule.rebuild()
+        return rooms
+
+    def load(self, db: Session):
+        rooms = self._schedules(db)
+        with self._lock:
+            self._rooms = rooms
+
+    def refresh(self, db: Session, room_ids: List[int]):
+        """Перечитывает расписание указанных номеров из БД одним запросом."""
+        fresh = self._schedules(db, room_ids)
+        with self._lock:
+            for room_id in room_ids:
+                if room_id in fresh:
+                    self._rooms[room_id] = fresh[room_id]
+                else:
+                    self._rooms.pop(room_id, None)
+
+    def ensure_loaded(self, db: Session):
+        if self._rooms is None:
+            self.load(db)
+
+    def track(self, booking: Booking):
+        """Синхронизирует индекс с текущим состоянием брони (вызывать после commit)."""
+        if self._rooms is None:
+            return
+        blocking = (
+            booking.status in BLOCKING_STATUSES
+            and booking.check_in is not None
+            and booking.check_out is not None
+        )
+        with self._lock:
+            schedule = self._rooms.get(booking.room_id)
+            if blocking:
+                if schedule is None:
+                    schedule = self._rooms[booking.room_id] = RoomSchedule()
+                schedule.bookings[booking.id] = (booking.check_in, booking.check_out)
+            elif schedule is None or schedule.bookings.pop(booking.id, None) is None:
+                return
+            schedule.rebuild()
+
+    def _busy(self, room_ids: Iterable[int], check_in: date, check_out: date) -> List[int]:
+        rooms = self._rooms
+        return [
+            room_id for room_id in room_ids
+            if room_id in rooms and not rooms[room_id].is_free(check_in, check_out)
+        ]
+
+    def is_free(self, db: Session, room_id: int, check_in: date, check_out: date) -> bool:
+        return not self._busy_confirmed(db, [room_id], check_in, check_out)
+
+    def free_rooms(self, db: Session, room_ids: Iterable[int], check_in: date, check_out: date) -> List[int]:
+        room_ids = list(room_ids)
+        busy = set(self._busy_confirmed(db, room_ids, check_in, check_out))
+        return [room_id for room_id in room_ids if room_id not in busy]
+
+    def _busy_confirmed(self, db: Session, room_ids: List[int], check_in: date, check_out: date) -> List[int]:
+        self.ensure_loaded(db)
+        busy = self._busy(room_ids, check_in, check_out)
+        if busy:
+            # Занятость могла устареть: перечитываем только спорные номера
+            self.refresh(db, busy)
+            busy = self._busy(busy, check_in, check_out)
+        return busy
+
+
+availability = AvailabilityIndex()
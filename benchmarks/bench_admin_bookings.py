@@ -0,0 +1,112 @@
+"""Задержка постраничного списка броней в админке при росте таблицы.
+
+База дозаполняется до каждого размера, на каждом замеряются первая и «глубокая»
+(по курсору из середины таблицы) страницы для нескольких фильтров:
+    python -m benchmarks.bench_admin_bookings --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+CASES = [
+    ("активные", "/admin/bookings?status=active"),
+    ("pending", "/admin/bookings"),
+    ("все", "/admin/bookings?status=all"),
+    ("все, по заезду", "/admin/bookings?status=all&sort=check_in"),
+    ("номер 7", "/admin/bookings?status=all&room=7"),
+    ("март 2025", "/admin/bookings?status=all&from=2025-03-01&to=2025-03-31&sort=check_in"),
+    ("гость", "/admin/bookings?status=all&q=Гость 12"),
+]
+ROOMS = 200
+
+
+def grow(target, rng, state):
+    from database import engine
+    from models import Booking
+
+    rows = []
+    for i in range(state["rows"], target):
+        check_in = date(2020, 1, 1) + timedelta(days=rng.randrange(2600))
+        # Старые брони в основном завершены; активных немного
+        status = rng.choices(("completed", "cancelled", "confirmed", "pending"), (80, 15, 3, 2))[0]
+        rows.append({
+            "room_id": i % ROOMS + 1, "user_id": 1, "fullname": f"Гость {i}", "phone": "+7",
+            "email": f"guest{i}@example.com", "status": status,
+            "check_in": check_in, "check_out": check_in + timedelta(days=rng.randint(1, 7)),
+        })
+        if len(rows) == 50000:
+            with engine.begin() as conn:
+                conn.execute(Booking.__table__.insert(), rows)
+            rows = []
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(Booking.__table__.insert(), rows)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    state["rows"] = target
+
+
+def measure(client, path, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, (path, response.status_code)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e3, response
+
+
+def deep_cursor(path, size):
+    # Курсор из середины таблицы, без обхода всех страниц
+    from booking_list import BookingFilters
+    from urllib.parse import parse_qsl, urlsplit
+
+    filters = BookingFilters.from_query(dict(parse_qsl(urlsplit(path).query)), default_status="pending")
+    middle = size // 2
+    if filters.sort in ("check_in", "check_in_desc"):
+        return f"{path}&after=2023-07-01_{middle}"
+    return f"{path}{'&' if '?' in path else '?'}after={middle}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from fastapi.testclient import TestClient
+
+        import main as app_module
+        from auth import create_access_token, user_claims
+        from database import Base, SessionLocal, engine
+        from models import Room, User
+
+        Base.metadata.create_all(bind=engine)
+        with SessionLocal() as db:
+            admin = User(username="admin", email="admin@example.com", hashed_password="-", is_admin=True)
+            db.add(admin)
+            db.add_all([Room(name=f"Номер {i}", price=3000) for i in range(ROOMS)])
+            db.commit()
+            token = create_access_token(user_claims(admin))
+
+        client = TestClient(app_module.app, cookies={"access_token": token})
+        rng = random.Random(9)
+        state = {"rows": 0}
+        print(f"{'строк':>8} {'фильтр':<16} {'1-я стр., мс':>13} {'глубже, мс':>11} {'строк на стр.':>14}")
+        for size in (int(value) for value in args.sizes.split(",")):
+            grow(size, rng, state)
+            for name, path in CASES:
+                first, response = measure(client, path, args.repeat)
+                deep, _ = measure(client, deep_cursor(path, size), args.repeat)
+                shown = response.text.count("<tr>") - 1
+                print(f"{size:>8} {name:<16} {first:>13.2f} {deep:>11.2f} {shown:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Пропускная способность /rooms: асинхронный обработчик против прежнего синхронного.
+
+Поднимает uvicorn на временной базе и нагружает оба варианта страницы
+при 50, 200 и 1000 одновременных клиентах:
+    python -m benchmarks.bench_async --clients 50 200 1000 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def create_app():
+    # Вызывается uvicorn в дочернем процессе (--factory)
+    from fastapi import Depends, Request
+    from sqlalchemy.orm import Session
+
+    import main
+    from auth import get_current_user
+    from models import Room
+
+    @main.app.get("/_sync/rooms")
+    def sync_rooms(request: Request, db: Session = Depends(main.get_db)):
+        user = get_current_user(request, db)
+        rooms = db.query(Room).all()
+        room_images = {room.id: [img.url for img in room.images] for room in rooms}
+        return main.templates.TemplateResponse("rooms.html", {
+            "request": request,
+            "rooms": rooms,
+            "user": user,
+            "room_images_json": json.dumps(room_images, ensure_ascii=False)
+        })
+
+    return main.app
+
+
+def seed(url, rooms=20, images_per_room=4):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from database import Base
+    from models import Room, RoomImage
+
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        for i in range(rooms):
+            room = Room(name=f"Номер {i}", description="Тестовый номер", price=3000 + i * 100)
+            room.images = [RoomImage(url=f"https://example.com/{i}/{j}.jpg") for j in range(images_per_room)]
+            db.add(room)
+        db.commit()
+    engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/about", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("сервер не запустился")
+
+
+async def load(base_url, path, clients, duration):
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.monotonic() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(clients)))
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3 if latencies else float("nan")
+
+    return len(latencies) / duration, pct(0.5), pct(0.99), errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        seed(url)
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.bench_async:create_app",
+             "--port", str(port), "--log-level", "warning", "--backlog", "4096"],
+            env={**os.environ, "DATABASE_URL": url},
+        )
+        try:
+            wait_ready(base_url)
+            print(f"{'клиентов':>9} {'вариант':>8} {'запр/с':>9} {'p50, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+            for clients in args.clients:
+                for name, path in (("sync", "/_sync/rooms"), ("async", "/rooms")):
+                    rps, p50, p99, errors = asyncio.run(load(base_url, path, clients, args.duration))
+                    print(f"{clients:>9} {name:>8} {rps:>9.1f} {p50:>9.1f} {p99:>9.1f} {errors:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
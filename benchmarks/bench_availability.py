@@ -0,0 +1,116 @@
+"""Сравнение проверки занятости номера: исходный запрос, составной индекс и AvailabilityIndex.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_availability --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from availability import AvailabilityIndex
+from database import Base
+from models import Booking
+
+STATUSES = ["confirmed", "confirmed", "confirmed", "pending", "cancelled", "completed"]
+EPOCH = date(2015, 1, 1)
+
+
+def fill(engine, size, rooms, rng):
+    # Непрерывная история по каждому номеру, вставка через executemany
+    rows = []
+    per_room = size // rooms
+    for room_id in range(1, rooms + 1):
+        day = rng.randint(0, 5)
+        for _ in range(per_room):
+            nights = rng.randint(1, 10)
+            check_in = EPOCH + timedelta(days=day)
+            check_out = check_in + timedelta(days=nights)
+            rows.append((room_id, "Гость", check_in.isoformat(), check_out.isoformat(), rng.choice(STATUSES)))
+            day += nights + rng.randint(0, 3)
+    raw = engine.raw_connection()
+    try:
+        raw.executemany(
+            "INSERT INTO bookings (room_id, fullname, check_in, check_out, status) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        raw.commit()
+    finally:
+        raw.close()
+    return max(date.fromisoformat(r[3]) for r in rows)
+
+
+def legacy_query(db, room_id, check_in, check_out):
+    return db.query(Booking).filter(
+        Booking.room_id == room_id,
+        Booking.check_out > check_in,
+        Booking.check_in < check_out,
+        Booking.status == "confirmed"
+    ).first() is None
+
+
+def timed(fn, probes):
+    started = time.perf_counter()
+    for probe in probes:
+        fn(*probe)
+    return (time.perf_counter() - started) / len(probes) * 1e6
+
+
+def run(size, rooms, queries, seed):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_bookings_room_status_dates"))
+        last_day = fill(engine, size, rooms, rng)
+        span = (last_day - EPOCH).days
+        probes = []
+        for _ in range(queries):
+            check_in = EPOCH + timedelta(days=rng.randint(0, span))
+            probes.append((rng.randint(1, rooms), check_in, check_in + timedelta(days=rng.randint(1, 7))))
+
+        result = {}
+        with Session(engine) as db:
+            # Полный скан медленный, на больших объёмах хватает части выборки
+            result["scan"] = timed(lambda *p: legacy_query(db, *p), probes[:max(20, queries // 10)])
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX ix_bookings_room_status_dates ON bookings (room_id, status, check_in, check_out)"
+            ))
+        with Session(engine) as db:
+            result["index"] = timed(lambda *p: legacy_query(db, *p), probes)
+            index = AvailabilityIndex()
+            started = time.perf_counter()
+            index.load(db)
+            result["load_ms"] = (time.perf_counter() - started) * 1e3
+            result["memory"] = timed(lambda *p: index.is_free(db, *p), probes)
+            room_ids = list(range(1, rooms + 1))
+            result["free_rooms"] = timed(lambda _, a, b: index.free_rooms(db, room_ids, a, b), probes)
+        engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'броней':>10} {'скан, мкс':>12} {'индекс, мкс':>12} {'память, мкс':>12} "
+          f"{'все номера, мкс':>16} {'загрузка, мс':>13}")
+    for size in args.sizes:
+        r = run(size, args.rooms, args.queries, args.seed)
+        print(f"{size:>10} {r['scan']:>12.1f} {r['index']:>12.1f} {r['memory']:>12.1f} "
+              f"{r['free_rooms']:>16.1f} {r['load_ms']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Построение матрицы занятости номеров × дней на базе из populate_db.py.
+
+    python -m benchmarks.bench_calendar --rooms 200 --bookings 300000 --days 365
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+
+def timed(function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e3, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=300000)
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'calendar.db')}"
+        today = date.today()
+        subprocess.run(
+            [sys.executable, "populate_db.py", "--rooms", str(args.rooms), "--bookings", str(args.bookings),
+             "--years", str(args.years), "--users", "1000", "--today", today.isoformat(), "--fast"],
+            env={**os.environ, "DATABASE_URL": url}, check=True,
+        )
+        os.environ["DATABASE_URL"] = url
+        from fastapi.testclient import TestClient
+
+        import main as app_module
+        from auth import create_access_token, user_claims
+        from database import ReadSessionLocal, SessionLocal
+        from models import User
+        from occupancy import build_occupancy
+
+        with ReadSessionLocal() as db:
+            build_ms, matrix = timed(lambda: build_occupancy(db, today, args.days), args.repeat)
+            json_ms, _ = timed(matrix.to_json, args.repeat)
+        busy = sum(1 for cell in matrix.cells if cell)
+        print(f"{len(matrix.rooms)} номеров × {matrix.days} дней, занято ячеек: {busy}")
+        print(f"матрица: {build_ms:.1f} мс, в JSON: {json_ms:.1f} мс")
+
+        with SessionLocal() as db:
+            admin = User(username="admin", email="admin@example.com", hashed_password="-", is_admin=True)
+            db.add(admin)
+            db.commit()
+            token = create_access_token(user_claims(admin))
+        with TestClient(app_module.app, cookies={"access_token": token}) as client:
+            for path in (f"/admin/calendar.json?days={args.days}", f"/admin/calendar?days={args.days}",
+                         "/admin/calendar"):
+                ms, response = timed(lambda: client.get(path), args.repeat)
+                assert response.status_code == 200, (path, response.status_code)
+                print(f"GET {path:<32} {ms:>7.1f} мс {len(response.content) / 1024:>8.0f} КиБ")
+
+
+if __name__ == "__main__":
+    main()
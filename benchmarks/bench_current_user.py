@@ -0,0 +1,81 @@
+"""Задержка /rooms для авторизованного пользователя: поиск в users на каждый запрос против TTL-кэша.
+
+Claims токена не используются: каждый токен сверяется с users раз в AUTH_CACHE_TTL. В прогоне один
+токен на вариант, поэтому «после» показывает 0 запросов к users; под живым трафиком это один запрос
+на пользователя за TTL, а не ноль.
+    python -m benchmarks.bench_current_user --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+async def measure(client, count):
+    from db_profiling import QueryCounter
+
+    latencies = []
+    with QueryCounter() as counter:
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.get("/rooms")
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+    latencies.sort()
+    user_queries = sum("FROM users" in statement for statement in counter.statements)
+    return (
+        statistics.mean(latencies) * 1e3,
+        latencies[len(latencies) // 2] * 1e3,
+        latencies[int(len(latencies) * 0.99)] * 1e3,
+        user_queries / count,
+    )
+
+
+async def run(count):
+    import httpx
+
+    import main
+    from auth import create_access_token, identity_cache, user_claims
+    from database import Base, SessionLocal, engine
+    from models import Room, RoomImage, User
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        for i in range(20):
+            room = Room(name=f"Номер {i}", price=3000)
+            room.images = [RoomImage(url=f"https://example.com/{i}/{j}.jpg") for j in range(3)]
+            db.add(room)
+        guest = User(username="guest", email="guest@example.com", hashed_password="-", is_admin=False)
+        admin = User(username="admin", email="admin@example.com", hashed_password="-", is_admin=True)
+        db.add_all([guest, admin])
+        db.commit()
+        cases = [
+            ("до: поиск в БД", create_access_token({"sub": "guest"}), 0),
+            ("после: кэш", create_access_token(user_claims(guest)), identity_cache.ttl),
+            ("после: админ, кэш", create_access_token(user_claims(admin)), identity_cache.ttl),
+        ]
+
+    transport = httpx.ASGITransport(app=main.app)
+    print(f"{'вариант':<20} {'среднее, мс':>12} {'p50, мс':>9} {'p99, мс':>9} {'users/запрос':>13}")
+    for name, token, ttl in cases:
+        identity_cache.ttl = ttl
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     cookies={"access_token": token}) as client:
+            await measure(client, 50)  # прогрев кэша страниц и шаблонов
+            mean, p50, p99, user_queries = await measure(client, count)
+        print(f"{name:<20} {mean:>12.3f} {p50:>9.3f} {p99:>9.3f} {user_queries:>13.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
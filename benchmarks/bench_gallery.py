@@ -0,0 +1,74 @@
+"""Вес /gallery и скорость ленты /api/gallery при росте галереи.
+
+Для каждого размера генерирует базу populate_db.py и меряет первую страницу HTML,
+первую и глубокую страницу ленты с категорией и без:
+    python -m benchmarks.bench_gallery --sizes 50 5000 50000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def median_ms(client, url, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, (url, response.status_code)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e3, response
+
+
+def measure(size, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'gallery.db')}"
+        subprocess.run([sys.executable, "populate_db.py", "--rooms", "1", "--users", "1", "--feedback", "0",
+                        "--gallery", str(size), "--fast"],
+                       env={**os.environ, "DATABASE_URL": url}, check=True, stdout=subprocess.DEVNULL)
+        # Каждый размер — в отдельном процессе: движки модулей привязаны к DATABASE_URL при импорте
+        code = f"""
+import json
+from fastapi.testclient import TestClient
+import main
+from benchmarks.bench_gallery import median_ms
+from page_cache import page_cache
+page_cache.ttl = 0
+results = {{}}
+with TestClient(main.app) as client:
+    html_ms, html = median_ms(client, "/gallery", {repeat})
+    results["html"] = (html_ms, len(html.content))
+    _, first = median_ms(client, "/api/gallery", 1)
+    # Курсор из середины ленты: глубина не должна влиять на время
+    deep = {size} // 2
+    results["feed"] = median_ms(client, "/api/gallery", {repeat})[0]
+    results["deep"] = median_ms(client, f"/api/gallery?after={{deep}}", {repeat})[0]
+    results["category"] = median_ms(client, f"/api/gallery?category=sea&after={{deep}}", {repeat})[0]
+    results["items"] = len(first.json()["items"])
+print(json.dumps(results))
+"""
+        output = subprocess.run([sys.executable, "-c", code], env={**os.environ, "DATABASE_URL": url},
+                                check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 5000, 50000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'фото':>7} {'HTML, КиБ':>10} {'HTML, мс':>9} {'лента, мс':>10} {'глубоко, мс':>12} {'категория, мс':>14}")
+    for size in args.sizes:
+        result = measure(size, args.repeat)
+        html_ms, html_bytes = result["html"]
+        print(f"{size:>7} {html_bytes / 1024:>10.1f} {html_ms:>9.1f} {result['feed']:>10.1f} "
+              f"{result['deep']:>12.1f} {result['category']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
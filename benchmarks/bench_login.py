@@ -0,0 +1,90 @@
+"""Пропускная способность входа и p99 посторонних страниц во время шторма логинов.
+
+Вариант "inline" воспроизводит прежнее поведение (хэш считается прямо в event loop),
+"pool" — текущее (пул потоков из passwords.py):
+    python -m benchmarks.bench_login --logins 32 --duration 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+async def storm(app, logins, probes, duration):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    login_count = 0
+    probe_latencies = []
+    deadline = time.monotonic() + duration
+
+    async def login_worker(i):
+        nonlocal login_count
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            while time.monotonic() < deadline:
+                response = await client.post("/auth/login", data={"username": f"user{i}", "password": "secret123"})
+                assert response.headers["location"] == "/"
+                login_count += 1
+
+    async def probe_worker():
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                await client.get("/about")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(login_worker(i) for i in range(logins)), *(probe_worker() for _ in range(probes)))
+    probe_latencies.sort()
+    return (
+        login_count / duration,
+        probe_latencies[len(probe_latencies) // 2] * 1e3,
+        probe_latencies[int(len(probe_latencies) * 0.99)] * 1e3,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32, help="одновременных клиентов, выполняющих вход")
+    parser.add_argument("--probes", type=int, default=4, help="клиентов, открывающих /about")
+    parser.add_argument("--duration", type=float, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        # Все клиенты идут с одного адреса: лимит частоты входа здесь только мешал бы замеру
+        os.environ["RATE_LIMIT_ENABLED"] = "0"
+        import auth
+        import main as app_module
+        from database import Base, SessionLocal, engine
+        from models import User
+        from passwords import PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, hash_password, verify_password
+
+        Base.metadata.create_all(bind=engine)
+        hashed = hash_password("secret123")
+        with SessionLocal() as db:
+            db.add_all([User(username=f"user{i}", email=f"user{i}@example.com", hashed_password=hashed)
+                        for i in range(args.logins)])
+            db.commit()
+
+        pooled = auth.verify_password_async
+
+        async def inline(hashed_password, password):
+            return verify_password(hashed_password, password)
+
+        async def run_all():
+            # Оба варианта в одном event loop: пул aiosqlite привязан к циклу
+            for name, verify in (("inline", inline), ("pool", pooled)):
+                auth.verify_password_async = verify
+                rate, p50, p99 = await storm(app_module.app, args.logins, args.probes, args.duration)
+                print(f"{name:>8} {rate:>9.1f} {p50:>15.1f} {p99:>15.1f}")
+            auth.verify_password_async = pooled
+
+        print(f"метод {PASSWORD_HASH_METHOD}, потоков {PASSWORD_HASH_WORKERS}")
+        print(f"{'вариант':>8} {'входов/с':>9} {'/about p50, мс':>15} {'/about p99, мс':>15}")
+        asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Цена сбора метрик на запрос: METRICS_ENABLED=0 против 1 на одних и тех же маршрутах.
+
+Каждый вариант — в отдельном процессе (middleware ставится при импорте main), копия hotel.db:
+    python -m benchmarks.bench_metrics --requests 2000
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROUTES = ["/", "/rooms", "/api/gallery", "/rooms/free?check_in=2025-07-01&check_out=2025-07-05"]
+
+CHILD = """
+import json, sys, time
+from fastapi.testclient import TestClient
+import main
+routes, count = json.loads(sys.argv[1]), int(sys.argv[2])
+results = {}
+with TestClient(main.app) as client:
+    for route in routes:
+        for _ in range(50):
+            client.get(route)
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            client.get(route)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        results[route] = samples[len(samples) // 2] * 1e6
+    scrape = time.perf_counter()
+    client.get("/metrics")
+    results["/metrics"] = (time.perf_counter() - scrape) * 1e3
+print(json.dumps(results))
+"""
+
+
+def run(enabled, database, count):
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}", "METRICS_ENABLED": enabled, "PYTHONPATH": os.getcwd()}
+    output = subprocess.run([sys.executable, "-c", CHILD, json.dumps(ROUTES), str(count)], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "metrics.db")
+        shutil.copy("hotel.db", database)
+        subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], check=True, capture_output=True,
+                       env={**os.environ, "DATABASE_URL": f"sqlite:///{database}"})
+        off = run("0", database, args.requests)
+        on = run("1", database, args.requests)
+
+    print(f"{'маршрут':<55} {'без, мкс':>9} {'с метриками':>12} {'разница':>8}")
+    for route in ROUTES:
+        print(f"{route:<55} {off[route]:>9.0f} {on[route]:>12.0f} {on[route] - off[route]:>+8.0f}")
+    print(f"сбор /metrics после прогона: {on['/metrics']:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
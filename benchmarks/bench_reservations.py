@@ -0,0 +1,217 @@
+"""Штурм одного номера: много клиентов одновременно бронируют и подтверждают одни и те же даты.
+
+Поднимает uvicorn (несколько воркеров — проверяется и межпроцессная часть) на временной базе.
+Сценарии:
+    submit  — BOOKING_HOLD_PENDING=1, гости шлют POST /book на пересекающиеся даты;
+    confirm — в базе много пересекающихся заявок, администраторы подтверждают их наперегонки.
+По умолчанию (BOOKING_HOLD_PENDING=0) заявка дат не занимает, POST /book пишет её без замка и версии,
+и единственная атомарная проверка — при подтверждении: это сценарий confirm.
+После прогона база проверяется на пересечения занимающих броней — их должно быть ноль.
+--unguarded запускает прежний путь «проверили, потом записали» без версии номера для сравнения:
+    python -m benchmarks.bench_reservations --clients 32 --duration 10
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+from benchmarks.bench_async import free_port, wait_ready
+
+ROOM_ID = 1
+WINDOW = 30  # дней, в которые целятся все заявки
+
+
+def create_unguarded_app():
+    # Вызывается uvicorn в дочернем процессе (--factory): проверка и запись без версии номера
+    import main
+    import reservations
+
+    def try_reserve(db, booking):
+        if booking.status in reservations.BLOCKING_STATUSES and reservations.overlaps(
+                db, booking.room_id, booking.check_in, booking.check_out, exclude_id=booking.id):
+            return reservations.TAKEN
+        db.add(booking)
+        db.flush()
+        # Окно гонки: между проверкой и коммитом успевает пройти чужая заявка
+        time.sleep(0.002)
+        return reservations.RESERVED
+
+    main.try_reserve = try_reserve
+    reservations.try_reserve = try_reserve
+    main.async_room_locks = reservations.room_locks = lambda room_id: contextlib.nullcontext()
+    return main.app
+
+
+def seed(url, users, pending):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from database import Base
+    from models import Booking, Room, User
+
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(5)
+    with Session(engine) as db:
+        db.add(Room(id=ROOM_ID, name="Номер 1", price=3000))
+        db.add(User(id=1, username="admin", email="admin@example.com", hashed_password="-", is_admin=True))
+        db.add_all([User(id=i + 2, username=f"guest{i}", email=f"guest{i}@example.com", hashed_password="-")
+                    for i in range(users)])
+        start = date.today() + timedelta(days=10)
+        for i in range(pending):
+            check_in = start + timedelta(days=rng.randrange(WINDOW))
+            db.add(Booking(room_id=ROOM_ID, user_id=2, fullname=f"Гость {i}", phone="+7", email="g@example.com",
+                           check_in=check_in, check_out=check_in + timedelta(days=rng.randint(1, 3)),
+                           status="pending"))
+        db.commit()
+    engine.dispose()
+
+
+def count_overlaps(url, statuses):
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(url)
+    placeholders = ", ".join(f"'{status}'" for status in statuses)
+    with engine.connect() as conn:
+        overlaps = conn.execute(text(f"""
+            SELECT COUNT(*) FROM bookings a JOIN bookings b
+              ON a.room_id = b.room_id AND a.id < b.id
+             AND a.check_in < b.check_out AND b.check_in < a.check_out
+            WHERE a.status IN ({placeholders}) AND b.status IN ({placeholders})
+        """)).scalar()
+        blocking = conn.execute(text(f"SELECT COUNT(*) FROM bookings WHERE status IN ({placeholders})")).scalar()
+    engine.dispose()
+    return overlaps, blocking
+
+
+async def submit_storm(base_url, tokens, duration):
+    outcomes = {"reserved": 0, "taken": 0, "error": 0}
+    latencies = []
+    deadline = time.monotonic() + duration
+    start = date.today() + timedelta(days=10)
+
+    async def client_loop(token, rng):
+        async with httpx.AsyncClient(base_url=base_url, cookies={"access_token": token}, timeout=60) as client:
+            while time.monotonic() < deadline:
+                check_in = start + timedelta(days=rng.randrange(WINDOW))
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/book", data={
+                        "room_id": ROOM_ID, "fullname": "Гость", "phone": "+79990000000",
+                        "email": "guest@example.com", "check_in": check_in.isoformat(),
+                        "check_out": (check_in + timedelta(days=rng.randint(1, 3))).isoformat(),
+                    })
+                except httpx.HTTPError:
+                    outcomes["error"] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if response.status_code == 303:
+                    outcomes["reserved"] += 1
+                elif response.status_code == 200:
+                    outcomes["taken"] += 1
+                else:
+                    outcomes["error"] += 1
+
+    await asyncio.gather(*(client_loop(token, random.Random(i)) for i, token in enumerate(tokens)))
+    return outcomes, latencies
+
+
+async def confirm_storm(base_url, admin_token, clients, pending, duration):
+    outcomes = {"reserved": 0, "taken": 0, "error": 0}
+    latencies = []
+    deadline = time.monotonic() + duration
+    ids = list(range(1, pending + 1))
+
+    async def client_loop(rng):
+        async with httpx.AsyncClient(base_url=base_url, cookies={"access_token": admin_token}, timeout=60) as client:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f"/admin/bookings/confirm/{rng.choice(ids)}")
+                except httpx.HTTPError:
+                    outcomes["error"] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 303:
+                    outcomes["error"] += 1
+                elif "error=taken" in response.headers["location"]:
+                    outcomes["taken"] += 1
+                else:
+                    outcomes["reserved"] += 1
+
+    await asyncio.gather(*(client_loop(random.Random(i)) for i in range(clients)))
+    return outcomes, latencies
+
+
+def run(scenario, args, unguarded):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'storm.db')}"
+        os.environ["DATABASE_URL"] = url
+        from auth import create_access_token
+
+        seed(url, args.clients, args.pending if scenario == "confirm" else 0)
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        factory = "benchmarks.bench_reservations:create_unguarded_app" if unguarded else "main:app"
+        command = [sys.executable, "-m", "uvicorn", factory, "--port", str(port), "--log-level", "warning",
+                   "--workers", str(args.workers)]
+        if unguarded:
+            command.insert(4, "--factory")
+        env = {**os.environ, "DB_PROFILE": "production",
+               "BOOKING_HOLD_PENDING": "1" if scenario == "submit" else "0"}
+        server = subprocess.Popen(command, env=env)
+        try:
+            wait_ready(base_url)
+            admin_token = create_access_token({"sub": "admin"})
+            if scenario == "submit":
+                tokens = [create_access_token({"sub": f"guest{i}"}) for i in range(args.clients)]
+                outcomes, latencies = asyncio.run(submit_storm(base_url, tokens, args.duration))
+            else:
+                outcomes, latencies = asyncio.run(
+                    confirm_storm(base_url, admin_token, args.clients, args.pending, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        statuses = ("pending", "confirmed") if scenario == "submit" else ("confirmed",)
+        overlaps, blocking = count_overlaps(url, statuses)
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e3 if latencies else float("nan")
+    total = sum(outcomes.values())
+    variant = "без версии" if unguarded else "версия+замок"
+    print(f"{scenario:<8} {variant:<13} {total / args.duration:>8.1f} {p99:>9.1f} {outcomes['reserved']:>8} "
+          f"{outcomes['taken']:>7} {outcomes['error']:>7} {blocking:>9} {overlaps:>12}")
+    return overlaps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2, help="процессов uvicorn")
+    parser.add_argument("--pending", type=int, default=300, help="заявок для сценария confirm")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--scenario", choices=["submit", "confirm", "all"], default="all")
+    parser.add_argument("--unguarded", action="store_true", help="также прогнать прежний путь для сравнения")
+    args = parser.parse_args()
+
+    scenarios = ["submit", "confirm"] if args.scenario == "all" else [args.scenario]
+    print(f"{'сценарий':<8} {'вариант':<13} {'запр/с':>8} {'p99, мс':>9} {'успешно':>8} {'занято':>7} "
+          f"{'ошибок':>7} {'занимают':>9} {'пересечений':>12}")
+    failed = False
+    for scenario in scenarios:
+        failed |= run(scenario, args, unguarded=False) > 0
+        if args.unguarded:
+            run(scenario, args, unguarded=True)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
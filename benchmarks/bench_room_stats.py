@@ -0,0 +1,143 @@
+"""Дашборд /admin/stats: сводка daily_room_stats против подсчёта по всем броням через ORM.
+
+Генерирует базу populate_db.py, меряет год показателей обоими способами, затем проходит
+все пути изменения броней через приложение и после каждого сверяет сводку с пересборкой:
+    python -m benchmarks.bench_room_stats --rooms 200 --bookings 100000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def orm_year_stats(db, year):
+    # Как пришлось бы без сводки: все брони в Python, ночи раскладываются по месяцам
+    from models import Booking
+
+    revenue, sold = {}, {}
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    for booking in db.query(Booking).filter(Booking.status.in_(("confirmed", "completed"))):
+        day = max(booking.check_in, start)
+        while day < min(booking.check_out, end):
+            key = (booking.room_id, day.month)
+            sold[key] = sold.get(key, 0) + 1
+            revenue[key] = revenue.get(key, 0) + (booking.price or 0)
+            day += timedelta(days=1)
+    return sold, revenue
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2] * 1e3, result
+
+
+def exercise(year):
+    """Все пути записи через приложение; после каждого сводка должна совпадать с бронями."""
+    from fastapi.testclient import TestClient
+
+    import main
+    import room_stats
+    from auth import create_access_token
+    from database import SessionLocal
+    from models import Booking, Room, User
+
+    def consistent(step, status):
+        with SessionLocal() as db:
+            mismatches = room_stats.check(db)
+            actual = db.get(Booking, booking_id).status
+        ok = not mismatches and actual == status
+        print(f"    {step:<28} {actual:<10} {'OK' if ok else mismatches[:3]}")
+        return ok
+
+    with SessionLocal() as db:
+        admin = db.query(User).filter(User.is_admin == True).first()
+        if admin is None:
+            admin = User(username="stats-admin", email="stats-admin@example.com", hashed_password="-", is_admin=True)
+            db.add(admin)
+            db.commit()
+        guest = db.query(User).filter(User.is_admin == False).first()
+        room_id = db.query(Room.id).order_by(Room.id).first()[0]
+        admin_name, guest_name = admin.username, guest.username
+
+    ok = True
+    # За горизонтом сгенерированных броней (--future-days), чтобы заявка не упёрлась в занятые даты
+    check_in = date(year + 5, 3, 1)
+    with TestClient(main.app) as client:
+        client.cookies.set("access_token", create_access_token({"sub": guest_name}))
+        response = client.post("/book", data={"room_id": room_id, "fullname": "Гость", "phone": "+7", "email": "g@example.com",
+                                              "check_in": check_in.isoformat(),
+                                              "check_out": (check_in + timedelta(days=4)).isoformat()},
+                               follow_redirects=False)
+        booking_id = int(response.headers["location"].rsplit("/", 1)[1])
+        ok &= consistent("новая заявка", "pending")
+        client.cookies.set("access_token", create_access_token({"sub": admin_name}))
+        client.post(f"/admin/bookings/confirm/{booking_id}", follow_redirects=False)
+        ok &= consistent("подтверждение", "confirmed")
+        client.post(f"/admin/bookings/status/{booking_id}", data={"status": "completed"}, follow_redirects=False)
+        ok &= consistent("смена статуса в админке", "completed")
+        client.post(f"/admin/bookings/status/{booking_id}", data={"status": "confirmed"}, follow_redirects=False)
+        with SessionLocal() as db:
+            room = db.get(Room, room_id)
+            form = {"name": room.name, "description": room.description or "", "price": (room.price or 0) + 500,
+                    "image": room.image or "", "capacity": room.capacity or 1, "amenities": room.amenities or ""}
+        client.post(f"/admin/rooms/edit/{room_id}", data=form, follow_redirects=False)
+        ok &= consistent("смена цены номера", "confirmed")
+        client.post("/admin/bookings/bulk-status", data={"booking_ids": [booking_id], "status": "completed"},
+                    follow_redirects=False)
+        ok &= consistent("массовая смена статуса", "completed")
+        client.post(f"/admin/bookings/status/{booking_id}", data={"status": "confirmed"}, follow_redirects=False)
+        client.cookies.set("access_token", create_access_token({"sub": guest_name}))
+        client.post(f"/my-bookings/cancel/{booking_id}", follow_redirects=False)
+        ok &= consistent("отмена гостем", "cancelled")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'stats.db')}"
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "populate_db.py", "--rooms", str(args.rooms), "--bookings", str(args.bookings),
+                        "--users", "100", "--feedback", "0", "--gallery", "0", "--fast"], check=True,
+                       stdout=subprocess.DEVNULL)
+        print(f"генерация с пересборкой сводки: {time.perf_counter() - started:.1f} с")
+
+        import room_stats
+        from database import SessionLocal
+
+        year = date.today().year - 1
+        with SessionLocal() as db:
+            orm_ms, (sold, revenue) = timed(lambda: orm_year_stats(db, year), args.repeat)
+            summary_ms, stats = timed(lambda: room_stats.year_stats(db, year), args.repeat)
+            rebuild_ms, rows = timed(lambda: room_stats.rebuild(db), 1)
+            db.commit()
+            check_ms, mismatches = timed(lambda: room_stats.check(db), 1)
+        same = all(month.nights_sold == sold.get((room_id, index + 1), 0)
+                   and month.revenue == revenue.get((room_id, index + 1), 0)
+                   for room_id, months in stats.by_room.items() for index, month in enumerate(months))
+        print(f"год {year}, {args.rooms} номеров, {args.bookings} броней, {rows} строк сводки")
+        print(f"    ORM по всем броням:   {orm_ms:9.1f} мс")
+        print(f"    сводка:               {summary_ms:9.1f} мс   {'совпадает' if same else 'РАСХОДИТСЯ'}")
+        print(f"    полная пересборка:    {rebuild_ms:9.1f} мс")
+        print(f"    проверка:             {check_ms:9.1f} мс   {'OK' if not mismatches else mismatches[:3]}")
+        print("пути изменения броней:")
+        ok = exercise(year) and same and not mismatches
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Планировщик броней: прогон пачками против одного большого UPDATE и задержка записи рядом с ним.
+
+Генерирует базу populate_db.py с опорной датой на --days-ago дней назад — всё, что тогда было
+впереди, теперь прожито или просрочено. Для каждого размера пачки прогон идёт на свежей копии,
+параллельно поток пишет заявки, как /book; после прогона сводка сверяется с бронями:
+    python -m benchmarks.bench_scheduler --rooms 200 --bookings 100000
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+
+def live_writes(stop, latencies):
+    from database import SessionLocal
+    from models import Booking
+
+    check_in = date.today() + timedelta(days=3650)
+    while not stop.is_set():
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            db.add(Booking(room_id=1, fullname="Гость", status="cancelled", check_in=check_in,
+                           check_out=check_in + timedelta(days=1)))
+            db.commit()
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.005)
+
+
+def run(batch_size, source, target):
+    import room_stats
+    from database import SessionLocal, engine
+    from scheduler import LifecycleScheduler
+
+    engine.dispose()
+    shutil.copy(source, target)
+    scheduler = LifecycleScheduler(batch_size=batch_size)
+    stop, latencies = threading.Event(), []
+    writer = threading.Thread(target=live_writes, args=(stop, latencies))
+    writer.start()
+    time.sleep(0.2)
+    started = time.perf_counter()
+    totals = asyncio.run(scheduler.run_once())
+    elapsed = time.perf_counter() - started
+    stop.set()
+    writer.join()
+    with SessionLocal() as db:
+        mismatches = room_stats.check(db)
+    latencies.sort()
+    return totals, elapsed, latencies, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=100000)
+    parser.add_argument("--days-ago", type=int, default=365)
+    parser.add_argument("--batches", type=int, nargs="+", default=[200, 2000, 10 ** 9])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = os.path.join(tmp, "source.db"), os.path.join(tmp, "scheduler.db")
+        today = date.today() - timedelta(days=args.days_ago)
+        subprocess.run([sys.executable, "populate_db.py", "--rooms", str(args.rooms), "--bookings", str(args.bookings),
+                        "--users", "100", "--feedback", "0", "--gallery", "0", "--fast", "--today", today.isoformat()],
+                       env={**os.environ, "DATABASE_URL": f"sqlite:///{source}"}, check=True, stdout=subprocess.DEVNULL)
+        os.environ["DATABASE_URL"] = f"sqlite:///{target}"
+
+        ok = True
+        print(f"{'пачка':>10} {'completed':>10} {'cancelled':>10} {'прогон, с':>10} "
+              f"{'записей':>8} {'p50, мс':>8} {'макс, мс':>9}  сводка")
+        for batch_size in args.batches:
+            totals, elapsed, latencies, mismatches = run(batch_size, source, target)
+            ok &= not mismatches
+            print(f"{batch_size:>10} {totals['complete_stays']:>10} {totals['expire_pending']:>10} {elapsed:>10.2f} "
+                  f"{len(latencies):>8} {latencies[len(latencies) // 2] * 1e3:>8.1f} {latencies[-1] * 1e3:>9.1f}  "
+                  f"{'OK' if not mismatches else mismatches[:3]}")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Чтения во время всплесков записи: профиль SQLite "default" против "production".
+
+Для каждого профиля запускается отдельный процесс (движки настраиваются при импорте
+database.py): писатель вставляет брони пачками, читатели через ReadSessionLocal
+непрерывно выполняют типичные запросы GET-страниц.
+    python -m benchmarks.bench_sqlite_concurrency --readers 8 --duration 10
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+
+def child(readers, duration, burst):
+    from sqlalchemy import func, insert, select
+    from sqlalchemy.exc import OperationalError
+
+    from database import Base, ReadSessionLocal, SessionLocal, engine
+    from models import Booking, Room
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all([Room(name=f"Номер {i}", price=3000) for i in range(50)])
+        db.commit()
+
+    stop = threading.Event()
+    latencies = []
+    errors = {"read": 0, "write": 0}
+    writes = 0
+    lock = threading.Lock()
+
+    def writer():
+        nonlocal writes
+        rng = random.Random(1)
+        rows = []
+        for _ in range(burst):
+            check_in = date(2025, 1, 1) + timedelta(days=rng.randint(0, 700))
+            rows.append({"room_id": rng.randint(1, 50), "fullname": "Гость", "status": "pending",
+                         "check_in": check_in, "check_out": check_in + timedelta(days=3)})
+        while not stop.is_set():
+            try:
+                with SessionLocal() as db:
+                    db.execute(insert(Booking), rows)
+                    time.sleep(0.05)  # длинная транзакция записи
+                    db.commit()
+                writes += burst
+            except OperationalError:
+                errors["write"] += 1
+
+    def reader(seed):
+        rng = random.Random(seed)
+        local = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with ReadSessionLocal() as db:
+                    db.execute(select(Room)).all()
+                    db.execute(
+                        select(func.count()).select_from(Booking)
+                        .where(Booking.room_id == rng.randint(1, 50), Booking.status == "pending")
+                    ).scalar()
+            except OperationalError:
+                with lock:
+                    errors["read"] += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader, args=(i,)) for i in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3 if latencies else float("nan")
+
+    print(json.dumps({
+        "reads_per_sec": len(latencies) / duration,
+        "p50_ms": pct(0.5),
+        "p99_ms": pct(0.99),
+        "max_ms": latencies[-1] * 1e3 if latencies else float("nan"),
+        "writes_per_sec": writes / duration,
+        "read_errors": errors["read"],
+        "write_errors": errors["write"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--burst", type=int, default=20000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.readers, args.duration, args.burst)
+        return
+
+    print(f"{'профиль':>11} {'чтений/с':>9} {'p50, мс':>8} {'p99, мс':>8} {'max, мс':>8} "
+          f"{'записей/с':>10} {'ошибок чт.':>11} {'ошибок зап.':>12}")
+    for profile in ("default", "production"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, "DB_PROFILE": profile,
+                   "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}"}
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_sqlite_concurrency", "--child",
+                 "--readers", str(args.readers), "--duration", str(args.duration), "--burst", str(args.burst)],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:>11} {r['reads_per_sec']:>9.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['max_ms']:>8.1f} {r['writes_per_sec']:>10.0f} {r['read_errors']:>11} {r['write_errors']:>12}")
+
+
+if __name__ == "__main__":
+    main()
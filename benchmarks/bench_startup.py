@@ -0,0 +1,91 @@
+"""Время импорта main и время до первого ответа свежего воркера.
+
+import    — `python -c "import main"` в новом процессе (медиана), плюс самые дорогие модули по -X importtime;
+первый ответ — от запуска uvicorn до первого 200 на GET /, то есть импорт, startup-хуки и рендер:
+    python -m benchmarks.bench_startup --repeat 7
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_async import free_port
+
+
+def import_time(env):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], env=env, check=True)
+    return time.perf_counter() - started
+
+
+def heaviest_imports(env, top):
+    # Собственное время модулей верхнего уровня пакета: видно, кто тянет тяжёлые зависимости
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], env=env, check=True,
+                            capture_output=True, text=True).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        package = name.strip().split(".")[0]
+        if name.startswith("  ") and not name.startswith("    "):
+            totals[package] = totals.get(package, 0) + int(cumulative)
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def first_response(env):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                               "--log-level", "warning"], env=env)
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn завершился до первого ответа")
+            time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "startup.db")
+        shutil.copy("hotel.db", database)
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}"}
+        subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], env=env, check=True,
+                       capture_output=True)
+        import_time(env)  # прогрев файлового кэша и __pycache__
+        imports = median([import_time(env) for _ in range(args.repeat)])
+        responses = median([first_response(env) for _ in range(args.repeat)])
+        print(f"import main:            {imports * 1e3:7.0f} мс")
+        print(f"первый ответ воркера:   {responses * 1e3:7.0f} мс")
+        print("самые дорогие импорты верхнего уровня, мс:")
+        for package, micros in heaviest_imports(env, args.top):
+            print(f"    {package:<20} {micros / 1e3:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
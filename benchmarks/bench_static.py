@@ -0,0 +1,54 @@
+"""Статика главной страницы: сколько байт уходит на первый и повторный просмотр.
+
+Сравнивает исходные /static/... (без сжатия и кэширования) со сборкой assets.py:
+    python -m benchmarks.bench_static
+"""
+import re
+import time
+
+from fastapi.testclient import TestClient
+
+ASSET = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+def page_view(client, urls, cache):
+    # Повторный просмотр ведёт себя как браузер: immutable не перепроверяется, остальное — с If-None-Match
+    sent, requests = 0, 0
+    for url in urls:
+        cached = cache.get(url)
+        if cached is not None and "immutable" in cached.get("cache-control", ""):
+            continue
+        headers = {"accept-encoding": "br, gzip"}
+        if cached is not None and "etag" in cached:
+            headers["if-none-match"] = cached["etag"]
+        response = client.get(url, headers=headers)
+        requests += 1
+        sent += int(response.headers.get("content-length", 0))
+        if response.status_code == 200:
+            cache[url] = response.headers
+    return sent, requests
+
+
+def main():
+    import main as app_module
+    from assets import build
+
+    with TestClient(app_module.app) as client:
+        built = ASSET.findall(client.get("/").text)
+        logical = {f"/static/dist/{entry['path']}": name for name, entry in build().items()}
+        original = [f"/static/{logical[url]}" for url in built]
+
+        print(f"{'вариант':<10} {'1-й просмотр, Б':>16} {'запросов':>9} {'повторный, Б':>13} {'запросов':>9}")
+        for name, urls in (("исходные", original), ("сборка", built)):
+            cache = {}
+            first = page_view(client, urls, cache)
+            repeat = page_view(client, urls, cache)
+            print(f"{name:<10} {first[0]:>16} {first[1]:>9} {repeat[0]:>13} {repeat[1]:>9}")
+
+        started = time.perf_counter()
+        build()
+        print(f"повторная сборка (файлы на месте): {(time.perf_counter() - started) * 1e3:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
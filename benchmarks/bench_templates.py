@@ -0,0 +1,88 @@
+"""Холодный старт шаблонов: время компиляции, первый рендер и память процесса.
+
+Каждый вариант — в свежем процессе; память меряется, когда окружения скомпилировали
+всё, что рендерят их модули:
+    три окружения     — как раньше: main.py, admin.py и auth.py со своим Jinja2Templates без кэша,
+                        шаблоны компилируются при первом рендере;
+    общее, без кэша   — одно окружение, precompile() всех шаблонов;
+    общее, холодный   — то же с пустым FileSystemBytecodeCache;
+    общее, тёплый     — повторный старт с заполненным кэшем.
+    python -m benchmarks.bench_templates --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Что компилирует окружение каждого модуля в прежней схеме (страницы + то, что они включают)
+COMMON = ["base.html", "_user_nav.html"]
+MODULE_TEMPLATES = {
+    "main": COMMON + ["index.html", "rooms.html", "gallery.html", "about.html", "feedback.html", "booking.html",
+                      "booking_success.html", "my_bookings.html", "settings.html", "admin_bookings.html",
+                      "_booking_filters.html", "_booking_pager.html", "edit_room.html"],
+    "admin": COMMON + ["admin.html", "admin_calendar.html", "edit_room.html", "_booking_filters.html",
+                       "_booking_pager.html"],
+    "auth": COMMON + ["login.html", "register.html"],
+}
+
+CHILD = """
+import json, os, sys, time
+
+def rss_kib():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+from fastapi.templating import Jinja2Templates
+import templating
+variant, cache_dir, sets = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+before = rss_kib()
+started = time.perf_counter()
+if variant == "old":
+    # Раньше на старте ничего не компилировалось: первый запрос платил за разбор сам
+    envs = [Jinja2Templates(env=templating.create_environment(bytecode_cache="")).env for _ in sets]
+else:
+    envs = [templating.create_environment(bytecode_cache=cache_dir)]
+    templating.precompile(envs[0])
+startup_ms = (time.perf_counter() - started) * 1e3
+started = time.perf_counter()
+envs[0].get_template("index.html").render(request=None, user=None)
+render_ms = (time.perf_counter() - started) * 1e3
+# Установившееся состояние: каждое окружение скомпилировало всё, что рендерит его модуль
+for env, names in zip(envs, sets.values()):
+    for name in names:
+        env.get_template(name)
+print(json.dumps({"startup": startup_ms, "render": render_ms, "rss": rss_kib() - before}))
+"""
+
+
+def run(variant, cache_dir):
+    output = subprocess.run([sys.executable, "-c", CHILD, variant, cache_dir, json.dumps(MODULE_TEMPLATES)],
+                            check=True, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.getcwd()})
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'вариант':<18} {'старт, мс':>10} {'1-й рендер /, мс':>17} {'+RSS, КиБ':>10}")
+    for label, variant, warm in (("три окружения", "old", False), ("общее, без кэша", "shared", None),
+                                 ("общее, холодный", "shared", False), ("общее, тёплый", "shared", True)):
+        results = []
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                if warm is None:
+                    cache_dir = ""
+                elif warm:
+                    run(variant, cache_dir)
+                results.append(run(variant, cache_dir))
+        results.sort(key=lambda result: result["render"])
+        median = results[len(results) // 2]
+        print(f"{label:<18} {median['startup']:>10.1f} {median['render']:>17.2f} {median['rss']:>10}")
+
+
+if __name__ == "__main__":
+    main()
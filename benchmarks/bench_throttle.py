@@ -0,0 +1,119 @@
+"""Перебор паролей с одного адреса: сколько хэшей он заставляет считать и как это бьёт по сайту.
+
+Бот с постоянной частотой перебирает имена с неверным паролем, пробы открывают /about, настоящий
+пользователь с другого адреса входит раз в полсекунды. Прогон без лимита и с лимитами RATE_LIMITS:
+    python -m benchmarks.bench_throttle --rate 100 --duration 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+async def storm(app, rate, attackers, duration, hashes):
+    import httpx
+
+    attack = httpx.ASGITransport(app=app, client=("203.0.113.7", 40000))
+    honest = httpx.ASGITransport(app=app, client=("198.51.100.1", 40000))
+    deadline = time.monotonic() + duration
+    stats = {"attempts": 0, "rejected": 0, "logins": 0, "login_failures": 0, "backlog": 0}
+    probe_latencies = []
+
+    async def attempt(client, number):
+        response = await client.post("/auth/login", data={"username": f"victim{number % attackers}-{number % 50}",
+                                                          "password": "wrong"})
+        stats["attempts"] += 1
+        stats["rejected"] += response.status_code == 429
+
+    async def attacker():
+        # Открытая нагрузка: бот шлёт попытки с постоянной частотой, не дожидаясь ответов
+        async with httpx.AsyncClient(transport=attack, base_url="http://bench") as client:
+            pending, number = set(), 0
+            while time.monotonic() < deadline:
+                task = asyncio.create_task(attempt(client, number))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                number += 1
+                await asyncio.sleep(1 / rate)
+            stats["backlog"] = len(pending)
+            for task in list(pending):
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def probe():
+        async with httpx.AsyncClient(transport=honest, base_url="http://bench") as client:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                await client.get("/about")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+    async def user():
+        async with httpx.AsyncClient(transport=honest, base_url="http://bench") as client:
+            while time.monotonic() < deadline:
+                response = await client.post("/auth/login", data={"username": "guest", "password": "secret123"})
+                if response.headers.get("location") == "/":
+                    stats["logins"] += 1
+                else:
+                    stats["login_failures"] += 1
+                await asyncio.sleep(0.5)
+
+    hashes[0] = 0
+    await asyncio.gather(attacker(), probe(), user())
+    probe_latencies.sort()
+    return (stats, hashes[0] / duration, probe_latencies[len(probe_latencies) // 2] * 1e3,
+            probe_latencies[int(len(probe_latencies) * 0.99)] * 1e3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=100, help="попыток в секунду")
+    parser.add_argument("--attackers", type=int, default=32, help="сколько групп по 50 атакуемых имён")
+    parser.add_argument("--duration", type=float, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'throttle.db')}"
+        import auth
+        import main as app_module
+        from database import Base, SessionLocal, engine
+        from models import User
+        from passwords import hash_password
+        from throttling import RATE_LIMITS, throttle
+
+        Base.metadata.create_all(bind=engine)
+        hashed = hash_password("secret123")
+        with SessionLocal() as db:
+            # Чтобы неверный пароль стоил хэша, атакуемые имена существуют
+            db.add_all([User(username=f"victim{i}-{j}", email=f"victim{i}-{j}@example.com", hashed_password=hashed)
+                        for i in range(args.attackers) for j in range(50)])
+            db.add(User(username="guest", email="guest@example.com", hashed_password=hashed))
+            db.commit()
+
+        hashes = [0]
+        verify = auth.verify_password_async
+
+        async def counted(hashed_password, password):
+            result = await verify(hashed_password, password)
+            hashes[0] += 1
+            return result
+
+        auth.verify_password_async = counted
+
+        async def run_all():
+            for enabled in (False, True):
+                throttle.enabled = enabled
+                stats, hash_rate, p50, p99 = await storm(app_module.app, args.rate, args.attackers, args.duration, hashes)
+                print(f"{'да' if enabled else 'нет':>6} {stats['attempts'] / args.duration:>10.0f} "
+                      f"{stats['rejected'] / args.duration:>10.0f} {hash_rate:>9.1f} {p50:>9.1f} {p99:>9.1f} "
+                      f"{stats['logins']:>6}/{stats['logins'] + stats['login_failures']} {stats['backlog']:>8}")
+
+        print("лимиты: " + ", ".join(f"{route}:{kind}={limit.capacity:g}/{limit.period:g}"
+                                     for route, kinds in RATE_LIMITS.items() for kind, limit in kinds.items()))
+        print(f"{'лимит':>6} {'попыток/с':>10} {'429/с':>10} {'хэшей/с':>9} {'p50, мс':>9} {'p99, мс':>9} {'входы':>8} {'очередь':>8}")
+        asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Проверка, что пиковая память воркера при экспорте не растёт вместе с объёмом выгрузки.
+
+Для каждого размера генерирует базу, поднимает uvicorn, выкачивает /admin/export/bookings.{csv,xlsx}
+потоком и читает VmHWM процесса. Пик на самой большой выгрузке не должен превышать пик на самой
+маленькой больше чем на --tolerance МиБ:
+    python -m benchmarks.check_export_memory --sizes 20000 400000
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_async import free_port
+
+
+def peak_rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    raise RuntimeError("VmHWM недоступен")
+
+
+def start_server(env, port):
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                              env=env)
+    for _ in range(600):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("uvicorn не поднялся")
+
+
+def measure(size, fmt, token, tmp):
+    database = os.path.join(tmp, f"export-{size}.db")
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}", "METRICS_ENABLED": "0"}
+    if not os.path.exists(database):
+        # Брони делятся между номерами: номеров столько, чтобы история их вместила
+        subprocess.run([sys.executable, "populate_db.py", "--rooms", str(max(50, size // 400)), "--bookings", str(size),
+                        "--users", "100", "--feedback", "0", "--gallery", "0", "--fast"],
+                       env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with sqlite3.connect(database) as conn:
+            conn.execute("INSERT INTO users (username, email, hashed_password, is_admin) "
+                         "VALUES ('export-admin', 'export-admin@example.com', '-', 1)")
+    port = free_port()
+    server = start_server(env, port)
+    try:
+        baseline = peak_rss_kib(server.pid)
+        started = time.perf_counter()
+        received = 0
+        with httpx.stream("GET", f"http://127.0.0.1:{port}/admin/export/bookings.{fmt}?status=all",
+                          cookies={"access_token": token}, timeout=600) as response:
+            response.raise_for_status()
+            for chunk in response.iter_raw():
+                received += len(chunk)
+        elapsed = time.perf_counter() - started
+        return baseline, peak_rss_kib(server.pid), received, elapsed
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 400000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"])
+    parser.add_argument("--tolerance", type=float, default=16, help="допустимый рост пика, МиБ")
+    args = parser.parse_args()
+
+    from auth import create_access_token
+
+    token = create_access_token({"sub": "export-admin"})
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'броней':>8} {'формат':>6} {'МиБ':>8} {'с':>6} {'RSS до, МиБ':>12} {'пик, МиБ':>9}")
+        for fmt in args.formats:
+            peaks = []
+            for size in sorted(args.sizes):
+                baseline, peak, received, elapsed = measure(size, fmt, token, tmp)
+                peaks.append(peak)
+                print(f"{size:>8} {fmt:>6} {received / 2 ** 20:>8.1f} {elapsed:>6.1f} "
+                      f"{baseline / 1024:>12.1f} {peak / 1024:>9.1f}")
+            growth = (peaks[-1] - peaks[0]) / 1024
+            ok = growth <= args.tolerance
+            failed |= not ok
+            print(f"    рост пика {fmt}: {growth:+.1f} МиБ — {'OK' if ok else 'растёт с объёмом!'}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Прогон прокси картинок против локального HTTP-источника.
+
+Проверяет подпись ссылок, single-flight (много одновременных запросов — одна загрузка),
+отказ для не-картинок, ошибок источника и внутренних адресов (в том числе после перенаправления),
+LRU-вытеснение по объёму и, если установлен Pillow, миниатюры WebP/JPEG нужной ширины:
+    python -m benchmarks.check_image_cache
+"""
+import asyncio
+import io
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def png(width, height):
+    # Несжимаемый шум, чтобы размер файла был предсказуемым
+    raw = b"".join(b"\x00" + os.urandom(width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+class FakeOrigin:
+    def __init__(self):
+        self.hits = {}
+        self.images = {f"/photo{i}.png": png(400, 100) for i in range(8)}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def _handler(self):
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                origin.hits[self.path] = origin.hits.get(self.path, 0) + 1
+                if self.path == "/slow.png":
+                    time.sleep(0.3)
+                    body, kind = origin.images["/photo0.png"], "image/png"
+                elif self.path in origin.images:
+                    body, kind = origin.images[self.path], "image/png"
+                elif self.path.startswith("/redirect"):
+                    # Перенаправление на другой хост той же машины: должно упереться в проверку адреса
+                    self.send_response(302)
+                    self.send_header("Location", f"http://localhost:{origin.server.server_port}/photo1.png")
+                    self.end_headers()
+                    return
+                elif self.path == "/page.html":
+                    body, kind = b"<html>not an image</html>", "text/html"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+async def scenario(origin, cache_dir, max_bytes):
+    import httpx
+    from fastapi import FastAPI
+
+    import image_cache as module
+
+    app = FastAPI()
+    app.include_router(module.router)
+    # Источник на 127.0.0.1: частные адреса разрешены, но только этот хост
+    module.image_cache = module.ImageCache(cache_dir, max_bytes, hosts=frozenset({"127.0.0.1"}), allow_private=True)
+    failures = []
+
+    def check(condition, message):
+        print(("ok   " if condition else "FAIL ") + message)
+        if not condition:
+            failures.append(message)
+
+    def local(url, **kwargs):
+        return module.image_url(url, **kwargs)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+        slow = f"{origin.url}/slow.png"
+        responses = await asyncio.gather(*(client.get(local(slow)) for _ in range(20)))
+        check(all(r.status_code == 200 for r in responses), "20 одновременных запросов — 200")
+        check(origin.hits.get("/slow.png") == 1, f"источник запрошен {origin.hits.get('/slow.png')} раз (ждали 1)")
+        check(responses[0].headers["content-type"] == "image/png", "Content-Type по сигнатуре файла")
+        check("immutable" in responses[0].headers["cache-control"], "Cache-Control: immutable")
+
+        again = await client.get(local(slow), headers={"if-none-match": responses[0].headers["etag"]})
+        check(again.status_code == 304 and origin.hits["/slow.png"] == 1, "повтор с If-None-Match — 304 без загрузки")
+
+        query = parse_qs(urlsplit(local(slow)).query)
+        forged = await client.get("/img", params={"u": f"{origin.url}/photo1.png", "s": query["s"][0]})
+        check(forged.status_code == 403 and "/photo1.png" not in origin.hits, "чужая подпись — 403, без загрузки")
+        garbled = await client.get("/img", params={"u": f"{origin.url}/photo1.png", "s": "é"})
+        check(garbled.status_code == 403, "подпись не из ASCII — 403")
+        check((await client.get(local(f"{origin.url}/page.html"))).status_code == 502, "HTML вместо картинки — 502")
+        check((await client.get(local(f"{origin.url}/missing.png"))).status_code == 502, "404 источника — 502")
+        check((await client.get(local(f"{origin.url}/redirect.png"))).status_code == 502
+              and "/photo1.png" not in origin.hits, "перенаправление на хост не из списка — 502, без загрузки")
+        strict = module.ImageCache(cache_dir, max_bytes)
+        try:
+            await strict.get(f"{origin.url}/photo1.png")
+            blocked = False
+        except module.ImageError:
+            blocked = "/photo1.png" not in origin.hits
+        await strict.stop()
+        check(blocked, "loopback-адрес без IMAGE_PROXY_ALLOW_PRIVATE — отказ без загрузки")
+
+        if module.thumbnails_enabled():
+            from PIL import Image
+
+            for fmt, media_type in (("webp", "image/webp"), ("jpeg", "image/jpeg")):
+                response = await client.get(local(f"{origin.url}/photo2.png", width=module.IMAGE_WIDTHS[0], fmt=fmt))
+                width = Image.open(io.BytesIO(response.content)).width
+                check(response.headers["content-type"] == media_type and width <= module.IMAGE_WIDTHS[0],
+                      f"миниатюра {fmt}: {media_type}, ширина {width}")
+            check(origin.hits["/photo2.png"] == 1, "миниатюры строятся из одного скачанного оригинала")
+            limit, module.IMAGE_MAX_PIXELS = module.IMAGE_MAX_PIXELS, 1000
+            response = await client.get(local(f"{origin.url}/photo3.png", width=module.IMAGE_WIDTHS[0]))
+            module.IMAGE_MAX_PIXELS = limit
+            check(response.status_code == 502, "исходник больше IMAGE_MAX_PIXELS — 502 без распаковки")
+        else:
+            print("skip миниатюры: Pillow не установлен, отдаются оригиналы")
+
+        for i in range(8):
+            await client.get(local(f"{origin.url}/photo{i}.png"))
+        disk = module.image_cache.disk
+        on_disk = sum(os.path.getsize(os.path.join(root, name))
+                      for root, _, names in os.walk(cache_dir) for name in names)
+        check(on_disk <= max_bytes and disk.evictions > 0,
+              f"на диске {on_disk} Б при лимите {max_bytes} Б, вытеснено {disk.evictions}")
+        hits = origin.hits["/photo7.png"]
+        await client.get(local(f"{origin.url}/photo7.png"))
+        check(origin.hits["/photo7.png"] == hits, "недавний файл остался в кэше")
+        await client.get(local(f"{origin.url}/photo0.png"))
+        check(origin.hits["/photo0.png"] == 2, "давний файл вытеснен и скачан заново")
+        # Файл, который вытеснил соседний воркер, пока запись ещё числится в кэше этого процесса
+        name = next(name for name in reversed(disk._entries) if name.endswith(".orig"))
+        os.remove(disk.path(name))
+        hits = dict(origin.hits)
+        response = await client.get(local(f"{origin.url}/photo0.png"))
+        check(response.status_code == 200 and sum(origin.hits.values()) == sum(hits.values()) + 1,
+              "файл удалён с диска в обход кэша — 200 и одна новая загрузка")
+    await module.image_cache.stop()
+    return failures
+
+
+def main():
+    os.environ.setdefault("IMAGE_PROXY_SECRET", "check-image-cache")
+    with tempfile.TemporaryDirectory() as cache_dir, FakeOrigin() as origin:
+        # Помещаются примерно три оригинала из восьми
+        max_bytes = len(origin.images["/photo0.png"]) * 3 + 100
+        failures = asyncio.run(scenario(origin, cache_dir, max_bytes))
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Прогон OutboxWorker против локального фейкового Telegram API.
+
+Проверяет пакетную отправку, экспоненциальный backoff, размыкание цепи
+при отказах API и доставку после восстановления, а также таймаут на зависший сокет:
+    python -m benchmarks.check_outbox
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.mode = "ok"  # ok / fail / hang
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.requests.append((self.path, body, fake.mode))
+                if fake.mode == "hang":
+                    time.sleep(2)
+                status = 200 if fake.mode == "ok" else 500
+                payload = json.dumps({"ok": status == 200}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+async def scenario(fake):
+    from sqlalchemy import func, select
+
+    from database import AsyncSessionLocal, Base, engine
+    from models import OutboxMessage
+    from notifications import CircuitBreaker, OutboxWorker, enqueue_telegram
+
+    Base.metadata.create_all(bind=engine)
+
+    async def enqueue(count, prefix):
+        async with AsyncSessionLocal() as db:
+            for i in range(count):
+                enqueue_telegram(db, f"<b>{prefix}</b> бронь {i}\n" + "x" * 300)
+            await db.commit()
+
+    async def counts():
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status))
+            return dict(rows.all())
+
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.5)
+    worker = OutboxWorker(api_url=fake.url, token="test", chat_id="1", batch_size=50,
+                          poll_interval=0.05, backoff_base=0.05, timeout=0.5, breaker=breaker)
+    await worker.start()
+    try:
+        await enqueue(40, "ok")
+        worker.notify()
+        await asyncio.sleep(0.5)
+        sent = (await counts()).get("sent", 0)
+        print(f"пакетная отправка: {sent} сообщений за {len(fake.requests)} HTTP-запросов")
+        assert sent == 40 and len(fake.requests) < 40
+
+        fake.mode = "fail"
+        fake.requests.clear()
+        await enqueue(5, "fail")
+        worker.notify()
+        await asyncio.sleep(1.0)
+        failed_calls = len(fake.requests)
+        print(f"API недоступен: {failed_calls} попыток за 1 с, цепь {breaker.state}")
+        assert breaker.failures >= 3 and failed_calls < 10
+
+        fake.mode = "ok"
+        await asyncio.sleep(1.5)
+        print(f"после восстановления: {await counts()}, цепь {breaker.state}")
+        assert (await counts()).get("sent") == 45 and breaker.state == "closed"
+
+        fake.mode = "hang"
+        await enqueue(1, "hang")
+        started = time.perf_counter()
+        worker.notify()
+        await asyncio.sleep(0.8)
+        print(f"зависший API: отправка прервана по таймауту, {await counts()}")
+        assert (await counts()).get("pending") == 1 and time.perf_counter() - started < 2
+    finally:
+        await worker.stop()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'outbox.db')}"
+        os.environ["TELEGRAM_BOT_TOKEN"] = "test"
+        os.environ["TELEGRAM_CHAT_ID"] = "1"
+        with FakeTelegram() as fake:
+            asyncio.run(scenario(fake))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
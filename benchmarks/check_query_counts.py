@@ -0,0 +1,93 @@
+"""Проверка, что число SQL-запросов на страницу не зависит от объёма данных (нет N+1).
+
+Страницы открываются на маленькой и на большой базе, число запросов должно совпасть.
+Приложение работает с SQL_PROFILE=strict: страница сверх бюджета (SQL_QUERY_BUDGET, SQL_QUERY_BUDGETS)
+падает с QueryBudgetExceeded, повторяющиеся формы запросов печатаются как кандидаты в N+1:
+    python -m benchmarks.check_query_counts
+"""
+import os
+import tempfile
+from datetime import date, timedelta
+
+PAGES = [
+    ("anon", "/rooms"),
+    ("anon", "/gallery"),
+    ("user", "/my-bookings"),
+    ("admin", "/admin"),
+    ("admin", "/admin?status=all"),
+    ("admin", "/admin/bookings"),
+    ("admin", "/admin/bookings?status=active&sort=check_in"),
+]
+
+
+def seed(rooms, bookings_per_room):
+    from database import Base, SessionLocal, engine
+    from models import Booking, GalleryImage, Room, RoomImage, User
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        admin = User(username="admin", email="admin@example.com", is_admin=True, hashed_password="-")
+        guest = User(username="guest", email="guest@example.com", is_admin=False, hashed_password="-")
+        db.add_all([admin, guest])
+        db.flush()
+        for i in range(rooms):
+            room = Room(name=f"Номер {i}", price=3000)
+            room.images = [RoomImage(url=f"https://example.com/{i}/{j}.jpg") for j in range(3)]
+            db.add(room)
+            db.add(GalleryImage(url=f"https://example.com/g{i}.jpg"))
+            db.flush()
+            for j in range(bookings_per_room):
+                check_in = date(2026, 1, 1) + timedelta(days=j * 5)
+                db.add(Booking(room_id=room.id, user_id=guest.id, fullname="Гость", status="pending",
+                               check_in=check_in, check_out=check_in + timedelta(days=3)))
+        db.commit()
+
+
+def measure(client, tokens):
+    from auth import identity_cache
+    from db_profiling import QueryCounter
+    from page_cache import page_cache
+
+    # Сравниваем запросы самих страниц, без попаданий в кэши
+    identity_cache.ttl = 0
+    counts = {}
+    for who, path in PAGES:
+        page_cache.invalidate()
+        client.cookies.clear()
+        if who in tokens:
+            client.cookies.set("access_token", tokens[who])
+        with QueryCounter() as counter:
+            response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        counts[(who, path)] = counter.count
+    return counts
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'queries.db')}"
+        os.environ.setdefault("SQL_PROFILE", "strict")
+        from fastapi.testclient import TestClient
+
+        import main as app_module
+        from auth import create_access_token
+
+        tokens = {"user": create_access_token({"sub": "guest"}), "admin": create_access_token({"sub": "admin"})}
+        client = TestClient(app_module.app)
+        seed(rooms=3, bookings_per_room=2)
+        small = measure(client, tokens)
+        seed(rooms=40, bookings_per_room=10)
+        large = measure(client, tokens)
+
+    failed = False
+    for key in small:
+        ok = small[key] == large[key]
+        failed |= not ok
+        print(f"{key[1]:<44} {small[key]:>3} {large[key]:>3} {'OK' if ok else 'N+1!'}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Нагрузочный прогон всего приложения: смесь реальных сценариев на временной базе.
+
+Поднимает uvicorn с приложением из main.py на одноразовой SQLite, Telegram подменяется
+локальным фейковым API (сеть не нужна). Сценарии:
+    browse — аноним листает /, /rooms, /gallery, /about;
+    book   — гость входит, открывает форму и бронирует, смотрит свои брони;
+    admin  — администратор просматривает список и подтверждает брони.
+Для каждого маршрута печатаются запр/с, p50/p95/p99 и число SQL-запросов на запрос;
+результат пишется в JSON, два JSON сравниваются через --compare:
+    python -m benchmarks.loadtest --users 20 --duration 20
+    python -m benchmarks.loadtest --compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+
+from benchmarks.bench_async import free_port, wait_ready
+from benchmarks.check_outbox import FakeTelegram
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+PASSWORD = "secret123"
+ROOMS = 20
+GUESTS = 200
+
+_sql_count = contextvars.ContextVar("sql_count", default=None)
+
+
+def _count_statement(*args):
+    counter = _sql_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class SQLCountMiddleware:
+    """Считает SQL-запросы каждого HTTP-запроса и отдаёт их в заголовке X-SQL-Queries."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        counter = [0]
+        token = _sql_count.set(counter)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-sql-queries", str(counter[0]).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _sql_count.reset(token)
+
+
+def create_app():
+    # Вызывается uvicorn в дочернем процессе (--factory)
+    from sqlalchemy import event
+
+    import main
+    from db_profiling import ALL_ENGINES
+
+    for sync_engine in ALL_ENGINES:
+        event.listen(sync_engine, "before_cursor_execute", _count_statement)
+    main.app.add_middleware(SQLCountMiddleware)
+    return main.app
+
+
+def seed(url):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from database import Base
+    from models import Booking, GalleryImage, Room, RoomImage, User
+    from passwords import hash_password
+
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    hashed = hash_password(PASSWORD)
+    with Session(engine) as db:
+        for i in range(ROOMS):
+            room = Room(name=f"Номер {i}", description="Тестовый номер", price=3000 + i * 100, capacity=2)
+            room.images = [RoomImage(url=f"https://example.com/{i}/{j}.jpg") for j in range(4)]
+            db.add(room)
+            db.add(GalleryImage(url=f"https://example.com/g{i}.jpg", caption=f"Фото {i}", category="rooms"))
+        db.add(User(username="admin", email="admin@example.com", hashed_password=hashed, is_admin=True))
+        db.add_all([User(username=f"guest{i}", email=f"guest{i}@example.com", hashed_password=hashed)
+                    for i in range(GUESTS)])
+        db.flush()
+        # История: завершённые брони за прошлые годы, чтобы списки не были пустыми
+        start = date.today() - timedelta(days=3 * 365)
+        db.add_all([
+            Booking(room_id=i % ROOMS + 1, user_id=i % GUESTS + 2, fullname=f"Гость {i}", phone="+7",
+                    email=f"guest{i}@example.com", status="completed",
+                    check_in=start + timedelta(days=i // ROOMS * 3),
+                    check_out=start + timedelta(days=i // ROOMS * 3 + 2))
+            for i in range(ROOMS * 300)
+        ])
+        db.commit()
+    engine.dispose()
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def request(self, client, label, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            return None
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            return response
+        queries = int(response.headers.get("x-sql-queries", 0))
+        self.samples.setdefault(label, []).append((elapsed, queries))
+        return response
+
+
+async def browse(client, recorder, rng, deadline):
+    while time.monotonic() < deadline:
+        await recorder.request(client, "GET /", "GET", "/")
+        await recorder.request(client, "GET /rooms", "GET", "/rooms")
+        await recorder.request(client, "GET /gallery", "GET", "/gallery")
+        if rng.random() < 0.3:
+            await recorder.request(client, "GET /about", "GET", "/about")
+
+
+async def book(client, recorder, rng, deadline, guest):
+    await recorder.request(client, "POST /auth/login", "POST", "/auth/login",
+                           data={"username": f"guest{guest}", "password": PASSWORD})
+    while time.monotonic() < deadline:
+        room_id = rng.randint(1, ROOMS)
+        await recorder.request(client, "GET /rooms", "GET", "/rooms")
+        await recorder.request(client, "GET /book/{room_id}", "GET", f"/book/{room_id}")
+        check_in = date.today() + timedelta(days=rng.randint(1, 365))
+        response = await recorder.request(client, "POST /book", "POST", "/book", data={
+            "room_id": room_id, "fullname": f"Гость {guest}", "phone": "+79990000000",
+            "email": f"guest{guest}@example.com", "check_in": check_in.isoformat(),
+            "check_out": (check_in + timedelta(days=rng.randint(1, 5))).isoformat(),
+        })
+        location = response.headers.get("location", "") if response is not None else ""
+        if location.startswith("/book/success/"):
+            await recorder.request(client, "GET /book/success/{id}", "GET", location)
+        await recorder.request(client, "GET /my-bookings", "GET", "/my-bookings")
+
+
+async def admin(client, recorder, rng, deadline):
+    await recorder.request(client, "POST /auth/login", "POST", "/auth/login",
+                           data={"username": "admin", "password": PASSWORD})
+    while time.monotonic() < deadline:
+        response = await recorder.request(client, "GET /admin/bookings", "GET", "/admin/bookings")
+        pending = re.findall(r"/admin/bookings/confirm/(\d+)", response.text) if response is not None else []
+        if pending:
+            booking_id = rng.choice(pending)
+            await recorder.request(client, "POST /admin/bookings/confirm/{id}", "POST",
+                                   f"/admin/bookings/confirm/{booking_id}")
+        await recorder.request(client, "GET /admin", "GET", "/admin")
+        # Администратор работает медленнее гостей
+        await asyncio.sleep(0.2)
+
+
+async def drive(base_url, mix, users, duration, seed_value):
+    recorder = Recorder()
+    rng = random.Random(seed_value)
+    total = sum(mix.values())
+    counts = {name: max(1, round(users * weight / total)) for name, weight in mix.items() if weight > 0}
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+
+    async def user(scenario, index):
+        user_rng = random.Random(rng.random())
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            if scenario == "browse":
+                await browse(client, recorder, user_rng, deadline)
+            elif scenario == "book":
+                await book(client, recorder, user_rng, deadline, index % GUESTS)
+            else:
+                await admin(client, recorder, user_rng, deadline)
+
+    await asyncio.gather(*(user(scenario, i) for scenario, count in counts.items() for i in range(count)))
+    return recorder, counts
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def summarize(recorder, duration):
+    routes = {}
+    for label in sorted(set(recorder.samples) | set(recorder.errors)):
+        samples = recorder.samples.get(label, [])
+        latencies = sorted(elapsed for elapsed, _ in samples)
+        queries = [count for _, count in samples]
+        routes[label] = {
+            "requests": len(samples),
+            "errors": recorder.errors.get(label, 0),
+            "rps": len(samples) / duration,
+            "p50_ms": percentile(latencies, 0.5) * 1e3 if latencies else None,
+            "p95_ms": percentile(latencies, 0.95) * 1e3 if latencies else None,
+            "p99_ms": percentile(latencies, 0.99) * 1e3 if latencies else None,
+            "sql_per_request": sum(queries) / len(queries) if queries else None,
+        }
+    latencies = sorted(elapsed for samples in recorder.samples.values() for elapsed, _ in samples)
+    queries = [count for samples in recorder.samples.values() for _, count in samples]
+    total = {
+        "requests": len(latencies),
+        "errors": sum(recorder.errors.values()),
+        "rps": len(latencies) / duration,
+        "p50_ms": percentile(latencies, 0.5) * 1e3 if latencies else None,
+        "p95_ms": percentile(latencies, 0.95) * 1e3 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1e3 if latencies else None,
+        "sql_per_request": sum(queries) / len(queries) if queries else None,
+    }
+    return routes, total
+
+
+def print_table(routes, total):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else format("-", ">" + spec.split(".")[0])
+
+    print(f"{'маршрут':<36} {'запр/с':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'SQL':>6} {'ошибок':>7}")
+    for label, row in [*routes.items(), ("ИТОГО", total)]:
+        print(f"{label:<36} {row['rps']:>8.1f} {fmt(row['p50_ms'], '8.1f')} {fmt(row['p95_ms'], '8.1f')} "
+              f"{fmt(row['p99_ms'], '8.1f')} {fmt(row['sql_per_request'], '6.1f')} {row['errors']:>7}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old_path, new_path):
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'маршрут':<36} {'запр/с':>16} {'p95, мс':>16} {'p99, мс':>16} {'SQL':>12}")
+    for label in sorted(set(old["routes"]) | set(new["routes"])) + ["ИТОГО"]:
+        before = old["total"] if label == "ИТОГО" else old["routes"].get(label)
+        after = new["total"] if label == "ИТОГО" else new["routes"].get(label)
+        if not before or not after:
+            print(f"{label:<36} {'только в ' + (new if after else old)['commit']:>16}")
+            continue
+        cells = []
+        for key, width in (("rps", 16), ("p95_ms", 16), ("p99_ms", 16), ("sql_per_request", 12)):
+            if before[key] is None or after[key] is None:
+                cells.append(format("-", f">{width}"))
+                continue
+            change = (after[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(format(f"{after[key]:.1f} ({change:+.0f}%)", f">{width}"))
+        print(f"{label:<36} {' '.join(cells)}")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("browse", "book", "admin"):
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20, help="виртуальных пользователей")
+    parser.add_argument("--mix", type=parse_mix, default="browse=70,book=25,admin=5")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON с результатами (по умолчанию results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp, FakeTelegram() as telegram:
+        url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        seed(url)
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        # Виртуальные пользователи идут с одного адреса — лимит частоты входа выключен
+        env = {**os.environ, "DATABASE_URL": url, "TELEGRAM_BOT_TOKEN": "bench", "TELEGRAM_CHAT_ID": "1",
+               "TELEGRAM_API_URL": telegram.url, "RATE_LIMIT_ENABLED": "0"}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.loadtest:create_app",
+             "--port", str(port), "--log-level", "warning", "--backlog", "4096"],
+            env=env,
+        )
+        try:
+            wait_ready(base_url)
+            if args.warmup:
+                asyncio.run(drive(base_url, args.mix, args.users, args.warmup, args.seed + 1))
+            recorder, counts = asyncio.run(drive(base_url, args.mix, args.users, args.duration, args.seed))
+        finally:
+            server.terminate()
+            server.wait()
+
+    routes, total = summarize(recorder, args.duration)
+    print_table(routes, total)
+    print(f"Telegram: {len(telegram.requests)} запросов к фейковому API")
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {"users": args.users, "mix": args.mix, "scenario_users": counts,
+                   "duration": args.duration, "seed": args.seed},
+        "total": total,
+        "routes": routes,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{result['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(result, file, ensure_ascii=False, indent=2)
+    print(f"результат: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import heapq
+import os
+from datetime import date
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode
+
+from sqlalchemy import and_, or_, select, tuple_
+from sqlalchemy.orm import Session, joinedload
+
+from models import Booking
+
+BOOKING_STATUSES = ("pending", "confirmed", "cancelled", "completed")
+# Группы статусов для фильтра; None — без фильтра по статусу
+STATUS_GROUPS = {"active": ("pending", "confirmed"), "all": None}
+ADMIN_BOOKINGS_PAGE_SIZE = int(os.getenv("ADMIN_BOOKINGS_PAGE_SIZE", 50))
+
+# Сортировка: колонки ключа (id всегда последний — ключ уникален) и направление
+SORTS = {
+    "new": ((Booking.id,), True),
+    "old": ((Booking.id,), False),
+    "check_in": ((Booking.check_in, Booking.id), False),
+    "check_in_desc": ((Booking.check_in, Booking.id), True),
+}
+
+# Верхняя граница для поиска по префиксу диапазоном: col >= q AND col < q + PREFIX_END
+PREFIX_END = "\U0010ffff"
+
+
+def _parse_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_date(value) -> Optional[date]:
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BookingFilters:
+    """Фильтры, сортировка и курсор списка броней из query-параметров."""
+
+    def __init__(self, status="active", room_id=None, date_from=None, date_to=None, q="", sort="new",
+                 after=None, limit=ADMIN_BOOKINGS_PAGE_SIZE):
+        self.status = status
+        self.room_id = room_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.q = q
+        self.sort = sort
+        self.after = after
+        self.limit = limit
+
+    @classmethod
+    def from_query(cls, params, default_status="active"):
+        # Некорректные значения молча отбрасываются, как и прежний ?status=
+        status = params.get("status") or default_status
+        if status not in STATUS_GROUPS and status not in BOOKING_STATUSES:
+            status = default_status
+        sort = params.get("sort") if params.get("sort") in SORTS else "new"
+        limit = _parse_int(params.get("limit")) or ADMIN_BOOKINGS_PAGE_SIZE
+        filters = cls(
+            status=status,
+            room_id=_parse_int(params.get("room")),
+            date_from=_parse_date(params.get("from")),
+            date_to=_parse_date(params.get("to")),
+            q=(params.get("q") or "").strip(),
+            sort=sort,
+            limit=max(1, min(limit, 500)),
+        )
+        filters.after = filters.decode_cursor(params.get("after"))
+        return filters
+
+    @property
+    def statuses(self) -> Optional[Tuple[str, ...]]:
+        if self.status in STATUS_GROUPS:
+            return STATUS_GROUPS[self.status]
+        return (self.status,)
+
+    def key(self, booking: Booking) -> tuple:
+        columns, _ = SORTS[self.sort]
+        return tuple(getattr(booking, column.key) for column in columns)
+
+    def encode_cursor(self, booking: Booking) -> str:
+        return "_".join(str(value) for value in self.key(booking))
+
+    def decode_cursor(self, value) -> Optional[tuple]:
+        if not value:
+            return None
+        parts = value.split("_")
+        columns, _ = SORTS[self.sort]
+        if len(parts) != len(columns):
+            return None
+        ident = _parse_int(parts[-1])
+        if ident is None:
+            return None
+        if len(parts) == 1:
+            return (ident,)
+        day = _parse_date(parts[0])
+        return (day, ident) if day else None
+
+    def query_string(self, **overrides) -> str:
+        params = {
+            "status": self.status,
+            "room": self.room_id,
+            "from": self.date_from,
+            "to": self.date_to,
+            "q": self.q,
+            "sort": self.sort,
+        }
+        params.update(overrides)
+        return urlencode({name: value for name, value in params.items() if value not in (None, "")})
+
+
+class BookingPage:
+    __slots__ = ("bookings", "next_cursor")
+
+    def __init__(self, bookings: List[Booking], next_cursor: Optional[str]):
+        self.bookings = bookings
+        self.next_cursor = next_cursor
+
+
+def apply_filters(query, filters: BookingFilters):
+    """Условия фильтров без статуса и курсора — общие для страницы списка и экспорта."""
+    if filters.room_id is not None:
+        query = query.where(Booking.room_id == filters.room_id)
+    # Диапазон по дате заезда (включительно): обе границы на одной колонке идут в индекс,
+    # а условие «пересекается с периодом» заставило бы сканировать всю историю до from
+    if filters.date_from:
+        query = query.where(Booking.check_in >= filters.date_from)
+    if filters.date_to:
+        query = query.where(Booking.check_in <= filters.date_to)
+    if filters.q:
+        # Префикс по имени или email диапазоном, а не LIKE: так SQLite берёт индекс
+        query = query.where(or_(
+            and_(Booking.fullname >= filters.q, Booking.fullname < filters.q + PREFIX_END),
+            and_(Booking.email >= filters.q, Booking.email < filters.q + PREFIX_END),
+        ))
+    return query
+
+
+def _page_query(filters: BookingFilters, status: Optional[str]):
+    columns, descending = SORTS[filters.sort]
+    query = select(Booking).options(joinedload(Booking.room))
+    if status is not None:
+        query = query.where(Booking.status == status)
+    query = apply_filters(query, filters)
+    if len(columns) > 1:
+        # Брони без дат в сортировку по датам не попадают
+        query = query.where(Booking.check_in.isnot(None))
+    if filters.after is not None:
+        key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        bound = tuple_(*filters.after) if len(columns) > 1 else filters.after[0]
+        query = query.where(key < bound if descending else key > bound)
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return query.order_by(*order).limit(filters.limit + 1)
+
+
+def fetch_booking_page(db: Session, filters: BookingFilters) -> BookingPage:
+    """Одна страница броней по курсору: цена не зависит от глубины листания и размера таблицы."""
+    statuses = filters.statuses
+    _, descending = SORTS[filters.sort]
+    if statuses is None or len(statuses) == 1:
+        rows = db.scalars(_page_query(filters, statuses[0] if statuses else None)).unique().all()
+    else:
+        # IN по нескольким статусам SQLite не отдаёт по индексу в нужном порядке —
+        # берём по странице на каждый статус и сливаем уже отсортированные списки
+        per_status = [db.scalars(_page_query(filters, status)).unique().all() for status in statuses]
+        rows = list(heapq.merge(*per_status, key=filters.key, reverse=descending))[:filters.limit + 1]
+    next_cursor = filters.encode_cursor(rows[filters.limit - 1]) if len(rows) > filters.limit else None
+    return BookingPage(rows[:filters.limit], next_cursor)
@@ -1,12 +1,74 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./hotel.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./hotel.db")
+# Та же база через aiosqlite для асинхронных обработчиков
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+# "production" включает WAL и прагмы ниже, "default" оставляет настройки SQLite как есть
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+
+PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),  # в КиБ, если отрицательное
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),  # мс
+}
+
+def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in PRODUCTION_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def _set_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def _configure(sync_engine, read_only=False):
+    if DB_PROFILE == "production":
+        event.listen(sync_engine, "connect", _set_pragmas)
+    if read_only:
+        event.listen(sync_engine, "connect", _set_query_only)
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+# Отдельный пул только для чтения: GET-обработчики не занимают соединения писателей
+read_engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+_configure(engine)
+_configure(read_engine, read_only=True)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+async_read_engine = create_async_engine(ASYNC_DATABASE_URL)
+_configure(async_engine.sync_engine)
+_configure(async_read_engine.sync_engine, read_only=True)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
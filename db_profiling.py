@@ -0,0 +1,217 @@
+import os
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from database import async_engine, async_read_engine, engine, read_engine
+from metrics import route_label
+
+ALL_ENGINES = (engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine)
+
+
+class QueryCounter:
+    """Считает SQL-запросы ко всем движкам приложения внутри блока with."""
+
+    def __init__(self, engines=ALL_ENGINES):
+        self.engines = engines
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for sync_engine in self.engines:
+            event.listen(sync_engine, "before_cursor_execute", self._before_execute)
+        return self
+
+    def __exit__(self, *exc):
+        for sync_engine in self.engines:
+            event.remove(sync_engine, "before_cursor_execute", self._before_execute)
+
+
+@contextmanager
+def assert_num_queries(expected: int, engines=ALL_ENGINES):
+    with QueryCounter(engines) as counter:
+        yield counter
+    if counter.count != expected:
+        statements = "\n".join(counter.statements)
+        raise AssertionError(f"Ожидалось {expected} SQL-запросов, выполнено {counter.count}:\n{statements}")
+
+
+# --- Профилирование запросов по HTTP-запросам (включается SQL_PROFILE) ---
+
+# "1" — журнал медленных запросов и кандидатов в N+1, "strict" — вдобавок падать при превышении бюджета
+SQL_PROFILE = os.getenv("SQL_PROFILE", "")
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", 100))
+# Сколько одинаковых по форме запросов за один HTTP-запрос считать подозрением на N+1
+SQL_NPLUS1_THRESHOLD = int(os.getenv("SQL_NPLUS1_THRESHOLD", 5))
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", 20))
+# Отдельные бюджеты по шаблонам маршрутов: "/admin=8,/rooms=3"
+SQL_QUERY_BUDGETS = {
+    route.strip(): int(limit)
+    for route, _, limit in (item.rpartition("=") for item in os.getenv("SQL_QUERY_BUDGETS", "").split(",") if item)
+}
+
+_STRING_OR_NUMBER = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize(statement: str) -> str:
+    """Форма запроса: литералы и списки параметров IN (...) схлопнуты, пробелы нормализованы."""
+    shape = _STRING_OR_NUMBER.sub("?", statement)
+    shape = _PLACEHOLDER_LIST.sub("(?, ...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route = path
+        # форма запроса -> [сколько раз, суммарное время в секундах]
+        self.shapes: Dict[str, list] = {}
+        self.count = 0
+        self.seconds = 0.0
+
+    def record(self, statement: str, seconds: float):
+        entry = self.shapes.get(statement)
+        if entry is None:
+            entry = self.shapes[statement] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        self.count += 1
+        self.seconds += seconds
+
+    def repeated(self, threshold: int = SQL_NPLUS1_THRESHOLD) -> List[Tuple[str, int]]:
+        # Сырые тексты группируем по форме только здесь, а не на каждом запросе
+        counts: Dict[str, int] = {}
+        for statement, (count, _) in self.shapes.items():
+            shape = normalize(statement)
+            counts[shape] = counts.get(shape, 0) + count
+        return sorted(((shape, count) for shape, count in counts.items() if count >= threshold), key=lambda item: -item[1])
+
+    def budget(self) -> int:
+        return SQL_QUERY_BUDGETS.get(self.route, SQL_QUERY_BUDGET)
+
+    def summary(self) -> dict:
+        return {
+            "method": self.method,
+            "route": self.route,
+            "queries": self.count,
+            "sql_ms": round(self.seconds * 1e3, 3),
+            "statements": sorted(
+                ({"statement": normalize(statement), "count": count, "ms": round(seconds * 1e3, 3)}
+                 for statement, (count, seconds) in self.shapes.items()),
+                key=lambda item: -item["ms"],
+            ),
+        }
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+# Последние профили запросов — для отладки из консоли или тестов
+recent_profiles: Deque[dict] = deque(maxlen=int(os.getenv("SQL_PROFILE_HISTORY", 200)))
+
+
+def explain(dbapi_connection, statement: str, parameters) -> List[str]:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        # Строки плана: (id, parent, notused, detail)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _profile_before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _profile_after(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["profile_started"].pop()
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record(statement, elapsed)
+    if elapsed * 1e3 < SQL_SLOW_MS or executemany:
+        return
+    try:
+        plan = explain(conn.connection.dbapi_connection, statement, parameters)
+    except Exception as e:
+        plan = [f"EXPLAIN не удался: {e}"]
+    where = f"{profile.method} {profile.route}" if profile else "вне запроса"
+    print(f"[sql] медленный запрос {elapsed * 1e3:.1f} мс ({where}): {normalize(statement)}\n"
+          + "\n".join(f"    {line}" for line in plan))
+
+
+def _profile_error(exception_context):
+    started = exception_context.connection.info.get("profile_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+class SQLProfileMiddleware:
+    """Собирает SQL каждого HTTP-запроса; в strict-режиме превышение бюджета превращается в 500."""
+
+    def __init__(self, app, strict: bool = False):
+        self.app = app
+        self.strict = strict
+
+    def _check(self, profile: RequestProfile):
+        if profile.count > profile.budget():
+            message = (f"{profile.method} {profile.route}: {profile.count} SQL-запросов при бюджете {profile.budget()}:\n"
+                       + "\n".join(f"{count} x {shape}" for shape, count in profile.repeated(1)))
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            print(f"[sql] бюджет превышен — {message}")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = current_profile.set(profile)
+        root_path = scope.get("root_path", "")
+        checked = False
+
+        async def send_wrapper(message):
+            nonlocal checked
+            if message["type"] == "http.response.start" and not checked:
+                # Проверяем до отправки заголовков, чтобы strict-режим успел ответить 500
+                checked = True
+                profile.route = route_label(scope, root_path)
+                self._check(profile)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            profile.route = route_label(scope, root_path)
+            recent_profiles.append(profile.summary())
+            for shape, count in profile.repeated():
+                print(f"[sql] возможный N+1 в {profile.method} {profile.route}: {count} x {shape}")
+
+
+def setup_profiling(app, mode: str = SQL_PROFILE, engines=ALL_ENGINES):
+    if not mode:
+        return
+    for sync_engine in engines:
+        event.listen(sync_engine, "before_cursor_execute", _profile_before)
+        event.listen(sync_engine, "after_cursor_execute", _profile_after)
+        event.listen(sync_engine, "handle_error", _profile_error)
+    app.add_middleware(SQLProfileMiddleware, strict=mode == "strict")
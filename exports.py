@@ -0,0 +1,198 @@
+import csv
+import io
+import os
+import re
+import zipfile
+from datetime import date
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from sqlalchemy import and_, or_, select
+
+from booking_list import PREFIX_END, SORTS, BookingFilters, apply_filters
+from database import async_read_engine
+from models import Booking, Feedback, Room
+
+# Сколько строк забирать из курсора за раз: память экспорта — одна такая пачка, а не весь файл
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 2000))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+BOOKING_COLUMNS = (
+    ("ID", Booking.id),
+    ("Номер", Room.name),
+    ("Гость", Booking.fullname),
+    ("Телефон", Booking.phone),
+    ("Email", Booking.email),
+    ("Заезд", Booking.check_in),
+    ("Выезд", Booking.check_out),
+    ("Статус", Booking.status),
+)
+FEEDBACK_COLUMNS = (
+    ("ID", Feedback.id),
+    ("Имя", Feedback.fullname),
+    ("Телефон", Feedback.phone),
+    ("Email", Feedback.email),
+    ("Сообщение", Feedback.message),
+)
+
+
+def booking_export_query(filters: BookingFilters):
+    # Только колонки, без ORM-объектов: строки курсора сразу уходят в файл
+    columns, descending = SORTS[filters.sort]
+    query = select(*(column for _, column in BOOKING_COLUMNS)).outerjoin(Room, Room.id == Booking.room_id)
+    if filters.statuses is not None:
+        query = query.where(Booking.status.in_(filters.statuses))
+    query = apply_filters(query, filters)
+    return query.order_by(*(column.desc() if descending else column.asc() for column in columns))
+
+
+def feedback_export_query(q: str = ""):
+    query = select(*(column for _, column in FEEDBACK_COLUMNS))
+    if q:
+        query = query.where(or_(
+            and_(Feedback.fullname >= q, Feedback.fullname < q + PREFIX_END),
+            and_(Feedback.email >= q, Feedback.email < q + PREFIX_END),
+        ))
+    return query.order_by(Feedback.id)
+
+
+async def stream_rows(query, chunk_rows: int = EXPORT_CHUNK_ROWS) -> AsyncIterator[Sequence[tuple]]:
+    """Пачки строк из серверного курсора; соединение своё — сессия запроса к этому времени закрыта."""
+    async with async_read_engine.connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=chunk_rows))
+        async for rows in result.partitions():
+            yield rows
+
+
+# Ячейка, начинающаяся с =, @ или +/- (кроме телефонов и чисел), в Excel станет формулой
+_FORMULA = re.compile(r"[=@\t\r]|[+-](?![\d\s()-]*$)")
+
+
+def _csv_safe(row: Sequence) -> list:
+    return ["'" + value if isinstance(value, str) and _FORMULA.match(value) else value for value in row]
+
+
+async def csv_stream(header: Sequence[str], chunks: AsyncIterator[Sequence[tuple]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM — чтобы Excel открыл кириллицу в UTF-8 без мастера импорта
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    async for rows in chunks:
+        writer.writerows(_csv_safe(row) for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _Sink:
+    """Приёмник для ZipFile без seek/tell: zipfile пишет дескрипторы данных после каждого файла,
+    а готовые байты забираются после каждой пачки строк."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+# Символы, которые запрещены в XML 1.0 и сломали бы лист
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+XLSX_PARTS = (
+    ("[Content_Types].xml",
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ("_rels/.rels",
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+     'Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ("xl/_rels/workbook.xml.rels",
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+     'Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+)
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = "</sheetData></worksheet>"
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, date):
+        value = value.isoformat()
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    # Строки прямо в ячейке (inlineStr): общий словарь строк пришлось бы держать в памяти целиком
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xml_rows(rows: Iterable[Sequence]) -> str:
+    return "".join("<row>" + "".join(_cell(value) for value in row) + "</row>" for row in rows)
+
+
+async def xlsx_stream(header: Sequence[str], chunks: AsyncIterator[Sequence[tuple]],
+                      sheet: str = "Лист1") -> AsyncIterator[bytes]:
+    """Минимальная книга XLSX с одним листом, которая собирается в zip по мере чтения курсора."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS:
+            archive.writestr(name, content)
+        archive.writestr("xl/workbook.xml", WORKBOOK_XML.format(name=escape(sheet, {'"': "&quot;"})))
+        # force_zip64: размер листа заранее неизвестен и может перевалить за 4 ГиБ
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as part:
+            part.write((SHEET_START + _xml_rows([header])).encode("utf-8"))
+            yield sink.take()
+            async for rows in chunks:
+                part.write(_xml_rows(rows).encode("utf-8"))
+                data = sink.take()
+                if data:
+                    yield data
+            part.write(SHEET_END.encode("utf-8"))
+    yield sink.take()
+
+
+def export_stream(fmt: str, columns: Tuple[Tuple[str, object], ...], query, sheet: Optional[str] = None):
+    header = [title for title, _ in columns]
+    chunks = stream_rows(query)
+    if fmt == "xlsx":
+        return xlsx_stream(header, chunks, sheet or "Лист1")
+    return csv_stream(header, chunks)
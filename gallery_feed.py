@@ -0,0 +1,55 @@
+import os
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from image_cache import image_srcset, image_url
+from models import GalleryImage
+
+GALLERY_PAGE_SIZE = int(os.getenv("GALLERY_PAGE_SIZE", 24))
+GALLERY_MAX_PAGE_SIZE = 100
+
+
+class GalleryPage:
+    __slots__ = ("images", "next_cursor")
+
+    def __init__(self, images: List[GalleryImage], next_cursor: Optional[int]):
+        self.images = images
+        self.next_cursor = next_cursor
+
+
+async def fetch_gallery_page(db: AsyncSession, category: Optional[str] = None, after: Optional[int] = None,
+                             limit: int = GALLERY_PAGE_SIZE) -> GalleryPage:
+    """Страница галереи по возрастанию id после курсора; с категорией идёт по индексу (category, id)."""
+    limit = max(1, min(limit, GALLERY_MAX_PAGE_SIZE))
+    query = select(GalleryImage).order_by(GalleryImage.id).limit(limit + 1)
+    if category:
+        query = query.where(GalleryImage.category == category)
+    if after is not None:
+        query = query.where(GalleryImage.id > after)
+    # Лишняя строка лишь говорит, что есть следующая страница
+    images = list((await db.execute(query)).scalars())
+    next_cursor = images[limit - 1].id if len(images) > limit else None
+    return GalleryPage(images[:limit], next_cursor)
+
+
+async def fetch_categories(db: AsyncSession) -> List[str]:
+    rows = await db.execute(
+        select(GalleryImage.category).where(GalleryImage.category.is_not(None), GalleryImage.category != "")
+        .distinct().order_by(GalleryImage.category)
+    )
+    return list(rows.scalars())
+
+
+def image_json(image: GalleryImage) -> dict:
+    # Ссылки уже подписаны для /img: клиенту не нужно знать о прокси
+    return {
+        "id": image.id,
+        "caption": image.caption,
+        "category": image.category,
+        "src": image_url(image.url, 640),
+        "srcset": image_srcset(image.url),
+        "webp_srcset": image_srcset(image.url, "webp"),
+        "full": image_url(image.url, 1600),
+    }
@@ -0,0 +1,360 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import io
+import ipaddress
+import os
+import socket
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow необязателен: без него отдаются только сохранённые оригиналы
+    Image = None
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Подпись ссылок: без неё /img стал бы открытым прокси на любой адрес. Секрета нет — прокси выключен,
+# картинки грузятся браузером прямо с источника
+IMAGE_PROXY_SECRET = os.getenv("IMAGE_PROXY_SECRET") or os.getenv("SECRET_KEY")
+# Хосты, с которых можно скачивать, через запятую; пусто — любой хост с публичным адресом
+IMAGE_PROXY_HOSTS = frozenset(host.strip().lower() for host in os.getenv("IMAGE_PROXY_HOSTS", "").split(",") if host.strip())
+# Частные, loopback и служебные адреса закрыты всегда, "1" — только для локальных прогонов
+IMAGE_PROXY_ALLOW_PRIVATE = os.getenv("IMAGE_PROXY_ALLOW_PRIVATE", "0") == "1"
+IMAGE_MAX_REDIRECTS = int(os.getenv("IMAGE_MAX_REDIRECTS", 3))
+IMAGE_WIDTHS = tuple(int(width) for width in os.getenv("IMAGE_WIDTHS", "320,640,1024,1600").split(","))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", 10))
+IMAGE_MAX_SOURCE_BYTES = int(os.getenv("IMAGE_MAX_SOURCE_BYTES", 20 * 1024 * 1024))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 80))
+# Предел пикселей исходника: маленький файл может распаковаться в гигабайты
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 40_000_000))
+if Image is not None:
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+# Содержимое по подписанной ссылке не меняется: храним, пока не вытеснит LRU
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Формат миниатюры -> (расширение файла, формат Pillow, Content-Type)
+FORMATS = {
+    "webp": (".webp", "WEBP", "image/webp"),
+    "jpeg": (".jpg", "JPEG", "image/jpeg"),
+}
+# Первые байты -> тип; всё остальное (HTML-заглушки, ошибки) не кэшируем и не отдаём
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+router = APIRouter()
+
+
+class ImageError(Exception):
+    pass
+
+
+def sniff(data: bytes) -> Optional[str]:
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, media_type in SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    return None
+
+
+def sign(url: str) -> str:
+    if not IMAGE_PROXY_SECRET:
+        raise ImageError("IMAGE_PROXY_SECRET не задан")
+    digest = hmac.new(IMAGE_PROXY_SECRET.encode(), url.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).decode().rstrip("=")
+
+
+def _proxied(url: Optional[str]) -> bool:
+    return bool(IMAGE_PROXY_SECRET) and bool(url) and url.startswith(("http://", "https://"))
+
+
+def image_url(url: Optional[str], width: Optional[int] = None, fmt: str = "jpeg") -> Optional[str]:
+    """Локальная ссылка на картинку; без ширины — сохранённый оригинал. Локальные пути не трогает."""
+    if not _proxied(url):
+        return url
+    params = {"u": url, "s": sign(url)}
+    if width and Image is not None:
+        params.update(w=width, f=fmt)
+    return "/img?" + urlencode(params)
+
+
+def image_srcset(url: Optional[str], fmt: str = "jpeg") -> str:
+    """srcset по всем ширинам IMAGE_WIDTHS; пусто, если миниатюры не строятся."""
+    if not _proxied(url) or Image is None:
+        return ""
+    return ", ".join(f"{image_url(url, width, fmt)} {width}w" for width in IMAGE_WIDTHS)
+
+
+def thumbnails_enabled() -> bool:
+    return Image is not None
+
+
+def _resize(data: bytes, width: int, fmt: str) -> bytes:
+    _, pillow_format, _ = FORMATS[fmt]
+    with Image.open(io.BytesIO(data)) as image:
+        # Размер известен из заголовка: отказываем до распаковки. Свой предел Pillow (MAX_IMAGE_PIXELS)
+        # до двукратного превышения только предупреждает
+        if image.width * image.height > IMAGE_MAX_PIXELS:
+            raise ValueError(f"картинка {image.width}x{image.height} больше IMAGE_MAX_PIXELS")
+        image.load()
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if pillow_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, pillow_format, quality=IMAGE_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+class DiskLRU:
+    """Файлы кэша с общим лимитом объёма; давно не читанные удаляются первыми.
+
+    Порядок хранится в памяти процесса, на диске — mtime (обновляется при чтении).
+    При переполнении каталог пересканируется, так что учитываются и файлы соседних воркеров.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._scan()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    def _scan(self):
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if filename.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, filename, stat.st_size))
+        found.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in found)
+        self.size = sum(self._entries.values())
+
+    def read(self, name: str) -> Optional[bytes]:
+        """Содержимое файла или None. Блокирует: из обработчиков — через anyio.to_thread.
+
+        Файл читается целиком сразу: путь, отданный наружу, мог бы вытеснить соседний запрос до отправки.
+        """
+        path = self.path(name)
+        with self._lock:
+            if name not in self._entries:
+                # Мог записать соседний воркер
+                try:
+                    self._entries[name] = os.stat(path).st_size
+                except FileNotFoundError:
+                    return None
+                self.size += self._entries[name]
+            self._entries.move_to_end(name)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._entries.pop(name, 0)
+            return None
+        return data
+
+    def put(self, name: str, data: bytes) -> bytes:
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self.size += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            if self.size > self.max_bytes:
+                self._scan()
+                self._entries.move_to_end(name)
+                while self.size > self.max_bytes and len(self._entries) > 1:
+                    victim, size = self._entries.popitem(last=False)
+                    self.size -= size
+                    self.evictions += 1
+                    try:
+                        os.remove(self.path(victim))
+                    except OSError:
+                        # Уже удалён или (в Windows) открыт на чтение: следующий пересчёт найдёт его снова
+                        pass
+        return data
+
+
+class ImageCache:
+    """Прокси картинок: оригинал скачивается один раз, миниатюры строятся по запросу и тоже хранятся на диске.
+
+    Одновременные запросы одного файла ждут одну и ту же загрузку/сборку (single-flight).
+    """
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+                 timeout: float = IMAGE_FETCH_TIMEOUT, max_source_bytes: int = IMAGE_MAX_SOURCE_BYTES,
+                 hosts: frozenset = IMAGE_PROXY_HOSTS, allow_private: bool = IMAGE_PROXY_ALLOW_PRIVATE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_source_bytes = max_source_bytes
+        self.hosts = hosts
+        self.allow_private = allow_private
+        self.fetches = 0
+        self.renders = 0
+        self._disk: Optional[DiskLRU] = None
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def disk(self) -> DiskLRU:
+        if self._disk is None:
+            self._disk = DiskLRU(self.directory, self.max_bytes)
+        return self._disk
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url: str, width: Optional[int] = None, fmt: Optional[str] = None) -> Tuple[bytes, str, str]:
+        """Содержимое оригинала или миниатюры, его Content-Type и ETag."""
+        key = hashlib.sha256(url.encode()).hexdigest()
+        if width:
+            extension, _, media_type = FORMATS[fmt]
+            name = f"{key}.{width}{extension}"
+            data = await self._single_flight(name, lambda: self._render(url, key, name, width, fmt))
+            return data, media_type, name
+        name = f"{key}.orig"
+        data = await self._single_flight(name, lambda: self._fetch(url, name))
+        return data, sniff(data) or "application/octet-stream", name
+
+    async def _single_flight(self, name: str, produce) -> bytes:
+        # Диск читается в потоке: цикл событий не ждёт open() и read()
+        data = await anyio.to_thread.run_sync(self.disk.read, name)
+        if data is not None:
+            return data
+        task = self._inflight.get(name)
+        if task is None:
+            # Отдельная задача: отключившийся первый клиент не отменяет загрузку для остальных
+            task = self._inflight[name] = asyncio.ensure_future(produce())
+            task.add_done_callback(lambda done: self._forget(name, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, name: str, task: asyncio.Future):
+        self._inflight.pop(name, None)
+        if not task.cancelled():
+            # Ошибку получат ждущие; если их не осталось, не ругаться «exception was never retrieved»
+            task.exception()
+
+    async def _fetch(self, url: str, name: str) -> bytes:
+        # Как и в notifications.py, httpx импортируется при первой загрузке, а не при старте воркера
+        import httpx
+
+        if self._client is None:
+            # Перенаправления проходим сами: каждый адрес проверяется так же, как исходный
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout), follow_redirects=False)
+        self.fetches += 1
+        try:
+            for _ in range(IMAGE_MAX_REDIRECTS + 1):
+                await self._check_target(url)
+                async with self._client.stream("GET", url) as response:
+                    if response.is_redirect and "location" in response.headers:
+                        url = str(response.url.join(response.headers["location"]))
+                        continue
+                    if response.status_code != 200:
+                        raise ImageError(f"источник ответил {response.status_code}")
+                    chunks, size = [], 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.max_source_bytes:
+                            raise ImageError("картинка слишком большая")
+                        chunks.append(chunk)
+                    break
+            else:
+                raise ImageError("слишком много перенаправлений")
+        except httpx.HTTPError as exc:
+            raise ImageError(f"не удалось скачать: {exc}") from exc
+        data = b"".join(chunks)
+        if sniff(data) is None:
+            raise ImageError("источник вернул не картинку")
+        return await anyio.to_thread.run_sync(self.disk.put, name, data)
+
+    async def _check_target(self, url: str):
+        """Только http(s), хосты из IMAGE_PROXY_HOSTS и только публичные адреса: прокси не ходит во внутреннюю сеть."""
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in ("http", "https") or not host:
+            raise ImageError(f"недопустимый адрес {url!r}")
+        if self.hosts and host not in self.hosts:
+            raise ImageError(f"хост {host} не входит в IMAGE_PROXY_HOSTS")
+        if self.allow_private:
+            return
+        try:
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            infos = await anyio.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except (OSError, ValueError) as exc:
+            raise ImageError(f"не удалось разрешить {host}: {exc}") from exc
+        for *_, sockaddr in infos:
+            address = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+            if getattr(address, "ipv4_mapped", None):
+                address = address.ipv4_mapped
+            if not address.is_global:
+                raise ImageError(f"адрес {address} ({host}) закрыт для прокси")
+
+    async def _render(self, url: str, key: str, name: str, width: int, fmt: str) -> bytes:
+        original = await self._single_flight(f"{key}.orig", lambda: self._fetch(url, f"{key}.orig"))
+
+        def render():
+            return self.disk.put(name, _resize(original, width, fmt))
+
+        self.renders += 1
+        try:
+            return await anyio.to_thread.run_sync(render)
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            raise ImageError(f"не удалось уменьшить: {exc}") from exc
+
+
+image_cache = ImageCache()
+
+
+@router.get("/img")
+async def proxied_image(request: Request, u: str, s: str, w: int = 0, f: str = "jpeg"):
+    if not _proxied(u):
+        raise HTTPException(status_code=404 if not IMAGE_PROXY_SECRET else 403)
+    # Байты, а не строки: compare_digest падает на строках с не-ASCII символами
+    if not hmac.compare_digest(s.encode(), sign(u).encode()):
+        raise HTTPException(status_code=403)
+    if w:
+        # Только заранее заданные ширины: иначе подписанной ссылкой можно набить кэш тысячей размеров
+        if Image is None or w not in IMAGE_WIDTHS or f not in FORMATS:
+            raise HTTPException(status_code=404)
+    try:
+        data, media_type, etag_name = await image_cache.get(u, w or None, f if w else None)
+    except ImageError:
+        raise HTTPException(status_code=502)
+    etag = f'"{etag_name}"'
+    headers = {"cache-control": CACHE_CONTROL, "etag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=media_type, headers=headers)
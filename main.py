@@ -1,41 +1,69 @@
+import asyncio
 import os
 from datetime import date
+from typing import Optional
 from fastapi import FastAPI, Request, Form, Depends, status, HTTPException
-from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from dotenv import load_dotenv
+
+# Сначала загружаем переменные окружения: модули ниже читают настройки при импорте
+load_dotenv()
+
+from database import SessionLocal, get_async_db, get_async_read_db, get_read_db
 from models import Room, GalleryImage, Feedback, Booking, User, RoomImage
 from schemas import FeedbackCreate, BookingCreate
 from pydantic import ValidationError
-from dotenv import load_dotenv
 from admin import setup_admin
-import requests
-from auth import router as auth_router, get_current_user
-from fastapi.encoders import jsonable_encoder
+from assets import ASSETS_BUILD_ON_STARTUP, PrecompressedStaticFiles, build as build_assets
+from availability import BLOCKING_STATUSES, availability
+from image_cache import image_cache, image_url, router as image_router
+from metrics import setup_metrics
+from db_profiling import setup_profiling
+from gallery_feed import GALLERY_PAGE_SIZE, fetch_categories, fetch_gallery_page, image_json
+from booking_list import BOOKING_STATUSES, BookingFilters, fetch_booking_page
+from notifications import enqueue_telegram, outbox_worker, telegram_configured
+from page_cache import page_cache, personalize
+from templating import precompile, templates
+from scheduler import SCHEDULER_ENABLED, lifecycle_scheduler
+from reservations import CONFLICT, RESERVATION_RETRIES, RESERVED, TAKEN, async_room_locks, backoff, change_status, try_reserve
+from auth import router as auth_router, get_current_user, get_current_user_async
 import json
+import room_stats
 
-
-# Сначала загружаем переменные окружения
-load_dotenv()
-TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
 
-Base.metadata.create_all(bind=engine)
-
+# Схемой управляет Alembic: перед запуском воркеров `alembic upgrade head`
 app = FastAPI()
+# Латентность по маршрутам, SQL на запрос, пул потоков и outbox — на /metrics
+setup_metrics(app)
+# SQL_PROFILE=1: медленные запросы с планом и кандидаты в N+1 в журнал; strict — 500 при превышении бюджета
+setup_profiling(app)
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
+app.include_router(image_router)
 
 @app.on_event('startup')
 async def startup():
+    if ASSETS_BUILD_ON_STARTUP:
+        build_assets()
+    precompile()
     await setup_admin(app)
+    if telegram_configured():
+        await outbox_worker.start()
+    if SCHEDULER_ENABLED:
+        await lifecycle_scheduler.start()
+
+@app.on_event('shutdown')
+async def shutdown():
+    await outbox_worker.stop()
+    await lifecycle_scheduler.stop()
+    await image_cache.stop()
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 def get_db():
     db = SessionLocal()
@@ -44,39 +72,63 @@ def get_db():
     finally:
         db.close()
 
+async def render_cached(request: Request, user, name: str, load_context=None):
+    # Тело страницы кэшируется в анонимном виде, блок пользователя рендерится отдельно
+    key = f"{request.url.path}?{request.url.query}"
+    body = page_cache.get(key)
+    if body is None:
+        version = page_cache.version
+        context = await load_context() if load_context else {}
+        body = templates.TemplateResponse(name, {"request": request, "user": None, **context}).body
+        page_cache.put(key, body, version)
+    if user:
+        body = personalize(body, templates.get_template("_user_nav.html").render(user=user))
+    return HTMLResponse(body)
+
 @app.get("/")
-def index(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)  # Получаем пользователя
-    return templates.TemplateResponse(
-        "index.html",
-        {"request": request, "user": user}  # Передаём user!
-    )
+async def index(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    user = await get_current_user_async(request, db)  # Получаем пользователя
+    return await render_cached(request, user, "index.html")
 
 @app.get("/rooms")
-def rooms(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    rooms = db.query(Room).all()
-    # Собираем фото для каждой комнаты
-    room_images = {room.id: [img.url for img in room.images] for room in rooms}
-    room_images_json = json.dumps(room_images, ensure_ascii=False)
-    return templates.TemplateResponse(
-        "rooms.html",
-        {
-            "request": request,
-            "rooms": rooms,
-            "user": user,
-            "room_images_json": room_images_json
-        }
-    )
+async def rooms(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    user = await get_current_user_async(request, db)
+
+    async def load_context():
+        # В асинхронной сессии ленивой загрузки нет — фото подгружаем сразу
+        result = await db.execute(select(Room).options(selectinload(Room.images)))
+        rooms = result.scalars().all()
+        # Собираем фото для каждой комнаты
+        room_images = {room.id: [image_url(img.url, 1600) for img in room.images] for room in rooms}
+        return {"rooms": rooms, "room_images_json": json.dumps(room_images, ensure_ascii=False)}
+
+    return await render_cached(request, user, "rooms.html", load_context)
 
 @app.get("/gallery")
-def gallery(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    images = db.query(GalleryImage).all()
-    return templates.TemplateResponse("gallery.html", {"request": request, "images": images, "user": user})
+async def gallery(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    user = await get_current_user_async(request, db)
+    category = request.query_params.get("category") or None
+    try:
+        after = int(request.query_params["after"])
+    except (KeyError, ValueError):
+        after = None
+
+    async def load_context():
+        # Первая страница рендерится сразу, дальше gallery.js подгружает /api/gallery
+        page = await fetch_gallery_page(db, category, after)
+        return {"page": page, "images": page.images, "category": category,
+                "categories": await fetch_categories(db)}
+
+    return await render_cached(request, user, "gallery.html", load_context)
+
+@app.get("/api/gallery")
+async def gallery_feed(category: Optional[str] = None, after: Optional[int] = None, limit: int = GALLERY_PAGE_SIZE,
+                       db: AsyncSession = Depends(get_async_read_db)):
+    page = await fetch_gallery_page(db, category or None, after, limit)
+    return {"items": [image_json(image) for image in page.images], "next": page.next_cursor}
 
 @app.get("/feedback")
-def feedback_form(request: Request, db: Session = Depends(get_db)):
+def feedback_form(request: Request, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
     return templates.TemplateResponse("feedback.html", {"request": request, "user": user})
 
@@ -100,29 +152,19 @@ def submit_feedback(
     db.commit()
     return RedirectResponse(url="/feedback?success=1", status_code=status.HTTP_303_SEE_OTHER)
 
-def send_telegram_notification(message: str):
-    if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        chat_id = TELEGRAM_CHAT_ID
-        payload = {
-            "chat_id": chat_id,
-            "text": message,
-            "parse_mode": "HTML"
-        }
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-        except Exception as e:
-            print(f"Ошибка отправки в Telegram: {e}")
-
-
+@app.get("/rooms/free")
+def free_rooms(check_in: date, check_out: date, db: Session = Depends(get_read_db)):
+    if check_out <= check_in:
+        raise HTTPException(status_code=400, detail="Дата выезда должна быть позже даты заезда")
+    room_ids = [room_id for (room_id,) in db.query(Room.id).filter(Room.is_available == True)]
+    return {"room_ids": availability.free_rooms(db, room_ids, check_in, check_out)}
 
 @app.get("/book/{room_id}")
-def booking_form(request: Request, room_id: int, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def booking_form(request: Request, room_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    user = await get_current_user_async(request, db)
     if not user:
         return RedirectResponse("/auth/login?next=/book/{}".format(room_id), status_code=303)
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await db.get(Room, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Номер не найден")
     return templates.TemplateResponse("booking.html", {
@@ -133,7 +175,7 @@ def booking_form(request: Request, room_id: int, db: Session = Depends(get_db)):
     })
 
 @app.post("/book")
-def submit_booking(
+async def submit_booking(
     request: Request,
     room_id: int = Form(...),
     fullname: str = Form(...),
@@ -141,9 +183,9 @@ def submit_booking(
     email: str = Form(...),
     check_in: str = Form(...),
     check_out: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = get_current_user(request, db)
+    user = await get_current_user_async(request, db)
     if not user:
         return RedirectResponse("/auth/login", status_code=303)
     try:
@@ -156,7 +198,7 @@ def submit_booking(
             check_out=date.fromisoformat(check_out)
         )
     except ValidationError as e:
-        room = db.query(Room).filter(Room.id == room_id).first()
+        room = await db.get(Room, room_id)
         return templates.TemplateResponse("booking.html", {
             "request": request,
             "room": room,
@@ -164,23 +206,12 @@ def submit_booking(
             "min_date": date.today().isoformat()
         })
 
-    existing_booking = db.query(Booking).filter(
-        Booking.room_id == room_id,
-        Booking.check_out > data.check_in,
-        Booking.check_in < data.check_out,
-        Booking.status == "confirmed"
-    ).first()
-
-    if existing_booking:
-        room = db.query(Room).filter(Room.id == room_id).first()
-        return templates.TemplateResponse("booking.html", {
-            "request": request,
-            "room": room,
-            "error": "Номер уже забронирован на выбранные даты",
-            "min_date": date.today().isoformat()
-        })
-
-    booking = Booking(
+    # Индекс в памяти: «занято» перепроверяется в БД. По умолчанию заявка дат не занимает, и здесь это
+    # только быстрый отказ по подтверждённым броням: атомарная проверка идёт при подтверждении (change_status)
+    is_free = await db.run_sync(
+        lambda sync_db: availability.is_free(sync_db, room_id, data.check_in, data.check_out)
+    )
+    new_booking = lambda: Booking(
         room_id=data.room_id,
         fullname=data.fullname,
         phone=data.phone,
@@ -190,14 +221,42 @@ def submit_booking(
         user_id=user.id,
         status="pending"
     )
+    outcome = TAKEN
+    if is_free and "pending" not in BLOCKING_STATUSES:
+        booking = new_booking()
+        db.add(booking)
+        outcome = RESERVED
+    elif is_free:
+        # BOOKING_HOLD_PENDING=1: заявка занимает даты, сериализуется уже она.
+        # Соединение не держим, пока ждём очереди к номеру
+        await db.commit()
+        async with async_room_locks(room_id):
+            for attempt in range(RESERVATION_RETRIES):
+                booking = new_booking()
+                outcome = await db.run_sync(lambda sync_db: try_reserve(sync_db, booking))
+                if outcome != CONFLICT:
+                    break
+                await asyncio.sleep(backoff(attempt))
+    if outcome != RESERVED:
+        await db.rollback()
+        room = await db.get(Room, room_id)
+        if not room:
+            raise HTTPException(status_code=404, detail="Номер не найден")
+        return templates.TemplateResponse("booking.html", {
+            "request": request,
+            "room": room,
+            "user": user,
+            "error": ("Номер уже забронирован на выбранные даты" if outcome == TAKEN
+                      else "Слишком много одновременных заявок на этот номер, попробуйте ещё раз"),
+            "min_date": date.today().isoformat()
+        })
 
-    db.add(booking)
-    db.commit()
-
-    room = db.query(Room).filter(Room.id == room_id).first()
+    await db.flush()
+    await db.run_sync(lambda sync_db: room_stats.apply(sync_db, booking, None))
+    room = await db.get(Room, room_id)
     message = (
         f"<b>Новое бронирование!</b>\n\n"
-        f"🔹 Номер: {room.name}\n"
+        f"🔹 Номер: {room.name if room else room_id}\n"
         f"👤 Гость: {data.fullname}\n"
         f"📞 Телефон: {data.phone}\n"
         f"📧 Email: {data.email}\n"
@@ -205,12 +264,16 @@ def submit_booking(
         f"📅 Выезд: {data.check_out}\n"
         f"🆔 ID брони: {booking.id}"
     )
-    send_telegram_notification(message)
+    # Уведомление уходит в outbox в той же транзакции, отправляет его фоновый воркер
+    enqueue_telegram(db, message)
+    await db.commit()
+    availability.track(booking)
+    outbox_worker.notify()
 
     return RedirectResponse(url=f"/book/success/{booking.id}", status_code=status.HTTP_303_SEE_OTHER)
 
 @app.get("/book/success/{booking_id}")
-def booking_success(request: Request, booking_id: int, db: Session = Depends(get_db)):
+def booking_success(request: Request, booking_id: int, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)  # Получаем пользователя
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
@@ -224,11 +287,14 @@ def booking_success(request: Request, booking_id: int, db: Session = Depends(get
     })
 
 @app.get("/my-bookings")
-def my_bookings(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    bookings = db.query(Booking).filter(
+async def my_bookings(request: Request, db: AsyncSession = Depends(get_async_read_db), current_user: User = Depends(get_current_user_async)):
+    if not current_user:
+        return RedirectResponse("/auth/login?next=/my-bookings", status_code=303)
+    result = await db.execute(select(Booking).options(joinedload(Booking.room)).filter(
         Booking.user_id == current_user.id,
         Booking.status.in_(["pending", "confirmed"])
-    ).all()
+    ))
+    bookings = result.scalars().all()
     return templates.TemplateResponse("my_bookings.html", {
         "request": request,
         "bookings": bookings,
@@ -239,22 +305,33 @@ def my_bookings(request: Request, db: Session = Depends(get_db), current_user: U
 def cancel_booking(booking_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     booking = db.query(Booking).filter(Booking.id == booking_id, Booking.user_id == current_user.id).first()
     if booking and booking.status in ["pending", "confirmed"]:
+        previous = booking.status
         booking.status = "cancelled"
+        room_stats.apply(db, booking, previous)
         db.commit()
+        availability.track(booking)
     return RedirectResponse("/my-bookings", status_code=303)
 
 @app.get("/settings")
-def settings_form(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return templates.TemplateResponse("settings.html", {"request": request, "user": current_user})
+def settings_form(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    # Форме нужен email, которого нет в токене — берём полную запись
+    user = db.get(User, current_user.id) if current_user else None
+    return templates.TemplateResponse("settings.html", {"request": request, "user": user})
 
 @app.get("/admin/bookings")
-def admin_bookings(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def admin_bookings(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403)
-    bookings = db.query(Booking).filter(Booking.status == "pending").all()
+    filters = BookingFilters.from_query(request.query_params, default_status="pending")
+    page = fetch_booking_page(db, filters)
+    rooms = db.query(Room.id, Room.name).order_by(Room.id).all()
     return templates.TemplateResponse("admin_bookings.html", {
         "request": request,
-        "bookings": bookings,
+        "bookings": page.bookings,
+        "page": page,
+        "filters": filters,
+        "statuses": BOOKING_STATUSES,
+        "rooms": rooms,
         "user": current_user  # <-- обязательно!
     })
 
@@ -262,11 +339,13 @@ def admin_bookings(request: Request, db: Session = Depends(get_db), current_user
 def confirm_booking(booking_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403)
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
-    if booking and booking.status == "pending":
-        booking.status = "confirmed"
-        db.commit()
-        # Отправляем уведомление в Telegram
+    outcome, booking = change_status(db, booking_id, "confirmed", allowed_from=("pending",))
+    if outcome == TAKEN:
+        return RedirectResponse("/admin/bookings?error=taken", status_code=303)
+    if outcome == CONFLICT:
+        return RedirectResponse("/admin/bookings?error=conflict", status_code=303)
+    if outcome == RESERVED:
+        # Уведомление в Telegram пишем в outbox вместе со сменой статуса
         room = db.query(Room).filter(Room.id == booking.room_id).first()
         message = (
             f"<b>Бронирование подтверждено!</b>\n\n"
@@ -278,30 +357,33 @@ def confirm_booking(booking_id: int, db: Session = Depends(get_db), current_user
             f"📅 Выезд: {booking.check_out}\n"
             f"🆔 ID брони: {booking.id}"
         )
-        send_telegram_notification(message)
+        enqueue_telegram(db, message)
+        db.commit()
+        availability.track(booking)
+        outbox_worker.notify()
     return RedirectResponse("/admin/bookings", status_code=303)
 
 @app.get("/admin")
-def admin_panel(request: Request, db: Session = Depends(get_db)):
+def admin_panel(request: Request, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
-    status = request.query_params.get("status")
-    if status == "all":
-        bookings = db.query(Booking).all()
-    else:
-        bookings = db.query(Booking).filter(Booking.status.in_(["pending", "confirmed"])).all()
-    rooms = db.query(Room).all()
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403)
+    filters = BookingFilters.from_query(request.query_params)
+    page = fetch_booking_page(db, filters)
+    rooms = db.query(Room).options(selectinload(Room.images)).all()
     images = db.query(GalleryImage).all()
     return templates.TemplateResponse(
         "admin.html",
-        {"request": request, "user": user, "rooms": rooms, "bookings": bookings, "images": images}
+        {"request": request, "user": user, "rooms": rooms, "bookings": page.bookings, "page": page,
+         "filters": filters, "statuses": BOOKING_STATUSES, "images": images}
     )
 
 # Показать форму редактирования
 @app.get("/admin/rooms/edit/{room_id}")
-def edit_room_form(request: Request, room_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def edit_room_form(request: Request, room_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403)
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = db.query(Room).options(selectinload(Room.images)).filter(Room.id == room_id).first()
     return templates.TemplateResponse("edit_room.html", {"request": request, "room": room, "user": current_user})
 
 # Обработать изменения
@@ -330,6 +412,7 @@ def edit_room(
     room.amenities = amenities
     room.is_available = is_available
     db.commit()
+    page_cache.invalidate()
     return RedirectResponse("/admin", status_code=303)
 
 # Добавить фото
@@ -339,6 +422,7 @@ def add_room_photo(room_id: int, photo_url: str = Form(...), db: Session = Depen
         raise HTTPException(status_code=403)
     db.add(RoomImage(room_id=room_id, url=photo_url))
     db.commit()
+    page_cache.invalidate()
     return RedirectResponse(f"/admin", status_code=303)
 
 # Удалить фото
@@ -350,9 +434,10 @@ def delete_room_photo(room_id: int, photo_id: int, db: Session = Depends(get_db)
     if img:
         db.delete(img)
         db.commit()
+        page_cache.invalidate()
     return RedirectResponse(f"/admin", status_code=303)
 
 @app.get("/about")
-def about(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    return templates.TemplateResponse("about.html", {"request": request, "user": user})
\ No newline at end of file
+async def about(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    user = await get_current_user_async(request, db)
+    return await render_cached(request, user, "about.html")
\ No newline at end of file
@@ -0,0 +1,333 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+import anyio.to_thread
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+from database import async_engine, async_read_engine, engine, read_engine
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Если задан, /metrics отдаётся только с заголовком Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Границы корзин в секундах: от быстрых ответов из кэша до медленных POST с повторами
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+RENDER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def expose(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect: Optional[Callable[[], Dict[Labels, float]]] = None):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+        # Для значений, которые дешевле прочитать при сборе, чем обновлять на каждом запросе
+        self._collect = collect
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self):
+        if self._collect is not None:
+            self._values = dict(self._collect())
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными корзинами: наблюдение — бинарный поиск и два сложения под замком."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам (последняя — +Inf), сумма]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            # Накопительные значения считаем только при выдаче, а не на каждом наблюдении
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.labels, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+def _threadpool_stats():
+    # Пул anyio, в котором выполняются синхронные обработчики и зависимости с Session
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+    return {("busy",): statistics.borrowed_tokens, ("size",): limiter.total_tokens,
+            ("waiting",): statistics.tasks_waiting}
+
+
+def _page_cache_stats():
+    from page_cache import page_cache
+
+    return {("hit",): page_cache.hits, ("miss",): page_cache.misses}
+
+
+registry = Registry()
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Время обработки запроса до отправки всего тела", ("method", "route")))
+REQUESTS = registry.register(Counter("http_requests_total", "Ответы по маршрутам и кодам", ("method", "route", "status")))
+IN_FLIGHT = registry.register(Gauge("http_requests_in_flight", "Запросы, обрабатываемые прямо сейчас"))
+THREADPOOL = registry.register(Gauge(
+    "threadpool_threads", "Потоки пула синхронных обработчиков: заняты, всего, ожидающие задачи", ("state",),
+    collect=_threadpool_stats))
+SQL_STATEMENTS = registry.register(Counter("sql_statements_total", "SQL-запросы по маршрутам", ("route",)))
+SQL_SECONDS = registry.register(Counter("sql_seconds_total", "Время выполнения SQL по маршрутам", ("route",)))
+SQL_PER_REQUEST = registry.register(Histogram(
+    "sql_statements_per_request", "Число SQL-запросов на один HTTP-запрос", buckets=SQL_COUNT_BUCKETS))
+TEMPLATE_RENDER = registry.register(Histogram(
+    "template_render_seconds", "Время рендера шаблонов Jinja", ("template",), buckets=RENDER_BUCKETS))
+NOTIFICATIONS = registry.register(Counter(
+    "notifications_total", "Уведомления outbox: поставлены, отправлены, отложены, отброшены", ("channel", "outcome")))
+SCHEDULER_RUNS = registry.register(Counter(
+    "scheduler_runs_total", "Прогоны задач планировщика броней по исходу", ("job", "outcome")))
+SCHEDULER_TRANSITIONS = registry.register(Counter(
+    "scheduler_transitions_total", "Брони, переведённые планировщиком", ("job",)))
+SCHEDULER_DURATION = registry.register(Histogram(
+    "scheduler_run_seconds", "Длительность прогона задачи планировщика", ("job",)))
+SCHEDULER_LAST_RUN = registry.register(Gauge(
+    "scheduler_last_run_timestamp_seconds", "Время окончания последнего прогона задачи", ("job", "outcome")))
+RATE_LIMIT = registry.register(Counter(
+    "rate_limit_decisions_total", "Проверки лимита частоты: пропущены, отклонены (в том числе без базы), ошибки хранилища",
+    ("route", "outcome")))
+PAGE_CACHE = registry.register(Gauge(
+    "page_cache_lookups", "Попадания и промахи кэша страниц с начала работы процесса", ("result",),
+    collect=_page_cache_stats))
+
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_seconds")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+
+# Счётчики текущего запроса; contextvars доходят и до потоков пула, и до гринлетов aiosqlite
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def _handle_error(exception_context):
+    # Запрос упал: снимаем метку времени, иначе стек в conn.info разъедется
+    started = exception_context.connection.info.get("metrics_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engines(engines=(engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine)):
+    for sync_engine in engines:
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def observe_render(template: str, seconds: float):
+    TEMPLATE_RENDER.observe(seconds, template)
+
+
+def record_notification(channel: str, outcome: str, amount: int = 1):
+    NOTIFICATIONS.inc(channel, outcome, amount=amount)
+
+
+def record_scheduler_run(job: str, outcome: str, transitions: int, seconds: float):
+    SCHEDULER_RUNS.inc(job, outcome)
+    SCHEDULER_TRANSITIONS.inc(job, amount=transitions)
+    SCHEDULER_DURATION.observe(seconds, job)
+    SCHEDULER_LAST_RUN.set(time.time(), job, outcome)
+
+
+def record_rate_limit(route: str, outcome: str):
+    RATE_LIMIT.inc(route, outcome)
+
+
+def route_label(scope, root_path: str = "") -> str:
+    # Шаблон пути, а не сам путь: /book/{room_id} вместо тысячи отдельных серий
+    route = scope.get("route")
+    if route is not None:
+        return route.path_format
+    # Mount (/static) маршрута не кладёт, но дописывает свой префикс в root_path
+    mount = scope.get("root_path", "")
+    return mount[len(root_path):] if mount != root_path else "unmatched"
+
+
+class MetricsMiddleware:
+    """Чистый ASGI-слой без BaseHTTPMiddleware: тело ответа не буферизуется, лишних задач нет."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        stats = RequestStats()
+        token = current_request.set(stats)
+        root_path = scope.get("root_path", "")
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            current_request.reset(token)
+            route = route_label(scope, root_path)
+            method = scope["method"]
+            REQUEST_LATENCY.observe(elapsed, method, route)
+            REQUESTS.inc(method, route, str(status))
+            SQL_PER_REQUEST.observe(stats.sql_count)
+            if stats.sql_count:
+                SQL_STATEMENTS.inc(route, amount=stats.sql_count)
+                SQL_SECONDS.inc(route, amount=stats.sql_seconds)
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return PlainTextResponse(registry.expose(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def setup_metrics(app):
+    if not METRICS_ENABLED:
+        return
+    instrument_engines()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
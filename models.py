@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey, Boolean, Index, event, select
 from sqlalchemy.orm import relationship
 from database import Base
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hash_password, verify_password
 
 class User(Base):
     __tablename__ = "users"
@@ -12,10 +13,10 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
 
     def set_password(self, password):
-        self.hashed_password = generate_password_hash(password)
+        self.hashed_password = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.hashed_password, password)
+        return verify_password(self.hashed_password, password)
 
 class Room(Base):
     __tablename__ = "rooms"
@@ -27,6 +28,8 @@ class Room(Base):
     capacity = Column(Integer, default=1)
     amenities = Column(String)
     is_available = Column(Boolean, default=True)
+    # Растёт при каждом занятии дат номера; условный UPDATE по ней делает проверку и запись брони атомарными
+    booking_version = Column(Integer, nullable=False, default=0, server_default="0")
     images = relationship("RoomImage", back_populates="room")
 
 class RoomImage(Base):
@@ -43,6 +46,11 @@ class GalleryImage(Base):
     caption = Column(String)
     category = Column(String)
 
+    __table_args__ = (
+        # Лента галереи: фильтр по категории и курсор по id
+        Index("ix_gallery_images_category_id", "category", "id"),
+    )
+
 class Feedback(Base):
     __tablename__ = "feedback"
     id = Column(Integer, primary_key=True, index=True)
@@ -61,4 +69,70 @@ class Booking(Base):
     email = Column(String)
     check_in = Column(Date)
     check_out = Column(Date)
-    status = Column(String, default="pending")
\ No newline at end of file
+    status = Column(String, default="pending")
+    # Цена ночи на момент брони: выручка в сводке не меняется вместе с ценой номера
+    price = Column(Integer)
+    # Без обратной связи на Room: удаление номера по-прежнему не трогает брони
+    room = relationship("Room")
+
+    __table_args__ = (
+        # Проверка пересечения броней: room_id + status, диапазон по датам
+        Index("ix_bookings_room_status_dates", "room_id", "status", "check_in", "check_out"),
+        # Постраничный список в админке: статус + ключ сортировки, поиск гостя по префиксу
+        Index("ix_bookings_status_id", "status", "id"),
+        Index("ix_bookings_status_check_in", "status", "check_in"),
+        Index("ix_bookings_check_in", "check_in"),
+        Index("ix_bookings_fullname", "fullname"),
+        Index("ix_bookings_email", "email"),
+    )
+
+@event.listens_for(Booking, "before_insert")
+def _remember_price(mapper, connection, booking):
+    # Если вызывающий не задал цену сам, берём текущую цену номера
+    if booking.price is None and booking.room_id is not None:
+        booking.price = connection.scalar(select(Room.price).where(Room.id == booking.room_id))
+
+# Сводка по ночам: строка на номер и день, где есть проданная ночь или заявка (room_stats.py)
+class DailyRoomStats(Base):
+    __tablename__ = "daily_room_stats"
+    # Без внешнего ключа, как и у броней: история номера не зависит от его удаления
+    room_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    nights_sold = Column(Integer, nullable=False, default=0)
+    nights_pending = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Дашборд читает диапазон дней по всем номерам
+        Index("ix_daily_room_stats_day", "day"),
+    )
+
+# Исходящее уведомление; пишется в той же транзакции, что и бронь
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    channel = Column(String, nullable=False, default="telegram")
+    payload = Column(String, nullable=False)  # JSON
+    status = Column(String, default="pending")  # pending / sent / failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    last_error = Column(String)
+
+    __table_args__ = (
+        # Выборка готовых к отправке сообщений
+        Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+# Корзина токенов ограничения частоты (throttling.py): общая для всех воркеров uvicorn
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limits"
+    key = Column(String, primary_key=True)  # хэш "маршрут:тип:значение"
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # unix-время, общее для процессов
+    idle_at = Column(Float, nullable=False)  # с этого момента корзина снова полна и строку можно удалить
+
+    __table_args__ = (
+        Index("ix_rate_limits_idle_at", "idle_at"),
+    )
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+
+from database import AsyncSessionLocal
+from metrics import record_notification
+from models import OutboxMessage
+
+load_dotenv()
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Максимальная длина сообщения в Telegram
+MESSAGE_LIMIT = 4096
+SEPARATOR = "\n\n— — —\n\n"
+
+
+def telegram_configured() -> bool:
+    return bool(TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID)
+
+
+def enqueue_telegram(db, message: str):
+    # Только добавляет запись в сессию: коммит делает вызывающий вместе с бронью
+    if not telegram_configured():
+        record_notification("telegram", "skipped")
+        return
+    db.add(OutboxMessage(channel="telegram", payload=json.dumps({"text": message}, ensure_ascii=False)))
+    record_notification("telegram", "queued")
+
+
+class DeliveryError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """После failure_threshold ошибок подряд перестаёт пропускать отправку на reset_timeout секунд,
+    затем пропускает одну пробную попытку."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.remaining() == 0 else "open"
+
+    def remaining(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - self.clock())
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            # Неудачная пробная попытка снова размыкает цепь на полный таймаут
+            self.opened_at = self.clock()
+
+
+class OutboxWorker:
+    """Фоновая задача, которая разбирает таблицу outbox и отправляет сообщения в Telegram."""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        api_url: str = TELEGRAM_API_URL,
+        token: Optional[str] = TELEGRAM_BOT_TOKEN,
+        chat_id: Optional[str] = TELEGRAM_CHAT_ID,
+        batch_size: int = 20,
+        poll_interval: float = 2.0,
+        max_attempts: int = 8,
+        backoff_base: float = 1.0,
+        backoff_max: float = 600.0,
+        lease: float = 60.0,
+        timeout: float = 10.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.session_factory = session_factory
+        self.api_url = api_url
+        self.token = token
+        self.chat_id = chat_id
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        # httpx при импорте тянет свой CLI (rich, click, pygments): грузим, только когда воркер нужен
+        import httpx
+
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # Один клиент на всё время жизни: соединения с API переиспользуются
+        self._client = httpx.AsyncClient(
+            base_url=self.api_url,
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def notify(self):
+        # Можно вызывать и из потоков пула: будим воркер, не дожидаясь poll_interval
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                processed = await self.drain_once()
+            except Exception as e:
+                print(f"Ошибка обработки outbox: {e}")
+                processed = 0
+            if processed >= self.batch_size:
+                continue
+            delay = max(self.poll_interval, self.breaker.remaining())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def drain_once(self) -> int:
+        """Отправляет одну пачку готовых сообщений, возвращает их количество."""
+        if not self.breaker.allow():
+            return 0
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            due = (
+                select(OutboxMessage.id)
+                .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+            )
+            # Захватываем пачку арендой, чтобы другой процесс не отправил её повторно
+            result = await db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(due.scalar_subquery()))
+                .values(next_attempt_at=now + timedelta(seconds=self.lease))
+                .returning(OutboxMessage.id, OutboxMessage.payload, OutboxMessage.attempts)
+                .execution_options(synchronize_session=False)
+            )
+            rows = sorted(result.all())
+            await db.commit()
+        if not rows:
+            return 0
+
+        for chunk in self._chunks(rows):
+            if not self.breaker.allow():
+                await self._release(chunk)
+                continue
+            try:
+                await self._send(SEPARATOR.join(text for _, text, _ in chunk))
+            except Exception as e:
+                self.breaker.record_failure()
+                await self._record_failure(chunk, e)
+            else:
+                self.breaker.record_success()
+                await self._record_success(chunk)
+        return len(rows)
+
+    def _chunks(self, rows):
+        # Склеиваем несколько уведомлений в одно сообщение в пределах лимита Telegram
+        chunk, size = [], 0
+        for message_id, payload, attempts in rows:
+            text = json.loads(payload)["text"][:MESSAGE_LIMIT]
+            extra = len(text) + (len(SEPARATOR) if chunk else 0)
+            if chunk and size + extra > MESSAGE_LIMIT:
+                yield chunk
+                chunk, size = [], 0
+                extra = len(text)
+            chunk.append((message_id, text, attempts))
+            size += extra
+        if chunk:
+            yield chunk
+
+    async def _send(self, text: str):
+        response = await self._client.post(
+            f"/bot{self.token}/sendMessage",
+            json={"chat_id": self.chat_id, "text": text, "parse_mode": "HTML"},
+        )
+        if response.status_code == 429:
+            retry_after = response.json().get("parameters", {}).get("retry_after")
+            raise DeliveryError("Telegram: слишком много запросов", retry_after=retry_after)
+        response.raise_for_status()
+
+    async def _record_success(self, chunk):
+        async with self.session_factory() as db:
+            await db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_([message_id for message_id, _, _ in chunk]))
+                .values(status="sent", sent_at=datetime.utcnow(), attempts=OutboxMessage.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        record_notification("telegram", "sent", len(chunk))
+
+    async def _record_failure(self, chunk, error: Exception):
+        reason = f"{type(error).__name__}: {error}"
+        print(f"Ошибка отправки в Telegram: {reason}")
+        now = datetime.utcnow()
+        retry_after = getattr(error, "retry_after", None)
+        async with self.session_factory() as db:
+            for message_id, _, attempts in chunk:
+                attempts += 1
+                delay = max(self.backoff(attempts), retry_after or 0)
+                gave_up = attempts >= self.max_attempts
+                record_notification("telegram", "failed" if gave_up else "retry")
+                await db.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id == message_id)
+                    .values(
+                        attempts=attempts,
+                        status="failed" if gave_up else "pending",
+                        next_attempt_at=now + timedelta(seconds=delay),
+                        last_error=reason[:500],
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+
+    async def _release(self, chunk):
+        # Цепь разомкнута: возвращаем сообщения в очередь без списания попытки
+        retry_at = datetime.utcnow() + timedelta(seconds=self.breaker.remaining())
+        async with self.session_factory() as db:
+            await db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_([message_id for message_id, _, _ in chunk]))
+                .values(next_attempt_at=retry_at)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        record_notification("telegram", "deferred", len(chunk))
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,85 @@
+import re
+from datetime import date, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import String, bindparam, cast, select
+from sqlalchemy.orm import Session
+
+from models import Booking, Room
+
+# Коды ячеек матрицы; подтверждённая бронь важнее заявки на тот же день
+FREE, PENDING, CONFIRMED = 0, 1, 2
+CELL_CODES = {"pending": PENDING, "confirmed": CONFIRMED}
+CELL_NAMES = {FREE: "free", PENDING: "pending", CONFIRMED: "confirmed"}
+MAX_DAYS = 366
+
+_RUNS = re.compile(rb"\x00+|\x01+|\x02+")
+_AS_DIGITS = bytes.maketrans(b"\x00\x01\x02", b"012")
+
+
+class OccupancyMatrix:
+    """Занятость номеров × дней одним байтовым массивом: строка номера — days байт подряд."""
+
+    __slots__ = ("start", "days", "rooms", "cells")
+
+    def __init__(self, start: date, days: int, rooms: List[Tuple[int, str]], cells: bytearray):
+        self.start = start
+        self.days = days
+        self.rooms = rooms
+        self.cells = cells
+
+    @property
+    def dates(self) -> List[date]:
+        return [self.start + timedelta(days=offset) for offset in range(self.days)]
+
+    def row(self, index: int) -> bytes:
+        return bytes(self.cells[index * self.days:(index + 1) * self.days])
+
+    def runs(self, index: int) -> List[Tuple[str, int]]:
+        # Подряд идущие одинаковые дни — одна ячейка с colspan в HTML
+        return [(CELL_NAMES[match.group()[0]], len(match.group())) for match in _RUNS.finditer(self.row(index))]
+
+    def to_json(self) -> dict:
+        return {
+            "start": self.start.isoformat(),
+            "days": self.days,
+            "legend": {str(code): name for code, name in CELL_NAMES.items()},
+            "rooms": [
+                {"id": room_id, "name": name, "days": self.row(index).translate(_AS_DIGITS).decode("ascii")}
+                for index, (room_id, name) in enumerate(self.rooms)
+            ],
+        }
+
+
+def build_occupancy(db: Session, start: date, days: int) -> OccupancyMatrix:
+    """Матрица занятости за [start, start + days): один запрос по броням, заполнение срезами."""
+    days = max(1, min(days, MAX_DAYS))
+    end = start + timedelta(days=days)
+    rooms = [tuple(row) for row in db.execute(select(Room.id, Room.name).order_by(Room.id))]
+    row_start = {room_id: index * days for index, (room_id, _) in enumerate(rooms)}
+    cells = bytearray(len(rooms) * days)
+
+    # Даты приходят ISO-строками (CAST обходит разбор в date), смещение — поиск в словаре дней
+    # окна; всё, что левее или правее окна, обрезается по краям
+    offsets = {(start + timedelta(days=offset)).isoformat(): offset for offset in range(days + 1)}
+    offset = offsets.get
+    query = select(Booking.room_id, cast(Booking.check_in, String), cast(Booking.check_out, String)).where(
+        Booking.status == bindparam("status"),
+        Booking.check_in < end,
+        Booking.check_out > start,
+    )
+    connection = db.connection()
+    # По запросу на статус (покрывающий индекс по номеру, статусу и датам); подтверждённые
+    # заливаются вторыми и перекрывают заявки
+    for status in ("pending", "confirmed"):
+        # memoryview: срез заливки не копирует байты
+        fill = memoryview(bytes([CELL_CODES[status]]) * days)
+        for room_id, check_in, check_out in connection.execute(query, {"status": status}):
+            base = row_start.get(room_id)
+            if base is None:
+                continue
+            first, last = base + offset(check_in, 0), base + offset(check_out, days)
+            # Выезд не позже заезда: срез отрицательной длины вставил бы байты и сдвинул всю сетку
+            if last > first:
+                cells[first:last] = fill[:last - first]
+    return OccupancyMatrix(start, days, rooms, cells)
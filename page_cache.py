@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", 256))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+# Версия данных живёт в процессе; TTL ограничивает устаревание в соседних воркерах
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", 60))
+
+# Между этими метками в base.html стоит блок пользователя, в кэше он анонимный
+USER_NAV_START = b"<!--user-nav-->"
+USER_NAV_END = b"<!--/user-nav-->"
+
+
+class PageCache:
+    """LRU-кэш отрендеренных анонимных страниц, ограниченный числом записей и объёмом."""
+
+    def __init__(self, max_entries=PAGE_CACHE_MAX_ENTRIES, max_bytes=PAGE_CACHE_MAX_BYTES, ttl=PAGE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != self.version or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: str, body: bytes, version: int):
+        # version берётся до запросов к БД: страница, собранная во время правки, не попадёт в кэш
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, time.monotonic() + self.ttl, body)
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._size = 0
+
+    def _drop(self, key: str):
+        _, _, body = self._entries.pop(key)
+        self._size -= len(body)
+
+
+def personalize(body: bytes, user_nav: str) -> bytes:
+    start = body.find(USER_NAV_START)
+    end = body.find(USER_NAV_END, start)
+    if start < 0 or end < 0:
+        return body
+    return body[:start + len(USER_NAV_START)] + user_nav.encode() + body[end:]
+
+
+page_cache = PageCache()
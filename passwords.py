@@ -0,0 +1,36 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Метод и стоимость в формате werkzeug: "scrypt:32768:8:1", "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# hashlib отпускает GIL, поэтому потоки считают хэши параллельно, не трогая event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+def hash_password(password: str) -> str:
+    # werkzeug.security подтягивает весь werkzeug; нужен только при входе и регистрации
+    from werkzeug.security import generate_password_hash
+
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def verify_password(hashed_password: str, password: str) -> bool:
+    from werkzeug.security import check_password_hash
+
+    return check_password_hash(hashed_password, password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    # Хэш вида "метод$соль$значение": пересчитываем, если параметры устарели
+    return hashed_password.split("$", 1)[0] != PASSWORD_HASH_METHOD
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password, password)
+
+
+async def verify_password_async(hashed_password: str, password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_executor, verify_password, hashed_password, password)
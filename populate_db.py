@@ -1,76 +1,284 @@
+import argparse
+import math
+import random
+import time
 from database import SessionLocal, engine, Base
-from models import Room, GalleryImage, Booking
+from models import Room, RoomImage, GalleryImage, Booking, User, Feedback
+from passwords import hash_password
+import room_stats
 from datetime import date, timedelta
 
-Base.metadata.create_all(bind=engine)
-
-db = SessionLocal()
-
-if db.query(Room).count() == 0:
-    rooms = [
-        Room(
-            name="Номер Стандарт",
-            description="Уютный номер с видом на горы",
-            price=3500,  # Исправлено: число, а не строка
-            image="https://greenhills-crimea.ru/wp-content/uploads/2023/12/SmallMidle_Kott.png"
-        ),
-        Room(
-            name="Коттедж",
-            description="Просторный коттедж с балконом",
-            price=7000,
-            image="https://greenhills-crimea.ru/wp-content/uploads/2024/01/Rainbow_kottages.jpg"
-        ),
-        Room(
-            name="Семейный коттедж",
-            description="Идеально подходит для большой семьи или компании",
-            price=8500,
-            image="https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQxZvtuLibYEtn0O0yMCVPpTeDVdKtVDHtZ8w&s"
-        )
-    ]
-    db.add_all(rooms)
-
-if db.query(GalleryImage).count() == 0:
-    urls = [
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/territory-11.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Stoyanka_avto-2fg0.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/SmallMidle_Kott.png",
-        "https://greenhills-crimea.ru/wp-content/uploads/2024/01/Rainbow_kottages.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/General_dinner_place-1ad36.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/territory-bbc.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Swings1d.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/z_f48be99e.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/View_Road_Hill_1273.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/View_on_sea_1297.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/View_down_8ac.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Shore3cc06.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Roses_b_kitchen.jpg",
-        "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Shore2d06.jpg",
-    ]
-    images = [GalleryImage(url=url) for url in urls]
-    db.add_all(images)
-
-if db.query(Booking).count() == 0:
-    bookings = [
-        Booking(
-            room_id=1,
-            fullname="Иван Иванов",
-            phone="+79781234567",
-            email="ivan@example.com",
-            check_in=date.today() + timedelta(days=5),
-            check_out=date.today() + timedelta(days=10),
-            status="confirmed"
-        ),
-        Booking(
-            room_id=2,
-            fullname="Петр Петров",
-            phone="+79787654321",
-            email="petr@example.com",
-            check_in=date.today() + timedelta(days=3),
-            check_out=date.today() + timedelta(days=7),
-            status="pending"
-        )
-    ]
-    db.add_all(bookings)
-
-db.commit()
-db.close()
+ROOM_IMAGE_URLS = [
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/SmallMidle_Kott.png",
+    "https://greenhills-crimea.ru/wp-content/uploads/2024/01/Rainbow_kottages.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Roses_b_kitchen.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/View_on_sea_1297.jpg",
+]
+GALLERY_URLS = [
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/territory-11.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Stoyanka_avto-2fg0.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/SmallMidle_Kott.png",
+    "https://greenhills-crimea.ru/wp-content/uploads/2024/01/Rainbow_kottages.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/General_dinner_place-1ad36.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/territory-bbc.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Swings1d.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/z_f48be99e.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/View_Road_Hill_1273.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/View_on_sea_1297.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/View_down_8ac.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Shore3cc06.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Roses_b_kitchen.jpg",
+    "https://greenhills-crimea.ru/wp-content/uploads/2023/12/Shore2d06.jpg",
+]
+GALLERY_CATEGORIES = ["territory", "rooms", "sea", "food"]
+ROOM_TYPES = [("Номер Стандарт", 3500, 2), ("Коттедж", 7000, 4), ("Семейный коттедж", 8500, 6), ("Люкс", 12000, 2)]
+FIRST_NAMES = ["Иван", "Пётр", "Анна", "Мария", "Алексей", "Ольга", "Дмитрий", "Елена", "Сергей", "Наталья"]
+LAST_NAMES = ["Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов", "Новиков", "Морозов"]
+MESSAGES = ["Спасибо, всё понравилось!", "Есть ли трансфер из аэропорта?", "Можно ли с собакой?",
+            "Хотим забронировать на майские", None]
+# Доли статусов: прошедшие брони, будущие
+PAST_STATUSES = (("completed", "cancelled"), (85, 15))
+FUTURE_STATUSES = (("confirmed", "pending", "cancelled"), (60, 30, 10))
+CHUNK = 20000
+
+
+def populate_demo():
+    db = SessionLocal()
+
+    if db.query(Room).count() == 0:
+        rooms = [
+            Room(
+                name="Номер Стандарт",
+                description="Уютный номер с видом на горы",
+                price=3500,  # Исправлено: число, а не строка
+                image="https://greenhills-crimea.ru/wp-content/uploads/2023/12/SmallMidle_Kott.png"
+            ),
+            Room(
+                name="Коттедж",
+                description="Просторный коттедж с балконом",
+                price=7000,
+                image="https://greenhills-crimea.ru/wp-content/uploads/2024/01/Rainbow_kottages.jpg"
+            ),
+            Room(
+                name="Семейный коттедж",
+                description="Идеально подходит для большой семьи или компании",
+                price=8500,
+                image="https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQxZvtuLibYEtn0O0yMCVPpTeDVdKtVDHtZ8w&s"
+            )
+        ]
+        db.add_all(rooms)
+
+    if db.query(GalleryImage).count() == 0:
+        images = [GalleryImage(url=url) for url in GALLERY_URLS]
+        db.add_all(images)
+
+    if db.query(Booking).count() == 0:
+        bookings = [
+            Booking(
+                room_id=1,
+                fullname="Иван Иванов",
+                phone="+79781234567",
+                email="ivan@example.com",
+                check_in=date.today() + timedelta(days=5),
+                check_out=date.today() + timedelta(days=10),
+                status="confirmed"
+            ),
+            Booking(
+                room_id=2,
+                fullname="Петр Петров",
+                phone="+79787654321",
+                email="petr@example.com",
+                check_in=date.today() + timedelta(days=3),
+                check_out=date.today() + timedelta(days=7),
+                status="pending"
+            )
+        ]
+        db.add_all(bookings)
+
+    db.flush()
+    room_stats.rebuild(db)
+    db.commit()
+    db.close()
+
+
+def _next_id(conn, table):
+    return (conn.exec_driver_sql(f"SELECT COALESCE(MAX(id), 0) FROM {table.name}").scalar() or 0) + 1
+
+
+def _insert(conn, table, rows):
+    # executemany пачками: один prepared statement на CHUNK строк
+    for start in range(0, len(rows), CHUNK):
+        conn.execute(table.insert(), rows[start:start + CHUNK])
+
+
+def _pick(rng, statuses):
+    values, weights = statuses
+    point = rng.random() * sum(weights)
+    for value, weight in zip(values, weights):
+        point -= weight
+        if point < 0:
+            return value
+    return values[-1]
+
+
+def _booking_rows(args, rng, room_ids, users):
+    """Брони номера идут подряд по слотам равной длины — внутри номера они не пересекаются."""
+    first_day = args.today - timedelta(days=round(args.years * 365)) + timedelta(days=args.future_days)
+    span = (args.today + timedelta(days=args.future_days) - first_day).days
+    per_room = math.ceil(args.bookings / len(room_ids)) if args.bookings else 0
+    if per_room and span / per_room < 1:
+        raise SystemExit(f"{args.bookings} броней не помещаются в {len(room_ids)} номеров за {args.years} лет: "
+                         f"увеличьте --rooms или --years")
+    slot = span / per_room if per_room else 0
+    max_stay = max(1, min(args.max_stay, int(slot)))
+    today = (args.today - first_day).days
+    # Даты хранятся в SQLite строками ISO — считаем их один раз на день
+    days = [(first_day + timedelta(days=offset)).isoformat() for offset in range(span + max_stay + 1)]
+    random_ = rng.random
+    remaining = args.bookings
+    for room_id in room_ids:
+        for i in range(min(per_room, remaining)):
+            slot_start = math.ceil(i * slot)
+            slot_length = max(1, math.floor((i + 1) * slot) - slot_start)
+            stay = 1 + int(random_() * min(max_stay, slot_length))
+            check_in = slot_start + int(random_() * (slot_length - stay + 1))
+            check_out = check_in + stay
+            if check_out <= today:
+                status = _pick(rng, PAST_STATUSES)
+            elif check_in <= today:
+                status = "confirmed"
+            else:
+                status = _pick(rng, FUTURE_STATUSES)
+            user_id, fullname, email = users[int(random_() * len(users))]
+            yield (room_id, user_id, fullname, f"+7978{int(random_() * 10 ** 7):07d}", email,
+                   days[check_in], days[check_out], status)
+        remaining -= min(per_room, remaining)
+
+
+def migrate(reset: bool = False):
+    """Схема через Alembic, как у приложения; --reset сносит таблицы вместе с отметкой версии."""
+    from alembic import command
+    from alembic.config import Config
+
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE IF EXISTS alembic_version")
+    config = Config("alembic.ini")
+    config.set_main_option("sqlalchemy.url", engine.url.render_as_string(hide_password=False))
+    command.upgrade(config, "head")
+
+
+def generate(args):
+    """Синтетические данные для нагрузочных тестов; при одинаковых аргументах результат одинаков."""
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    migrate(args.reset)
+    # Все пользователи получают один и тот же пароль: хэш считается один раз
+    hashed = hash_password(args.password)
+
+    with engine.begin() as conn:
+        if args.fast:
+            # Только для одноразовых баз: при сбое во время загрузки файл может испортиться
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        room_id = _next_id(conn, Room.__table__)
+        room_ids = list(range(room_id, room_id + args.rooms))
+        rooms = []
+        for number, ident in enumerate(room_ids, 1):
+            name, price, capacity = rng.choice(ROOM_TYPES)
+            rooms.append({
+                "id": ident, "name": f"{name} №{number}", "description": "Сгенерированный номер",
+                "price": price + rng.randrange(0, 2000, 100), "image": rng.choice(ROOM_IMAGE_URLS),
+                "capacity": capacity, "amenities": "Wi-Fi, кондиционер", "is_available": True,
+            })
+        _insert(conn, Room.__table__, rooms)
+        _insert(conn, RoomImage.__table__, [
+            {"room_id": ident, "url": ROOM_IMAGE_URLS[(ident + j) % len(ROOM_IMAGE_URLS)]}
+            for ident in room_ids for j in range(args.images_per_room)
+        ])
+        _insert(conn, GalleryImage.__table__, [
+            {"url": GALLERY_URLS[i % len(GALLERY_URLS)], "caption": f"Фото {i + 1}",
+             "category": GALLERY_CATEGORIES[i % len(GALLERY_CATEGORIES)]}
+            for i in range(args.gallery)
+        ])
+
+        user_id = _next_id(conn, User.__table__)
+        users, user_rows = [], []
+        for i in range(args.users):
+            ident = user_id + i
+            fullname = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            email = f"user{ident}@example.com"
+            users.append((ident, fullname, email))
+            user_rows.append({"id": ident, "username": f"user{ident}", "email": email,
+                              "hashed_password": hashed, "is_admin": False})
+        _insert(conn, User.__table__, user_rows)
+        if not users:
+            raise SystemExit("для броней нужен хотя бы один пользователь (--users)")
+
+        # Индексы броней строятся один раз после загрузки, а не обновляются на каждой строке
+        indexes = list(Booking.__table__.indexes)
+        for index in indexes:
+            index.drop(conn)
+        insert = ("INSERT INTO bookings (room_id, user_id, fullname, phone, email, check_in, check_out, status) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+        batch = []
+        for row in _booking_rows(args, rng, room_ids, users):
+            batch.append(row)
+            if len(batch) == CHUNK:
+                conn.exec_driver_sql(insert, batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql(insert, batch)
+        # Цена ночи фиксируется в брони, как при бронировании через сайт
+        conn.exec_driver_sql("UPDATE bookings SET price = (SELECT rooms.price FROM rooms WHERE rooms.id = bookings.room_id) "
+                             "WHERE price IS NULL")
+        for index in indexes:
+            index.create(conn)
+
+        _insert(conn, Feedback.__table__, [
+            {"fullname": fullname, "phone": f"+7978{rng.randrange(10 ** 7):07d}", "email": email,
+             "message": rng.choice(MESSAGES)}
+            for _, fullname, email in (users[rng.randrange(len(users))] for _ in range(args.feedback))
+        ])
+        # Сводку для /admin/stats строим одним запросом по загруженным броням
+        room_stats.rebuild(conn)
+        conn.exec_driver_sql("ANALYZE")
+
+    print(f"{args.rooms} номеров, {args.users} пользователей, {args.bookings} броней, "
+          f"{args.feedback} отзывов за {time.perf_counter() - started:.1f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Без аргументов — демо-данные; с --bookings и др. — генератор.")
+    parser.add_argument("--rooms", type=int, default=0, help="сколько номеров сгенерировать")
+    parser.add_argument("--images-per-room", type=int, default=3)
+    parser.add_argument("--gallery", type=int, default=50, help="фото в галерее")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--bookings", type=int, default=0, help="всего броней, делятся поровну между номерами")
+    parser.add_argument("--years", type=float, default=5, help="сколько лет истории")
+    parser.add_argument("--future-days", type=int, default=180, help="насколько вперёд от today идут брони")
+    parser.add_argument("--max-stay", type=int, default=14)
+    parser.add_argument("--feedback", type=int, default=1000)
+    parser.add_argument("--password", default="secret123", help="пароль всех сгенерированных пользователей")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=date.fromisoformat, default=date.today(),
+                        help="опорная дата для статусов; зафиксируйте для воспроизводимости")
+    parser.add_argument("--reset", action="store_true", help="удалить и создать таблицы заново")
+    parser.add_argument("--fast", action="store_true", help="PRAGMA synchronous=OFF на время загрузки")
+    args = parser.parse_args()
+
+    if not args.rooms:
+        # Без --rooms генератор не запускается; его параметры раньше молча уходили в демо-данные.
+        # В пространстве имён без значений по умолчанию остаются только флаги, заданные явно
+        given = vars(parser.parse_args(namespace=argparse.Namespace(**dict.fromkeys(vars(args)))))
+        ignored = [name for name, value in given.items() if value is not None and name not in ("rooms", "reset")]
+        if ignored:
+            parser.error("--rooms обязателен для генератора: " + ", ".join("--" + name.replace("_", "-") for name in ignored))
+        migrate(args.reset)
+        populate_demo()
+        return
+    generate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import ExitStack
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.orm import Session
+
+import room_stats
+from availability import BLOCKING_STATUSES
+from models import Booking, Room
+
+# Сколько раз повторять попытку, если номер успел изменить другой запрос
+RESERVATION_RETRIES = int(os.getenv("RESERVATION_RETRIES", 8))
+# Базовая пауза перед повтором, с; растёт вдвое и размывается случайно
+RESERVATION_BACKOFF = float(os.getenv("RESERVATION_BACKOFF", 0.005))
+
+# Результаты одной попытки
+RESERVED = "reserved"
+TAKEN = "taken"  # даты заняты
+CONFLICT = "conflict"  # версия номера сменилась между проверкой и записью — повторить
+NO_ROOM = "no_room"
+SKIPPED = "skipped"  # брони нет или её статус не подходит для перехода
+
+
+class RoomLocks:
+    """Замки по номерам внутри процесса: заявки на один номер идут по очереди, на разные — параллельно.
+
+    Между процессами порядок обеспечивает версия номера, замок лишь снимает лишние повторы.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._locks = weakref.WeakValueDictionary()
+        self._guard = threading.Lock()
+
+    def __call__(self, room_id: int):
+        with self._guard:
+            lock = self._locks.get(room_id)
+            if lock is None:
+                lock = self._locks[room_id] = self._factory()
+            return lock
+
+
+room_locks = RoomLocks(threading.Lock)
+async_room_locks = RoomLocks(asyncio.Lock)
+
+
+def backoff(attempt: int) -> float:
+    return RESERVATION_BACKOFF * (2 ** attempt) * random.random()
+
+
+def overlaps(db: Session, room_id: int, check_in: date, check_out: date, exclude_id: Optional[int] = None) -> bool:
+    query = select(Booking.id).where(
+        Booking.room_id == room_id,
+        Booking.status.in_(BLOCKING_STATUSES),
+        Booking.check_out > check_in,
+        Booking.check_in < check_out,
+    )
+    if exclude_id is not None:
+        query = query.where(Booking.id != exclude_id)
+    return db.scalar(query.limit(1)) is not None
+
+
+def try_reserve(db: Session, booking: Booking) -> str:
+    """Одна попытка записать бронь (новую или со сменой статуса) под версией номера.
+
+    Проверка пересечений и запись защищены условным UPDATE rooms.booking_version:
+    если номер за это время изменил кто-то ещё, попытка откатывается и возвращает CONFLICT.
+    При RESERVED транзакция остаётся открытой — коммитит вызывающий вместе с уведомлением.
+    """
+    if booking.status not in BLOCKING_STATUSES:
+        # Даты не занимает — сериализовать нечего. Так по умолчанию с новой заявкой (pending):
+        # проверка под версией номера достаётся её подтверждению
+        db.add(booking)
+        return RESERVED
+    with db.no_autoflush:
+        version = db.scalar(select(Room.booking_version).where(Room.id == booking.room_id))
+        if version is None:
+            return NO_ROOM
+        taken = overlaps(db, booking.room_id, booking.check_in, booking.check_out, exclude_id=booking.id)
+    if taken:
+        return TAKEN
+    db.add(booking)
+    db.flush()
+    claimed = db.execute(
+        update(Room)
+        .where(Room.id == booking.room_id, Room.booking_version == version)
+        .values(booking_version=version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        return CONFLICT
+    return RESERVED
+
+
+def change_status(db: Session, booking_id: int, status: str, allowed_from=None):
+    """Смена статуса брони с повторами при конфликте; возвращает (результат, бронь).
+
+    При RESERVED изменения (вместе со сводкой room_stats) не закоммичены, при остальных исходах откачены.
+    """
+    booking = db.get(Booking, booking_id)
+    if booking is None or (allowed_from and booking.status not in allowed_from):
+        return SKIPPED, booking
+    room_id = booking.room_id
+    # Соединение возвращаем в пул до ожидания замка: иначе ждущие потоки выберут пул,
+    # и держатель замка не сможет взять соединение после отката
+    db.commit()
+    outcome = CONFLICT
+    with room_locks(room_id):
+        for attempt in range(RESERVATION_RETRIES):
+            # После отката объект просрочен: статус перечитается из базы
+            if allowed_from and booking.status not in allowed_from:
+                return SKIPPED, booking
+            previous = booking.status
+            booking.status = status
+            outcome = try_reserve(db, booking)
+            if outcome != CONFLICT:
+                break
+            time.sleep(backoff(attempt))
+    if outcome != RESERVED:
+        db.rollback()
+    else:
+        room_stats.apply(db, booking, previous)
+    return outcome, booking
+
+
+# Переходы, разрешённые массовой операцией; завершённые и отменённые брони не оживают
+TRANSITIONS = {
+    "pending": ("confirmed", "cancelled"),
+    "confirmed": ("completed", "cancelled"),
+}
+BULK_MAX = int(os.getenv("BULK_MAX", 500))
+
+
+class BookingChange(NamedTuple):
+    id: int
+    room_id: int
+    check_in: Optional[date]
+    check_out: Optional[date]
+    price: Optional[int]
+    old_status: str
+    status: str
+
+
+class BulkResult:
+    def __init__(self):
+        self.changed: List[BookingChange] = []
+        self.invalid: List[int] = []  # нет брони или переход не разрешён
+        self.taken: List[int] = []  # даты заняты другой бронью или соседней в той же пачке
+        self.conflict = False  # номер или бронь менялись параллельно все попытки подряд
+
+
+def _find_taken(db: Session, candidates: List[BookingChange]) -> Set[int]:
+    """Пересечения для пачки подтверждений одним запросом: с занявшими даты бронями
+    и между собой (при споре побеждает более ранняя заявка)."""
+    ids = [change.id for change in candidates]
+    rooms = {change.room_id for change in candidates}
+    busy: Dict[int, List[Tuple[date, date]]] = {room_id: [] for room_id in rooms}
+    rows = db.execute(
+        select(Booking.room_id, Booking.check_in, Booking.check_out).where(
+            Booking.room_id.in_(rooms),
+            Booking.status.in_(BLOCKING_STATUSES),
+            Booking.check_out > min(change.check_in for change in candidates),
+            Booking.check_in < max(change.check_out for change in candidates),
+            Booking.id.notin_(ids),
+        )
+    )
+    for room_id, check_in, check_out in rows:
+        busy[room_id].append((check_in, check_out))
+    taken = set()
+    for change in sorted(candidates, key=lambda change: change.id):
+        spans = busy[change.room_id]
+        if any(start < change.check_out and change.check_in < end for start, end in spans):
+            taken.add(change.id)
+        else:
+            spans.append((change.check_in, change.check_out))
+    return taken
+
+
+def _try_bulk(db: Session, booking_ids: List[int], status: str) -> Tuple[str, BulkResult]:
+    result = BulkResult()
+    rows = db.execute(
+        select(Booking.id, Booking.room_id, Booking.check_in, Booking.check_out, Booking.price, Booking.status)
+        .where(Booking.id.in_(booking_ids))
+    ).all()
+    found = {row.id for row in rows}
+    result.invalid = [booking_id for booking_id in booking_ids if booking_id not in found]
+    changes = []
+    for row in rows:
+        if status not in TRANSITIONS.get(row.status, ()):
+            result.invalid.append(row.id)
+        else:
+            changes.append(BookingChange(row.id, row.room_id, row.check_in, row.check_out, row.price, row.status, status))
+    if status in BLOCKING_STATUSES:
+        dated = [change for change in changes if change.check_in and change.check_out]
+        rooms = sorted({change.room_id for change in dated})
+        versions = dict(db.execute(select(Room.id, Room.booking_version).where(Room.id.in_(rooms))).all())
+        # Бронь удалённого номера подтверждать некуда
+        orphans = {change.id for change in dated if change.room_id not in versions}
+        result.invalid.extend(sorted(orphans))
+        changes = [change for change in changes if change.id not in orphans]
+        dated = [change for change in dated if change.id not in orphans]
+        taken = _find_taken(db, dated) if dated else set()
+        result.taken = sorted(taken)
+        changes = [change for change in changes if change.id not in taken]
+        # Номера, где что-то занимаем, — под той же версией, что и try_reserve
+        claimed = {change.room_id for change in changes if change.check_in and change.check_out}
+        if claimed:
+            bumped = db.execute(
+                update(Room)
+                .where(tuple_(Room.id, Room.booking_version).in_([(room_id, versions.get(room_id)) for room_id in claimed]))
+                .values(booking_version=Room.booking_version + 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if bumped != len(claimed):
+                db.rollback()
+                return CONFLICT, result
+    if changes:
+        # Одним UPDATE; статус в условии ловит брони, изменённые после чтения
+        updated = db.execute(
+            update(Booking)
+            .where(tuple_(Booking.id, Booking.status).in_([(change.id, change.old_status) for change in changes]))
+            .values(status=status)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated != len(changes):
+            db.rollback()
+            return CONFLICT, result
+        room_stats.apply_many(db, [(change, change.old_status, change.status) for change in changes])
+    result.changed = changes
+    return RESERVED, result
+
+
+def bulk_change_status(db: Session, booking_ids: Iterable[int], status: str) -> BulkResult:
+    """Меняет статус пачки броней: проверка переходов, одна проверка пересечений, один UPDATE.
+
+    Изменения не закоммичены — вызывающий коммитит их вместе с уведомлением.
+    """
+    booking_ids = sorted(set(booking_ids))
+    if not booking_ids:
+        return BulkResult()
+    room_ids = sorted(set(db.scalars(select(Booking.room_id).where(Booking.id.in_(booking_ids), Booking.room_id.isnot(None)))))
+    db.commit()
+    result = BulkResult()
+    # Замки номеров — в одном порядке, чтобы две пачки не ждали друг друга крест-накрест
+    with ExitStack() as stack:
+        for room_id in room_ids:
+            stack.enter_context(room_locks(room_id))
+        for attempt in range(RESERVATION_RETRIES):
+            outcome, result = _try_bulk(db, booking_ids, status)
+            if outcome != CONFLICT:
+                return result
+            time.sleep(backoff(attempt))
+    result.changed = []
+    result.conflict = True
+    return result
@@ -0,0 +1,226 @@
+"""Сводка по ночам номеров: проданные ночи, заявки и выручка за каждый день.
+
+Таблица daily_room_stats обновляется в той же транзакции, что и бронь (apply), и целиком
+пересобирается из bookings и rooms одним запросом (rebuild). Проверка сверяет её с пересборкой:
+    python room_stats.py check
+    python room_stats.py rebuild
+"""
+import argparse
+import calendar
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import Connection, delete, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import Booking, DailyRoomStats, Room
+
+# Ночь продана, пока бронь подтверждена или уже прожита; заявка — отдельная колонка
+SOLD_STATUSES = ("confirmed", "completed")
+PENDING_STATUSES = ("pending",)
+
+# Ночи броней одним рекурсивным CTE: (номер, день, продано, заявок, выручка) на каждую ночь.
+# Даты в SQLite — строки ISO, date(day, '+1 day') их и возвращает
+EXPECTED_SQL = """
+WITH RECURSIVE nights(room_id, day, check_out, sold, pending, revenue) AS (
+    SELECT b.room_id, b.check_in, b.check_out,
+           b.status IN ({sold}), b.status IN ({pending}),
+           CASE WHEN b.status IN ({sold}) THEN COALESCE(b.price, 0) ELSE 0 END
+    FROM bookings AS b JOIN rooms AS r ON r.id = b.room_id
+    WHERE b.status IN ({sold}, {pending}) AND b.check_in < b.check_out {where}
+    UNION ALL
+    SELECT room_id, date(day, '+1 day'), check_out, sold, pending, revenue
+    FROM nights WHERE date(day, '+1 day') < check_out
+)
+SELECT room_id, day, SUM(sold) AS nights_sold, SUM(pending) AS nights_pending, SUM(revenue) AS revenue
+FROM nights GROUP BY room_id, day
+"""
+
+
+def _expected_sql(room_id: Optional[int] = None) -> str:
+    quoted = lambda statuses: ", ".join(f"'{status}'" for status in statuses)
+    return EXPECTED_SQL.format(sold=quoted(SOLD_STATUSES), pending=quoted(PENDING_STATUSES),
+                               where="AND b.room_id = :room_id" if room_id is not None else "")
+
+
+def _contribution(status: Optional[str]) -> Tuple[int, int]:
+    return int(status in SOLD_STATUSES), int(status in PENDING_STATUSES)
+
+
+def apply(db: Session, booking: Booking, old_status: Optional[str], new_status: Optional[str] = None):
+    """Переносит изменение брони в сводку. Не коммитит: вызывающий фиксирует его вместе с бронью.
+
+    old_status=None — новая бронь; new_status по умолчанию — текущий статус брони.
+    """
+    apply_many(db, [(booking, old_status, booking.status if new_status is None else new_status)])
+
+
+def apply_many(db: Session, changes: Iterable[Tuple[Booking, Optional[str], Optional[str]]]):
+    """То же для пачки (бронь, старый статус, новый статус): проверка номеров, один upsert и одна чистка."""
+    deltas = []
+    for booking, old_status, new_status in changes:
+        old_sold, old_pending = _contribution(old_status)
+        new_sold, new_pending = _contribution(new_status)
+        sold, pending = new_sold - old_sold, new_pending - old_pending
+        # Даты в схеме необязательны: бронь без заезда или выезда ночей не занимает
+        if (sold or pending) and booking.check_in and booking.check_out and booking.check_out > booking.check_in:
+            deltas.append((booking, sold, pending))
+    if not deltas:
+        return
+    # Номер удалён вместе со своими строками сводки, а брони остались; rebuild их тоже не считает
+    rooms = set(db.scalars(select(Room.id).where(Room.id.in_({booking.room_id for booking, _, _ in deltas}))))
+    deltas = [delta for delta in deltas if delta[0].room_id in rooms]
+    if not deltas:
+        return
+    table = DailyRoomStats.__table__
+    upsert = insert(table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[table.c.room_id, table.c.day],
+        set_={
+            "nights_sold": table.c.nights_sold + upsert.excluded.nights_sold,
+            "nights_pending": table.c.nights_pending + upsert.excluded.nights_pending,
+            "revenue": table.c.revenue + upsert.excluded.revenue,
+        },
+    )
+    db.execute(upsert, [
+        {"room_id": booking.room_id, "day": booking.check_in + timedelta(days=offset),
+         "nights_sold": sold, "nights_pending": pending, "revenue": sold * (booking.price or 0)}
+        for booking, sold, pending in deltas
+        for offset in range((booking.check_out - booking.check_in).days)
+    ])
+    # Обнулившиеся дни удаляем: в таблице только ночи, где что-то есть, как и после rebuild
+    db.execute(delete(table).where(
+        table.c.room_id.in_({booking.room_id for booking, _, _ in deltas}),
+        table.c.day >= min(booking.check_in for booking, _, _ in deltas),
+        table.c.day < max(booking.check_out for booking, _, _ in deltas),
+        table.c.nights_sold == 0,
+        table.c.nights_pending == 0,
+    ))
+
+
+def rebuild(db: Union[Session, Connection], room_id: Optional[int] = None) -> int:
+    """Пересобирает сводку (целиком или по одному номеру) из броней; возвращает число строк."""
+    table = DailyRoomStats.__table__
+    params = {} if room_id is None else {"room_id": room_id}
+    db.execute(delete(table) if room_id is None else delete(table).where(table.c.room_id == room_id))
+    result = db.execute(text(
+        f"INSERT INTO daily_room_stats (room_id, day, nights_sold, nights_pending, revenue) {_expected_sql(room_id)}"
+    ), params)
+    return result.rowcount
+
+
+def check(db: Session, limit: int = 20) -> List[tuple]:
+    """Строки, в которых сводка расходится с пересборкой: (номер, день, в таблице, ожидается)."""
+    columns = "room_id, day, nights_sold, nights_pending, revenue"
+    rows = db.execute(text(f"""
+        WITH expected AS ({_expected_sql()}),
+        missing AS (SELECT {columns} FROM expected EXCEPT SELECT {columns} FROM daily_room_stats),
+        extra AS (SELECT {columns} FROM daily_room_stats EXCEPT SELECT {columns} FROM expected)
+        SELECT k.room_id, k.day,
+               s.nights_sold, s.nights_pending, s.revenue,
+               e.nights_sold, e.nights_pending, e.revenue
+        FROM (SELECT room_id, day FROM missing UNION SELECT room_id, day FROM extra) AS k
+        LEFT JOIN daily_room_stats AS s ON s.room_id = k.room_id AND s.day = k.day
+        LEFT JOIN expected AS e ON e.room_id = k.room_id AND e.day = k.day
+        ORDER BY k.room_id, k.day
+        LIMIT :limit
+    """), {"limit": limit}).all()
+    return [(row[0], row[1], tuple(row[2:5]), tuple(row[5:8])) for row in rows]
+
+
+class MonthStats:
+    __slots__ = ("month", "nights_sold", "nights_pending", "revenue", "nights_available")
+
+    def __init__(self, month: date, nights_available: int):
+        self.month = month
+        self.nights_sold = 0
+        self.nights_pending = 0
+        self.revenue = 0
+        self.nights_available = nights_available
+
+    @property
+    def occupancy(self) -> float:
+        return self.nights_sold / self.nights_available if self.nights_available else 0.0
+
+    @property
+    def adr(self) -> float:
+        # Средняя цена проданной ночи
+        return self.revenue / self.nights_sold if self.nights_sold else 0.0
+
+    @property
+    def revpar(self) -> float:
+        return self.revenue / self.nights_available if self.nights_available else 0.0
+
+    def to_json(self) -> dict:
+        return {"month": self.month.strftime("%Y-%m"), "nights_sold": self.nights_sold,
+                "nights_pending": self.nights_pending, "revenue": self.revenue,
+                "occupancy": round(self.occupancy, 4), "adr": round(self.adr, 2), "revpar": round(self.revpar, 2)}
+
+
+class YearStats:
+    """Помесячные показатели за год — по отелю и по каждому номеру."""
+
+    def __init__(self, year: int, rooms: List[Tuple[int, str]]):
+        self.year = year
+        self.rooms = rooms
+        self.months = [date(year, month, 1) for month in range(1, 13)]
+        days = [calendar.monthrange(year, month)[1] for month in range(1, 13)]
+        self.total = [MonthStats(month, length * len(rooms)) for month, length in zip(self.months, days)]
+        self.by_room: Dict[int, List[MonthStats]] = {
+            room_id: [MonthStats(month, length) for month, length in zip(self.months, days)] for room_id, _ in rooms
+        }
+
+    def to_json(self) -> dict:
+        return {
+            "year": self.year,
+            "total": [month.to_json() for month in self.total],
+            "rooms": [{"id": room_id, "name": name, "months": [month.to_json() for month in self.by_room[room_id]]}
+                      for room_id, name in self.rooms],
+        }
+
+
+def year_stats(db: Session, year: int) -> YearStats:
+    """Читает только сводку: одна группировка по номеру и месяцу за год."""
+    rooms = [tuple(row) for row in db.execute(select(Room.id, Room.name).order_by(Room.id))]
+    stats = YearStats(year, rooms)
+    table = DailyRoomStats.__table__
+    month = text("CAST(strftime('%m', day) AS INTEGER)")
+    rows = db.execute(
+        select(table.c.room_id, month, text("SUM(nights_sold)"), text("SUM(nights_pending)"), text("SUM(revenue)"))
+        .where(table.c.day >= date(year, 1, 1), table.c.day < date(year + 1, 1, 1))
+        .group_by(table.c.room_id, month)
+    )
+    for room_id, month_number, sold, pending, revenue in rows:
+        months = stats.by_room.get(room_id)
+        if months is None:
+            continue
+        for target in (months[month_number - 1], stats.total[month_number - 1]):
+            target.nights_sold += sold
+            target.nights_pending += pending
+            target.revenue += revenue
+    return stats
+
+
+def main():
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Сводка daily_room_stats")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        if args.command == "rebuild":
+            rows = rebuild(db)
+            db.commit()
+            print(f"Сводка пересобрана: {rows} строк")
+            return
+        mismatches = check(db)
+    for room_id, day, actual, expected in mismatches:
+        print(f"номер {room_id}, {day}: в сводке {actual}, по броням {expected}")
+    if mismatches:
+        raise SystemExit("Сводка расходится с бронями: python room_stats.py rebuild")
+    print("Сводка совпадает с бронями")
+
+
+if __name__ == "__main__":
+    main()
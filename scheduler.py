@@ -0,0 +1,152 @@
+"""Плановые переходы броней: прожитые подтверждённые брони — в completed, заявки, которые так и
+не подтвердили до заезда, — в cancelled.
+
+Переходы идут пачками по SCHEDULER_BATCH броней, каждая пачка — один UPDATE ... RETURNING и свой
+коммит, между пачками пауза: запись в SQLite одна на всю базу, и живые запросы успевают вклиниться.
+Планировщик работает в каждом воркере uvicorn: условие на старый статус делает UPDATE
+идемпотентным, соседний процесс просто ничего не найдёт. Один прогон без сервера:
+    python scheduler.py
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+import room_stats
+from availability import availability
+from database import SessionLocal
+from metrics import record_scheduler_run
+from models import Booking
+from reservations import TRANSITIONS, BookingChange
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+# Секунды между прогонами; у каждого воркера свой разброс ±10 %, чтобы они не совпадали
+SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", 900))
+SCHEDULER_BATCH = int(os.getenv("SCHEDULER_BATCH", 200))
+SCHEDULER_PAUSE = float(os.getenv("SCHEDULER_PAUSE", 0.05))
+# Через сколько дней после выезда бронь завершается и после даты заезда истекает заявка; -1 — не трогать
+COMPLETE_AFTER_DAYS = int(os.getenv("COMPLETE_AFTER_DAYS", 0))
+PENDING_EXPIRE_DAYS = int(os.getenv("PENDING_EXPIRE_DAYS", 0))
+
+
+class Policy(NamedTuple):
+    name: str
+    from_status: str
+    to_status: str
+    column: str  # дата брони, от которой считается срок: check_in или check_out
+    days: int  # переход, когда дата раньше, чем today - days; отрицательное значение выключает политику
+
+
+def default_policies() -> List[Policy]:
+    return [
+        Policy("complete_stays", "confirmed", "completed", "check_out", COMPLETE_AFTER_DAYS),
+        Policy("expire_pending", "pending", "cancelled", "check_in", PENDING_EXPIRE_DAYS),
+    ]
+
+
+def run_batch(db: Session, policy: Policy, today: date, limit: int) -> List[BookingChange]:
+    """Одна пачка перехода: UPDATE по id из подзапроса, сводка room_stats и коммит."""
+    assert policy.to_status in TRANSITIONS.get(policy.from_status, ())
+    cutoff = today - timedelta(days=policy.days)
+    due = select(Booking.id).where(Booking.status == policy.from_status, getattr(Booking, policy.column) < cutoff)
+    if policy.column == "check_out":
+        # check_in < check_out, так что условие лишнее по смыслу, но даёт индексу (status, check_in) диапазон
+        due = due.where(Booking.check_in < cutoff)
+    rows = db.execute(
+        update(Booking)
+        # Статус и в самом UPDATE: бронь, которую между чтением и записью поменял админ, не трогаем
+        .where(Booking.id.in_(due.order_by(Booking.id).limit(limit).scalar_subquery()),
+               Booking.status == policy.from_status)
+        .values(status=policy.to_status)
+        .returning(Booking.id, Booking.room_id, Booking.check_in, Booking.check_out, Booking.price)
+        .execution_options(synchronize_session=False)
+    ).all()
+    changes = [BookingChange(*row, policy.from_status, policy.to_status) for row in rows]
+    room_stats.apply_many(db, [(change, change.old_status, change.status) for change in changes])
+    db.commit()
+    for change in changes:
+        availability.track(change)
+    return changes
+
+
+class LifecycleScheduler:
+    def __init__(
+        self,
+        policies: Optional[List[Policy]] = None,
+        interval: float = SCHEDULER_INTERVAL,
+        batch_size: int = SCHEDULER_BATCH,
+        pause: float = SCHEDULER_PAUSE,
+        session_factory=SessionLocal,
+    ):
+        self.policies = default_policies() if policies is None else policies
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        # Первый прогон не в момент старта: воркеры поднимаются разом и заняты прогревом
+        await asyncio.sleep(random.uniform(0.1, 0.2) * self.interval)
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+    async def run_once(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Все включённые политики до конца; возвращает число переведённых броней по политикам."""
+        today = today or date.today()
+        totals = {}
+        for policy in self.policies:
+            if policy.days < 0:
+                continue
+            started = time.perf_counter()
+            moved = 0
+            outcome = "ok"
+            try:
+                while True:
+                    # Синхронная сессия в отдельном потоке: цикл событий и пул обработчиков не ждут запись
+                    changes = await asyncio.to_thread(self._batch, policy, today)
+                    moved += len(changes)
+                    if len(changes) < self.batch_size:
+                        break
+                    await asyncio.sleep(self.pause)
+            except Exception as e:
+                print(f"Ошибка планировщика ({policy.name}): {e}")
+                outcome = "error"
+            record_scheduler_run(policy.name, outcome, moved, time.perf_counter() - started)
+            totals[policy.name] = moved
+        return totals
+
+    def _batch(self, policy: Policy, today: date) -> List[BookingChange]:
+        with self.session_factory() as db:
+            return run_batch(db, policy, today, self.batch_size)
+
+
+lifecycle_scheduler = LifecycleScheduler()
+
+
+def main():
+    totals = asyncio.run(lifecycle_scheduler.run_once())
+    for name, moved in totals.items():
+        print(f"{name}: {moved}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,12 @@ IF ERRORLEVEL 1 (
     echo Uvicorn уже установлен.
 )
 
+echo Применение миграций базы...
+python -m alembic upgrade head
+
+echo Сборка статики...
+python assets.py
+
 echo Запуск FastAPI-сервера...
 start http://localhost:8000
 python -m uvicorn main:app --host 0.0.0.0 --port 8000 --reload
@@ -1,13 +1,17 @@
 document.addEventListener("DOMContentLoaded", () => {
+  const gallery = document.getElementById("gallery");
   const modal = document.getElementById("modal");
   const modalImg = document.getElementById("modal-img");
   const closeBtn = document.getElementById("close");
+  if (!gallery || !modal) return;
 
-  document.querySelectorAll(".gallery-photo").forEach(img => {
-    img.addEventListener("click", () => {
-      modal.style.display = "flex";
-      modalImg.src = img.src;
-    });
+  // Делегирование: подгруженные фото открываются так же, как отрендеренные сервером
+  gallery.addEventListener("click", e => {
+    const img = e.target.closest(".gallery-photo");
+    if (!img) return;
+    modal.style.display = "flex";
+    // В окне — крупная версия, в сетке — миниатюра
+    modalImg.src = img.dataset.full || img.currentSrc || img.src;
   });
 
   closeBtn.addEventListener("click", () => {
@@ -17,4 +21,82 @@ document.addEventListener("DOMContentLoaded", () => {
   modal.addEventListener("click", e => {
     if (e.target === modal) modal.style.display = "none";
   });
+
+  const more = document.getElementById("gallery-more");
+  if (!more || !("IntersectionObserver" in window)) return;
+
+  const sizes = "(max-width: 600px) 50vw, 240px";
+  let next = more.dataset.next;
+  let loading = false;
+  let failed = false;
+
+  function render(item) {
+    const picture = document.createElement("picture");
+    if (item.webp_srcset) {
+      const source = document.createElement("source");
+      source.type = "image/webp";
+      source.srcset = item.webp_srcset;
+      source.sizes = sizes;
+      picture.appendChild(source);
+    }
+    const img = document.createElement("img");
+    img.src = item.src;
+    if (item.srcset) {
+      img.srcset = item.srcset;
+      img.sizes = sizes;
+    }
+    img.dataset.full = item.full;
+    img.alt = item.caption || "Фото";
+    img.className = "gallery-photo";
+    img.loading = "lazy";
+    img.decoding = "async";
+    picture.appendChild(img);
+    return picture;
+  }
+
+  async function loadMore() {
+    if (loading || !next) return;
+    loading = true;
+    const params = new URLSearchParams({ after: next });
+    if (gallery.dataset.category) params.set("category", gallery.dataset.category);
+    try {
+      const response = await fetch("/api/gallery?" + params);
+      if (!response.ok) throw new Error(response.status);
+      const page = await response.json();
+      const fragment = document.createDocumentFragment();
+      page.items.forEach(item => fragment.appendChild(render(item)));
+      gallery.appendChild(fragment);
+      next = page.next;
+    } catch (err) {
+      // Дальше — обычным переходом по ссылке «Показать ещё»
+      failed = true;
+      observer.disconnect();
+      more.textContent = "Показать ещё";
+      return;
+    } finally {
+      loading = false;
+    }
+    if (!next) {
+      observer.disconnect();
+      more.remove();
+      return;
+    }
+    params.set("after", next);
+    more.href = "/gallery?" + params;
+    // Если ссылка всё ещё в зоне видимости, повторное наблюдение сразу вызовет следующую подгрузку
+    observer.unobserve(more);
+    observer.observe(more);
+  }
+
+  // Подгружаем заранее, пока до конца ленты ещё экран
+  const observer = new IntersectionObserver(entries => {
+    if (entries.some(entry => entry.isIntersecting)) loadMore();
+  }, { rootMargin: "800px 0px" });
+  more.textContent = "Загрузка…";
+  more.addEventListener("click", e => {
+    if (failed) return;
+    e.preventDefault();
+    loadMore();
+  });
+  observer.observe(more);
 });
@@ -0,0 +1,60 @@
+import os
+import time
+
+import jinja2
+from fastapi.templating import Jinja2Templates
+
+from assets import asset_url
+from image_cache import image_srcset, image_url, thumbnails_enabled
+from metrics import observe_render
+
+TEMPLATES_DIR = "templates"
+# В продакшене 0: шаблоны не перечитываются, Jinja не делает stat() файла на каждый рендер
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "1") == "1"
+# Каталог байткода шаблонов, общий для воркеров и перезапусков; пусто — без кэша
+TEMPLATES_BYTECODE_CACHE = os.getenv("TEMPLATES_BYTECODE_CACHE", "template_cache")
+
+
+class TimedTemplate(jinja2.Template):
+    def render(self, *args, **kwargs) -> str:
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            observe_render(self.name or "<string>", time.perf_counter() - started)
+
+
+def create_environment(directory: str = TEMPLATES_DIR, auto_reload: bool = TEMPLATES_AUTO_RELOAD,
+                       bytecode_cache: str = TEMPLATES_BYTECODE_CACHE) -> jinja2.Environment:
+    bcc = None
+    if bytecode_cache:
+        os.makedirs(bytecode_cache, exist_ok=True)
+        # Ключ кэша — имя и контрольная сумма исходника, так что правка шаблона не отдаст старый код
+        bcc = jinja2.FileSystemBytecodeCache(bytecode_cache)
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(directory),
+        autoescape=True,
+        auto_reload=auto_reload,
+        bytecode_cache=bcc,
+    )
+    # Время рендера каждого шаблона уходит в гистограмму /metrics
+    env.template_class = TimedTemplate
+    env.globals.update(
+        asset_url=asset_url,
+        image_url=image_url,
+        image_srcset=image_srcset,
+        thumbnails_enabled=thumbnails_enabled,
+    )
+    return env
+
+
+# Одно окружение на процесс для main.py, admin.py и auth.py
+templates = Jinja2Templates(env=create_environment())
+
+
+def precompile(env: jinja2.Environment = templates.env) -> int:
+    """Компилирует все шаблоны заранее, чтобы первый запрос к странице не платил за разбор."""
+    names = env.list_templates(filter_func=lambda name: name.endswith(".html"))
+    for name in names:
+        env.get_template(name)
+    return len(names)
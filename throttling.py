@@ -0,0 +1,196 @@
+"""Ограничение частоты входа и регистрации корзинами токенов по IP, имени пользователя или маршруту целиком.
+
+Корзины лежат в таблице rate_limits той же базы, поэтому лимит общий для всех воркеров uvicorn;
+списание токена — один атомарный upsert. Пустая корзина запоминается в процессе до момента,
+когда в ней появится токен: повторные попытки отклоняются без базы и без хэширования пароля.
+
+Корзины ip и all списываются с каждой попытки до проверки пароля и защищают хэширование. Корзина
+user — по имени пользователя, с любых адресов вместе — ограничивает подбор пароля к одной учётной
+записи, в том числе с множества IP. Её списывает только неудачная попытка (failed), а успешный вход
+сбрасывает (succeeded): собственные входы владельца лимит не расходуют.
+
+Лимиты задаются по маршрутам, "маршрут:тип=ёмкость/секунды" через запятую, где тип — ip, user
+или all (все попытки маршрута вместе); "off" вместо значения выключает лимит по умолчанию:
+    RATE_LIMITS="/auth/login:user=5/600,/auth/login:all=50/1,/auth/register:ip=off"
+За обратным прокси IP клиента берётся из X-Forwarded-For при запуске uvicorn с --proxy-headers.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import async_engine
+from metrics import record_rate_limit
+from models import RateLimitBucket
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+DEFAULT_RATE_LIMITS = "/auth/login:ip=20/60,/auth/login:user=10/300,/auth/register:ip=5/600"
+# Сколько ключей с пустой корзиной помнит процесс; самые старые вытесняются
+RATE_LIMIT_LOCAL_ENTRIES = int(os.getenv("RATE_LIMIT_LOCAL_ENTRIES", 10000))
+# Раз в столько проверок из таблицы удаляются снова полные корзины
+RATE_LIMIT_CLEANUP_EVERY = int(os.getenv("RATE_LIMIT_CLEANUP_EVERY", 1000))
+
+KINDS = ("ip", "user", "all")
+# Эти корзины попытка только проверяет, списывает их failed
+ON_FAILURE = ("user",)
+
+
+class Limit(NamedTuple):
+    capacity: float  # сколько попыток подряд
+    period: float  # за сколько секунд корзина наполняется заново
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_limits(spec: str, limits: Optional[Dict[str, Dict[str, Limit]]] = None) -> Dict[str, Dict[str, Limit]]:
+    limits = {route: dict(kinds) for route, kinds in (limits or {}).items()}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        target, _, value = item.strip().rpartition("=")
+        route, _, kind = target.rpartition(":")
+        if kind not in KINDS:
+            raise ValueError(f"RATE_LIMITS: неизвестный тип лимита {kind!r} в {item!r}")
+        if value == "off":
+            limits.get(route, {}).pop(kind, None)
+            continue
+        capacity, _, period = value.partition("/")
+        limits.setdefault(route, {})[kind] = Limit(float(capacity), float(period))
+    return limits
+
+
+RATE_LIMITS = parse_limits(os.getenv("RATE_LIMITS", ""), parse_limits(DEFAULT_RATE_LIMITS))
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def _bucket_key(route: str, kind: str, value: str) -> str:
+    # Имя пользователя приходит из формы как есть: в таблицу — хэш фиксированной длины
+    return hashlib.blake2b(f"{route}:{kind}:{value}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Throttle:
+    def __init__(self, limits: Dict[str, Dict[str, Limit]] = RATE_LIMITS, engine=async_engine,
+                 enabled: bool = RATE_LIMIT_ENABLED, local_entries: int = RATE_LIMIT_LOCAL_ENTRIES):
+        self.limits = limits
+        self.engine = engine
+        self.enabled = enabled
+        self.local_entries = local_entries
+        # Ключ -> unix-время, до которого корзина пуста; обработчики идут в одном event loop, замок не нужен
+        self._empty_until: "OrderedDict[str, float]" = OrderedDict()
+        self._checks = 0
+
+    async def check(self, route: str, request: Request, username: Optional[str] = None) -> float:
+        """Списывает попытку с лимитов маршрута; 0 — можно, иначе через сколько секунд повторить.
+
+        Корзины из ON_FAILURE только проверяются: пустая тоже отклоняет попытку.
+        """
+        limits = self.limits.get(route) if self.enabled else None
+        if not limits:
+            return 0
+        buckets = [(key, limit, int(kind not in ON_FAILURE)) for kind, key, limit in self._buckets(route, request, username)]
+        now = time.time()
+        wait = max(self._empty_until.get(key, 0) for key, _, _ in buckets) - now
+        if wait > 0:
+            record_rate_limit(route, "rejected_local")
+            return wait
+        try:
+            remaining = await self._consume(buckets, now)
+        except SQLAlchemyError as e:
+            # Хранилище недоступно: лучше пропустить попытку, чем запереть всех пользователей
+            print(f"Ошибка ограничения частоты ({route}): {e}")
+            record_rate_limit(route, "error")
+            return 0
+        wait = self._empty(buckets, remaining, now)
+        record_rate_limit(route, "rejected" if wait else "allowed")
+        return wait
+
+    async def failed(self, route: str, request: Request, username: Optional[str] = None):
+        """Неудачная попытка: списывает токен с корзин из ON_FAILURE."""
+        buckets = [(key, limit, 1) for kind, key, limit in self._buckets(route, request, username)
+                   if kind in ON_FAILURE]
+        if not buckets:
+            return
+        now = time.time()
+        try:
+            self._empty(buckets, await self._consume(buckets, now), now)
+        except SQLAlchemyError as e:
+            print(f"Ошибка ограничения частоты ({route}): {e}")
+            record_rate_limit(route, "error")
+
+    async def succeeded(self, route: str, request: Request, username: Optional[str] = None):
+        """Успешная попытка: корзины из ON_FAILURE снова полные."""
+        keys = [key for kind, key, _ in self._buckets(route, request, username) if kind in ON_FAILURE]
+        if not keys:
+            return
+        for key in keys:
+            self._empty_until.pop(key, None)
+        try:
+            async with self.engine.begin() as conn:
+                # Нет строки — корзина полная
+                await conn.execute(delete(RateLimitBucket.__table__).where(RateLimitBucket.__table__.c.key.in_(keys)))
+        except SQLAlchemyError as e:
+            print(f"Ошибка ограничения частоты ({route}): {e}")
+            record_rate_limit(route, "error")
+
+    def _buckets(self, route: str, request: Request, username: Optional[str]) -> List[Tuple[str, str, Limit]]:
+        limits = self.limits.get(route) if self.enabled else None
+        values = {"ip": client_ip(request), "user": (username or "").strip().lower(), "all": "*"}
+        return [(kind, _bucket_key(route, kind, values[kind]), limit) for kind, limit in (limits or {}).items()]
+
+    def _empty(self, buckets: List[Tuple[str, Limit, int]], remaining: List[float], now: float) -> float:
+        wait = 0
+        for (key, limit, cost), tokens in zip(buckets, remaining):
+            if tokens < 0:
+                # Следующее списание пройдёт, когда корзина наберёт токен с учётом долга
+                until = now + (cost - tokens) / limit.rate
+                self._remember_empty(key, until)
+                wait = max(wait, until - now)
+        return wait
+
+    async def _consume(self, buckets: List[Tuple[str, Limit, int]], now: float) -> List[float]:
+        """Сколько токенов останется в каждой корзине; cost=0 — только посмотреть, сколько было бы после списания."""
+        table = RateLimitBucket.__table__
+        remaining = []
+        async with self.engine.begin() as conn:
+            for key, limit, cost in buckets:
+                # Долг не больше одного токена: кто долбит пустую корзину, ждёт на один токен дольше
+                refilled = func.max(func.min(limit.capacity, table.c.tokens + (now - table.c.updated_at) * limit.rate), 0)
+                if not cost:
+                    tokens = (await conn.execute(select(refilled).where(table.c.key == key))).scalar()
+                    remaining.append((limit.capacity if tokens is None else tokens) - 1)
+                    continue
+                upsert = insert(table).values(key=key, tokens=limit.capacity - 1, updated_at=now,
+                                              idle_at=now + 1 / limit.rate)
+                upsert = upsert.on_conflict_do_update(
+                    index_elements=[table.c.key],
+                    set_={
+                        "tokens": refilled - 1,
+                        "updated_at": now,
+                        "idle_at": now + (limit.capacity - (refilled - 1)) / limit.rate,
+                    },
+                ).returning(table.c.tokens)
+                remaining.append((await conn.execute(upsert)).scalar_one())
+            self._checks += 1
+            if self._checks % RATE_LIMIT_CLEANUP_EVERY == 0:
+                await conn.execute(delete(table).where(table.c.idle_at < now))
+        return remaining
+
+    def _remember_empty(self, key: str, until: float):
+        self._empty_until[key] = until
+        self._empty_until.move_to_end(key)
+        while len(self._empty_until) > self.local_entries:
+            self._empty_until.popitem(last=False)
+
+
+throttle = Throttle()